@@ -0,0 +1,23 @@
+"""
+App configuration
+"""
+from django.apps import AppConfig
+from django.core.signals import request_finished, request_started
+
+
+class SGAConfig(AppConfig):
+    """
+    App configuration for sga
+    """
+    name = "sga"
+    verbose_name = "SGA"
+
+    def ready(self):
+        from sga.backend.db import check_connections, mark_connections_used
+        from sga.backend.routers import reset_replica_reads
+        # Django closes obsolete connections on request_started first, so only reused ones are checked
+        request_started.connect(check_connections, dispatch_uid="sga_check_connections")
+        request_finished.connect(mark_connections_used, dispatch_uid="sga_mark_connections_used")
+        # Streamed responses are sent after the view returns, so reads from the replica end with the request
+        request_started.connect(reset_replica_reads, dispatch_uid="sga_reset_replica_reads_started")
+        request_finished.connect(reset_replica_reads, dispatch_uid="sga_reset_replica_reads_finished")
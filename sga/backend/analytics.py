@@ -0,0 +1,132 @@
+"""
+Backend logic for a course's grade statistics
+
+All graded submissions of active students are fetched with one values_list query and summarized in
+a single pass, per assignment, per grader and for the whole course. The result is cached per course
+data version, so it is only recomputed after the course's data changes.
+"""
+import math
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+
+from sga.backend.cache import get_or_set_course_value
+from sga.backend.constants import SubmissionStatus
+from sga.models import Submission
+
+HISTOGRAM_BUCKETS = 10
+MAX_GRADE = 100
+PERCENTILES = (25, 50, 75, 90)
+
+
+def get_histogram_bucket(grade):
+    """
+    Returns the index of the histogram bucket for a grade (0-9, 10 points wide, 100 in the last bucket)
+    """
+    return min(grade * HISTOGRAM_BUCKETS // MAX_GRADE, HISTOGRAM_BUCKETS - 1)
+
+
+def get_histogram_labels():
+    """
+    Returns the grade range of each histogram bucket, e.g. "0-9" and "90-100"
+    """
+    width = MAX_GRADE // HISTOGRAM_BUCKETS
+    labels = ["{low}-{high}".format(low=low, high=low + width - 1) for low in range(0, MAX_GRADE, width)]
+    labels[-1] = "{low}-{high}".format(low=MAX_GRADE - width, high=MAX_GRADE)
+    return labels
+
+
+def get_percentile(sorted_grades, percentile):
+    """
+    Returns a percentile of sorted grades, interpolating linearly between the closest ranks
+    """
+    position = (len(sorted_grades) - 1) * percentile / 100
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return sorted_grades[lower] + (sorted_grades[upper] - sorted_grades[lower]) * (position - lower)
+
+
+def summarize_grades(grades):
+    """
+    Returns a dict of count, mean, stdev (population), min, max, percentiles ("p25", "p50", ...) and
+    histogram (counts per 10-point bucket) for a list of grades. The statistics are None without grades.
+    """
+    histogram = [0] * HISTOGRAM_BUCKETS
+    for grade in grades:
+        histogram[get_histogram_bucket(grade)] += 1
+    summary = {"count": len(grades), "histogram": histogram}
+    if not grades:
+        summary.update({"mean": None, "stdev": None, "min": None, "max": None})
+        summary.update({"p{percentile}".format(percentile=percentile): None for percentile in PERCENTILES})
+        return summary
+    sorted_grades = sorted(grades)
+    mean = sum(sorted_grades) / len(sorted_grades)
+    summary.update({
+        "mean": mean,
+        "stdev": math.sqrt(sum((grade - mean) ** 2 for grade in sorted_grades) / len(sorted_grades)),
+        "min": sorted_grades[0],
+        "max": sorted_grades[-1],
+    })
+    summary.update({
+        "p{percentile}".format(percentile=percentile): get_percentile(sorted_grades, percentile)
+        for percentile in PERCENTILES
+    })
+    return summary
+
+
+def compute_grade_statistics(course):
+    """
+    Returns grade statistics for a course: a summary of all grades ("course"), one per assignment
+    ("assignments") and one per grader ("graders"). Each grader's "deviation" is the mean difference
+    between the grades they gave and the mean grade of the same assignment, so graders who graded
+    different assignments can be compared.
+    """
+    grades = list(Submission.objects.of_active_students(course=course).filter(
+        assignment__course=course,
+        status__gte=SubmissionStatus.graded,
+        grade__isnull=False
+    ).values_list("assignment_id", "graded_by_id", "grade"))
+    assignment_grades = defaultdict(list)
+    grader_grades = defaultdict(list)
+    for assignment_id, grader_user_id, grade in grades:
+        assignment_grades[assignment_id].append(grade)
+        grader_grades[grader_user_id].append((assignment_id, grade))
+
+    assignments = []
+    assignment_means = {}
+    for assignment_id, name in course.assignments.order_by("name").values_list("id", "name"):
+        summary = summarize_grades(assignment_grades[assignment_id])
+        assignment_means[assignment_id] = summary["mean"]
+        assignments.append(dict(summary, id=assignment_id, name=name))
+
+    grader_names = dict(
+        User.objects.filter(id__in=[user_id for user_id in grader_grades if user_id is not None]).values_list(
+            "id",
+            "username"
+        )
+    )
+    graders = []
+    for grader_user_id, graded in grader_grades.items():
+        summary = summarize_grades([grade for _, grade in graded])
+        deviations = [grade - assignment_means[assignment_id] for assignment_id, grade in graded]
+        graders.append(dict(
+            summary,
+            user_id=grader_user_id,
+            name=grader_names.get(grader_user_id, "(Unknown)"),
+            deviation=sum(deviations) / len(deviations)
+        ))
+    graders.sort(key=lambda grader: grader["name"])
+
+    return {
+        "course": summarize_grades([grade for _, _, grade in grades]),
+        "assignments": assignments,
+        "graders": graders,
+    }
+
+
+def get_grade_statistics(course):
+    """
+    Returns the grade statistics for a course (see compute_grade_statistics), cached per course
+    data version
+    """
+    return get_or_set_course_value(course.id, "grade_statistics", lambda: compute_grade_statistics(course))
@@ -0,0 +1,98 @@
+"""
+Backend logic for automatically assigning students to graders
+"""
+import heapq
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from sga.backend.cache import bump_course_version
+from sga.backend.constants import SubmissionStatus
+from sga.models import Grader, Student, Submission
+
+
+def _count_by(queryset, field):
+    """
+    Returns a dict of field value to the number of rows in queryset with that value
+    """
+    return dict(queryset.values_list(field).annotate(Count("id")))
+
+
+def plan_grader_assignments(course, balance_workload=False):  # pylint: disable=too-many-locals
+    """
+    Returns a dict of grader id to the list of ids of the unassigned students in course that should
+    be assigned to that grader, never going over a grader's max_students.
+
+    Each student goes to the grader with the fewest students, or with balance_workload, to the grader
+    with the fewest not graded submissions (students with the most not graded submissions are
+    placed first so that the workload evens out), and then the fewest students, so that students
+    without not graded submissions are spread out too.
+    """
+    students = list(
+        Student.objects.filter(course=course, grader__isnull=True).order_by(
+            "user__username"
+        ).values_list("id", "user_id")
+    )
+    active_students = Student.objects.filter(course=course)
+    students_counts = _count_by(active_students.filter(grader__isnull=False), "grader")
+    if balance_workload:
+        not_graded = {"assignment__course": course, "status": SubmissionStatus.submitted}
+        workloads = _count_by(
+            Submission.objects.of_active_students(course=course, grader__isnull=False).filter(**not_graded),
+            "student__student__grader"
+        )
+        student_workloads = _count_by(
+            Submission.objects.of_active_students(course=course).filter(**not_graded),
+            "student"
+        )
+        # Stable sort, so students with the same workload stay in username order
+        students.sort(key=lambda student: -student_workloads.get(student[1], 0))
+    else:
+        workloads = students_counts
+        student_workloads = {}
+    # Heap of (load, students, grader id, remaining slots) for graders that can accept students
+    heap = []
+    for grader_id, max_students in Grader.objects.filter(course=course).values_list("id", "max_students"):
+        students_count = students_counts.get(grader_id, 0)
+        slots = max_students - students_count
+        if slots > 0:
+            heap.append((workloads.get(grader_id, 0), students_count, grader_id, slots))
+    heapq.heapify(heap)
+    plan = {}
+    for student_id, user_id in students:
+        if not heap:
+            break
+        load, students_count, grader_id, slots = heapq.heappop(heap)
+        plan.setdefault(grader_id, []).append(student_id)
+        load += student_workloads.get(user_id, 0) if balance_workload else 1
+        if slots > 1:
+            heapq.heappush(heap, (load, students_count + 1, grader_id, slots - 1))
+    return plan
+
+
+def auto_assign_graders(course, balance_workload=False):
+    """
+    Assigns unassigned students in course to graders (see plan_grader_assignments()) with a single
+    UPDATE in one transaction. Returns the plan that was applied.
+    """
+    with transaction.atomic():
+        # Lock the course's graders so that concurrent runs can't both fill the same slots
+        list(Grader.objects.select_for_update().filter(course=course).values_list("id"))
+        plan = plan_grader_assignments(course, balance_workload=balance_workload)
+        if plan:
+            student_ids = [student_id for ids in plan.values() for student_id in ids]
+            Student.objects.filter(pk__in=student_ids, grader__isnull=True).update(
+                grader=Case(
+                    *[When(pk__in=ids, then=Value(grader_id)) for grader_id, ids in plan.items()],
+                    output_field=IntegerField()
+                ),
+                # update() skips auto_now fields, and cached table rows are keyed on updated_on
+                updated_on=datetime.utcnow()
+            )
+            # update() skips Student.save(), so update the graders' active student counts here
+            Grader.update_active_students_counts(plan)
+    if plan:
+        # update() skips TimeStampedModel.save(), so invalidate the course's cached data here
+        bump_course_version(course.id)
+    return plan
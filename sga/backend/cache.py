@@ -0,0 +1,162 @@
+"""
+Shared cache helpers
+
+Cached values are namespaced per course and keyed by a course data version. Writes to course data
+bump the version (see TimeStampedModel.save()), which orphans every cached value for that course
+instead of having to find and delete each key. The version is also part of the ETag of course
+pages (see conditional_course_page), so browsers can revalidate them without the page being rendered.
+"""
+import hashlib
+from collections import Counter
+from functools import wraps
+from time import time
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from sga.backend import metrics
+
+COURSE_VERSION_KEY = "sga:course:{course_id}:version"
+COURSE_CACHE_KEY = "sga:course:{course_id}:v{version}:{name}"
+
+# Per-process hit/miss counters, keyed by cache name
+_hits = Counter()
+_misses = Counter()
+
+
+def get_cache():
+    """
+    Returns the cache used by SGA (configured with SGA_CACHE_ALIAS)
+    """
+    return caches[settings.SGA_CACHE_ALIAS]
+
+
+def _initial_version():
+    """
+    Returns a starting version for a course. Versions start from the current time so that a version
+    key which was evicted from the cache can never come back with a value that was already used.
+    """
+    return int(time() * 1000)
+
+
+def get_course_version(course_id):
+    """
+    Returns the current data version for a course
+    """
+    cache = get_cache()
+    key = COURSE_VERSION_KEY.format(course_id=course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_course_version(course_id):
+    """
+    Invalidates all cached values for a course by incrementing its data version
+    """
+    if course_id is None:
+        return
+    cache = get_cache()
+    key = COURSE_VERSION_KEY.format(course_id=course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Key doesn't exist yet (or was evicted)
+        cache.add(key, _initial_version(), timeout=None)
+
+
+def course_cache_key(course_id, name, *parts):
+    """
+    Returns a versioned cache key for a value belonging to a course
+    """
+    key = COURSE_CACHE_KEY.format(course_id=course_id, version=get_course_version(course_id), name=name)
+    if parts:
+        key = ":".join([key] + [str(part) for part in parts])
+    return key
+
+
+def get_or_set_course_value(course_id, name, compute, *parts, timeout=None):
+    """
+    Returns the cached value for (course_id, name, *parts), calling compute() and caching its
+    result on a miss
+    """
+    cache = get_cache()
+    key = course_cache_key(course_id, name, *parts)
+    value = cache.get(key)
+    if value is not None:
+        _hits[name] += 1
+        metrics.inc("sga_cache_requests_total", name=name, result="hit")
+        return value
+    _misses[name] += 1
+    metrics.inc("sga_cache_requests_total", name=name, result="miss")
+    value = compute()
+    cache.set(key, value, timeout=timeout if timeout is not None else settings.SGA_CACHE_TIMEOUT)
+    return value
+
+
+def get_course_page_etag(request, course_id, *args, **kwargs):  # pylint: disable=unused-argument
+    """
+    Returns the ETag of a course page for the requesting user: it changes with the course's data
+    version, the user's role and at least every SGA_PAGE_ETAG_LIFETIME seconds (pages show due date
+    status and expiring file links). Returns None, so the page is rendered, for requests other than
+    GET and HEAD and while the user has messages waiting to be shown.
+    """
+    if request.method not in ("GET", "HEAD") or get_messages(request):
+        return None
+    parts = [
+        settings.VERSION,
+        get_course_version(course_id),
+        request.role,
+        request.user.id,
+        int(time() // settings.SGA_PAGE_ETAG_LIFETIME)
+    ]
+    return hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def conditional_course_page(view_func):
+    """
+    Decorator for course page views (inside allowed_roles, which sets request.role) that answers
+    conditional GETs with 304 Not Modified while the page's ETag (see get_course_page_etag) is unchanged,
+    without calling the view. Browsers are told to revalidate the page every time they show it.
+    """
+    conditional_view = condition(etag_func=get_course_page_etag)(view_func)
+
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        """ Wrapped function """
+        response = conditional_view(request, *args, **kwargs)
+        if response.has_header("ETag"):
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+    return _wrapped_view
+
+
+def get_cache_stats():
+    """
+    Returns this process' cache hit/miss counts, overall and per cache name
+    """
+    hits = sum(_hits.values())
+    misses = sum(_misses.values())
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+        "by_name": {
+            name: {"hits": _hits[name], "misses": _misses[name]}
+            for name in set(_hits) | set(_misses)
+        }
+    }
+
+
+def reset_cache_stats():
+    """
+    Clears this process' cache hit/miss counts
+    """
+    _hits.clear()
+    _misses.clear()
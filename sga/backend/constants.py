@@ -1,6 +1,7 @@
 """
 Constant definitions
 """
+from collections import OrderedDict
 
 
 # Datetime formats
@@ -16,7 +17,11 @@ UNASSIGN_GRADER_CONFIRM = ("Are you sure you want to unassign the grader from th
                            "(You can reassign the same grader or a new grader after this action.)")
 UNASSIGN_STUDENT_CONFIRM = ("Are you sure you want to unassign this student from this grader? " +
                             "(You can reassign the same grader or a new grader after this action.)")
+ASSIGN_GRADERS_CONFIRM = ("Are you sure you want to assign all unassigned students to graders? " +
+                          "(Graders will not be given more than their max students.)")
 UNSUBMIT_CONFIRM = "Are you sure you want to mark this submission as not submitted?"
+RELAUNCH_TO_SUBMIT_MESSAGE = ("Your grade couldn't be sent to edX for this submission. Please open the assignment " +
+                              "from edX again, then submit.")
 
 
 INVALID_S3_CHARACTERS_REGEX = r"[^a-zA-Z0-9!\-_.*'()/]"
@@ -31,3 +36,49 @@ class Roles():
     grader = "grader"
     admin = "admin"
     none = "none"
+
+
+class Lateness():
+    """
+    Lateness definitions (see sga.backend.lateness)
+    """
+    on_time = "on_time"
+    in_grace = "in_grace"
+    late = "late"
+    missing = "missing"
+
+
+LATENESS_LABELS = OrderedDict([
+    (Lateness.on_time, "On Time"),
+    (Lateness.in_grace, "In Grace"),
+    (Lateness.late, "Late"),
+    (Lateness.missing, "Missing"),
+])
+
+
+class SubmissionStatus():
+    """
+    Submission status definitions, in the order of a submission's lifecycle (returned means the
+    grade was sent back to edX)
+    """
+    not_started = 0
+    submitted = 1
+    graded = 2
+    returned = 3
+
+
+SUBMISSION_STATUS_CHOICES = (
+    (SubmissionStatus.not_started, "Not Started"),
+    (SubmissionStatus.submitted, "Submitted"),
+    (SubmissionStatus.graded, "Graded"),
+    (SubmissionStatus.returned, "Returned"),
+)
+
+# The statuses each status can change to. Unsubmitting resets any submission, and returned
+# submissions can be regraded.
+SUBMISSION_STATUS_TRANSITIONS = {
+    SubmissionStatus.not_started: {SubmissionStatus.submitted},
+    SubmissionStatus.submitted: {SubmissionStatus.not_started, SubmissionStatus.graded},
+    SubmissionStatus.graded: {SubmissionStatus.not_started, SubmissionStatus.returned},
+    SubmissionStatus.returned: {SubmissionStatus.not_started, SubmissionStatus.graded},
+}
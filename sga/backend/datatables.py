@@ -0,0 +1,400 @@
+"""
+Server-side processing for the staff DataTables (https://datatables.net/manual/server-side)
+
+Paging, ordering and searching are pushed into SQL so that the cost of a request is bounded by the
+page size rather than by the size of the course.
+"""
+import operator
+from functools import reduce
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.http import JsonResponse
+
+from sga.backend.constants import LATENESS_LABELS, Lateness, SubmissionStatus
+from sga.backend.lateness import get_lateness_conditions
+from sga.models import Grader, Student, Submission
+
+
+class Column(object):
+    """
+    A table column. order_by is the ORM lookup (or annotation) the column sorts by and search is a
+    list of ORM lookups that the global search box matches against.
+    """
+    def __init__(self, name, order_by=None, search=None):
+        self.name = name
+        self.order_by = order_by
+        self.search = search or []
+
+
+def _get_int(params, key, default):
+    """
+    Returns params[key] as an int, or default if it's missing or not a number
+    """
+    try:
+        return int(params.get(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_table_params(request, columns):
+    """
+    Parses DataTables request parameters into a dict of draw, start, length, search and ordering
+    (a list of (Column, descending) tuples)
+    """
+    params = request.GET
+    length = _get_int(params, "length", settings.SGA_DATATABLES_PAGE_SIZE)
+    if length < 0 or length > settings.SGA_DATATABLES_MAX_PAGE_SIZE:
+        length = settings.SGA_DATATABLES_MAX_PAGE_SIZE
+    ordering = []
+    index = 0
+    while "order[{index}][column]".format(index=index) in params:
+        column_index = _get_int(params, "order[{index}][column]".format(index=index), -1)
+        if 0 <= column_index < len(columns) and columns[column_index].order_by:
+            descending = params.get("order[{index}][dir]".format(index=index)) == "desc"
+            ordering.append((columns[column_index], descending))
+        index += 1
+    return {
+        "draw": _get_int(params, "draw", 0),
+        "start": max(_get_int(params, "start", 0), 0),
+        "length": length,
+        "search": params.get("search[value]", "").strip(),
+        "filter": params.get("filter"),
+        "ordering": ordering
+    }
+
+
+def queryset_table_response(request, queryset, columns, get_row, filters=None):
+    """
+    Returns a DataTables JSON response for a QuerySet. filters maps names (passed in the "filter"
+    parameter) to Q objects for the table's filter buttons.
+    """
+    table_params = get_table_params(request, columns)
+    records_total = queryset.count()
+    filtered = False
+    if filters and table_params["filter"] in filters:
+        queryset = queryset.filter(filters[table_params["filter"]])
+        filtered = True
+    if table_params["search"]:
+        lookups = [
+            Q(**{"{lookup}__icontains".format(lookup=lookup): table_params["search"]})
+            for column in columns for lookup in column.search
+        ]
+        if lookups:
+            queryset = queryset.filter(reduce(operator.or_, lookups))
+            filtered = True
+    records_filtered = queryset.count() if filtered else records_total
+    order_by = [
+        "{sign}{lookup}".format(sign="-" if descending else "", lookup=column.order_by)
+        for column, descending in table_params["ordering"]
+    ]
+    # Always finish with the primary key so that pages are stable
+    start = table_params["start"]
+    page = queryset.order_by(*(order_by + ["pk"]))[start:start + table_params["length"]]
+    return JsonResponse({
+        "draw": table_params["draw"],
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
+        "data": [get_row(obj) for obj in page]
+    })
+
+
+def list_table_response(request, rows, columns, filters=None):
+    """
+    Returns a DataTables JSON response for a list of row dicts (for tables that are small enough to
+    be sorted in memory). filters maps filter names to predicates on a row.
+    """
+    table_params = get_table_params(request, columns)
+    records_total = len(rows)
+    if filters and table_params["filter"] in filters:
+        rows = [row for row in rows if filters[table_params["filter"]](row)]
+    if table_params["search"]:
+        search = table_params["search"].lower()
+        rows = [
+            row for row in rows
+            if any(search in str(row[lookup]).lower() for column in columns for lookup in column.search)
+        ]
+    # Sort by the least significant column first so that earlier columns take precedence
+    for column, descending in reversed(table_params["ordering"]):
+        rows = sorted(rows, key=operator.itemgetter(column.order_by), reverse=descending)
+    return JsonResponse({
+        "draw": table_params["draw"],
+        "recordsTotal": records_total,
+        "recordsFiltered": len(rows),
+        "data": rows[table_params["start"]:table_params["start"] + table_params["length"]]
+    })
+
+
+def _count_when(*args, **conditions):
+    """
+    Returns an aggregate counting the joined rows that match conditions (and any Q objects in args)
+    """
+    condition = reduce(operator.and_, args, Q(**conditions))
+    return Sum(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+
+
+STUDENT_COLUMNS = [
+    Column("name", order_by="user__username", search=["user__username"]),
+    Column("grader", order_by="grader__user__username", search=["grader__user__username"]),
+    Column("email", order_by="user__email", search=["user__email"]),
+    Column("not_graded_submissions_count", order_by="not_graded_submissions_count"),
+    Column("late_submissions_count", order_by="late_submissions_count"),
+]
+
+STUDENT_FILTERS = {
+    "has_no_grader": Q(grader__isnull=True),
+    "has_grader": Q(grader__isnull=False),
+    "has_not_graded_submissions": Q(not_graded_submissions_count__gt=0),
+    "has_late_submissions": Q(late_submissions_count__gt=0),
+}
+
+
+def get_student_table_queryset(course, grader_user=None, now=None):
+    """
+    Returns active students in a course annotated with their not graded and late submissions counts
+    """
+    students = Student.objects.filter(course=course)
+    if grader_user is not None:
+        students = students.filter(grader__user=grader_user)
+    late = get_lateness_conditions(now, prefix="user__submitted_submissions__")[Lateness.late]
+    return students.select_related("user", "grader__user").annotate(
+        not_graded_submissions_count=_count_when(
+            user__submitted_submissions__assignment__course=course,
+            user__submitted_submissions__status=SubmissionStatus.submitted
+        ),
+        late_submissions_count=_count_when(late, user__submitted_submissions__assignment__course=course)
+    )
+
+
+def get_student_row(student):
+    """
+    Returns the JSON row for a student
+    """
+    course_id = student.course_id
+    return {
+        "name": student.user.username,
+        "url": reverse("view_student", kwargs={"course_id": course_id, "student_user_id": student.user_id}),
+        "grader": student.grader.user.username if student.grader else None,
+        "grader_url": reverse(
+            "view_grader",
+            kwargs={"course_id": course_id, "grader_user_id": student.grader.user_id}
+        ) if student.grader else None,
+        "email": student.user.email,
+        "not_graded_submissions_count": student.not_graded_submissions_count,
+        "late_submissions_count": student.late_submissions_count
+    }
+
+
+ASSIGNMENT_COLUMNS = [
+    Column("name", order_by="name", search=["name"]),
+    Column("not_submitted_count", order_by="not_submitted_count"),
+    Column("not_graded_count", order_by="not_graded_count"),
+    Column("graded_count", order_by="graded_count"),
+]
+
+ASSIGNMENT_FILTERS = {
+    "has_not_submitted": Q(not_submitted_count__gt=0),
+    "has_not_graded": Q(not_graded_count__gt=0),
+    "has_graded": Q(graded_count__gt=0),
+}
+
+
+def get_assignment_table_queryset(course, grader_user=None):
+    """
+    Returns assignments in a course annotated with submission counts (scoped to a grader's students
+    if grader_user is set, with the same semantics as the count methods on Assignment)
+    """
+    active_student = {
+        "submissions__student__student__course": course,
+        "submissions__student__student__deleted": False
+    }
+    if grader_user is None:
+        graded_count = _count_when(submissions__status__gte=SubmissionStatus.graded, **active_student)
+        not_graded_count = _count_when(submissions__status=SubmissionStatus.submitted, **active_student)
+        students_count = Student.objects.filter(course=course).count()
+        not_submitted_count = Value(students_count, output_field=IntegerField()) - graded_count - not_graded_count
+    else:
+        grader = Grader.objects.get(user=grader_user, course=course)
+        own_student = dict(active_student, submissions__student__student__grader=grader)
+        # Includes everything the grader graded, even for students no longer assigned to them
+        graded_count = _count_when(
+            submissions__status__gte=SubmissionStatus.graded,
+            submissions__graded_by=grader_user,
+            **active_student
+        )
+        not_graded_count = _count_when(submissions__status=SubmissionStatus.submitted, **own_student)
+        current_graded_count = _count_when(
+            submissions__status__gte=SubmissionStatus.graded,
+            submissions__graded_by=grader_user,
+            **own_student
+        )
+        not_submitted_count = (
+            Value(grader.get_number_of_students(), output_field=IntegerField())
+            - current_graded_count
+            - not_graded_count
+        )
+    return course.assignments.annotate(
+        graded_count=graded_count,
+        not_graded_count=not_graded_count,
+        not_submitted_count=not_submitted_count
+    )
+
+
+def get_assignment_row(assignment):
+    """
+    Returns the JSON row for an assignment
+    """
+    return {
+        "name": assignment.name,
+        "url": reverse(
+            "view_assignment",
+            kwargs={"course_id": assignment.course_id, "assignment_id": assignment.id}
+        ),
+        "not_submitted_count": assignment.not_submitted_count,
+        "not_graded_count": assignment.not_graded_count,
+        "graded_count": assignment.graded_count
+    }
+
+
+SUBMISSION_COLUMNS = [
+    Column("student", order_by="user__username", search=["user__username"]),
+    Column("submitted", order_by="submitted"),
+    Column("graded", order_by="graded"),
+    Column("lateness"),
+]
+
+SUBMISSION_FILTERS = {
+    "submitted": Q(submitted__gt=0),
+    "not_submitted": Q(submitted=0),
+    "not_graded": Q(submitted__gt=0, graded=0),
+    "graded": Q(graded__gt=0),
+    Lateness.on_time: Q(on_time__gt=0),
+    Lateness.in_grace: Q(in_grace__gt=0),
+    Lateness.late: Q(late__gt=0),
+}
+
+
+def get_submission_filters(assignment, now=None):
+    """
+    Returns the submission table filters for an assignment. Students who haven't submitted are
+    missing once the assignment's grace period is over.
+    """
+    missing = Q(submitted=0) if assignment.is_past_deadline(now) else Q(pk__in=[])
+    return dict(SUBMISSION_FILTERS, **{Lateness.missing: missing})
+
+
+def get_submission_table_queryset(assignment, grader_user=None, now=None):
+    """
+    Returns active students in an assignment's course, annotated with the status and lateness of their
+    submission for the assignment (students without a Submission are not submitted)
+    """
+    students = Student.objects.filter(course_id=assignment.course_id)
+    if grader_user is not None:
+        students = students.filter(grader__user=grader_user)
+    conditions = get_lateness_conditions(now, prefix="user__submitted_submissions__")
+    return students.select_related("user").annotate(
+        submitted=_count_when(
+            user__submitted_submissions__assignment=assignment,
+            user__submitted_submissions__status__gte=SubmissionStatus.submitted
+        ),
+        graded=_count_when(
+            user__submitted_submissions__assignment=assignment,
+            user__submitted_submissions__status__gte=SubmissionStatus.graded
+        ),
+        **{
+            lateness: _count_when(conditions[lateness], user__submitted_submissions__assignment=assignment)
+            for lateness in (Lateness.on_time, Lateness.in_grace, Lateness.late)
+        }
+    )
+
+
+def get_submission_lateness(student, assignment, now=None):
+    """
+    Returns the lateness of a student's submission for an assignment, from the annotations of
+    get_submission_table_queryset (None if it isn't due yet)
+    """
+    for lateness in (Lateness.on_time, Lateness.in_grace, Lateness.late):
+        if getattr(student, lateness):
+            return lateness
+    if assignment.is_past_deadline(now):
+        return Lateness.missing
+    return None
+
+
+def get_submission_row(student, assignment):
+    """
+    Returns the JSON row for a student's submission for an assignment
+    """
+    kwargs = {"course_id": assignment.course_id, "student_user_id": student.user_id}
+    return {
+        "student": student.user.username,
+        "student_url": reverse("view_student", kwargs=kwargs),
+        "submitted": "Yes" if student.submitted else "No",
+        "graded": "Yes" if student.graded else "No",
+        "lateness": LATENESS_LABELS.get(get_submission_lateness(student, assignment), ""),
+        "submission_url": reverse("view_submission_as_staff", kwargs=dict(kwargs, assignment_id=assignment.id))
+    }
+
+
+GRADER_COLUMNS = [
+    Column("name", order_by="name", search=["name"]),
+    Column("students_count", order_by="students_count"),
+    Column("max_students", order_by="max_students"),
+    Column("graded_count", order_by="graded_count"),
+    Column("not_graded_count", order_by="not_graded_count"),
+    Column("available_slots_count", order_by="available_slots_count"),
+]
+
+GRADER_FILTERS = {
+    "accepting_students": lambda row: row["available_slots_count"] > 0,
+    "has_students": lambda row: row["students_count"] > 0,
+    "has_no_students": lambda row: row["students_count"] == 0,
+    "has_not_graded_submissions": lambda row: row["not_graded_count"] > 0,
+}
+
+
+def get_grader_counts(course):
+    """
+    Returns dicts of active students count and not graded submissions count by grader id, and graded
+    submissions count by grader user id, for the graders in a course. Each count is a single grouped
+    query, since joining them all onto the graders would multiply the joined rows.
+    """
+    students_counts = dict(
+        Student.objects.filter(course=course, grader__isnull=False).values_list(
+            "grader"
+        ).annotate(Count("id"))
+    )
+    graded_counts = dict(
+        Submission.objects.of_active_students(course=course).filter(
+            assignment__course=course,
+            status__gte=SubmissionStatus.graded
+        ).values_list("graded_by").annotate(Count("id"))
+    )
+    not_graded_counts = dict(
+        Submission.objects.of_active_students(course=course, grader__isnull=False).filter(
+            assignment__course=course,
+            status=SubmissionStatus.submitted
+        ).values_list("student__student__grader").annotate(Count("id"))
+    )
+    return students_counts, graded_counts, not_graded_counts
+
+
+def get_grader_rows(course):
+    """
+    Returns JSON rows for all graders in a course
+    """
+    students_counts, graded_counts, not_graded_counts = get_grader_counts(course)
+    rows = []
+    for grader in Grader.objects.filter(course=course).select_related("user"):
+        students_count = students_counts.get(grader.id, 0)
+        rows.append({
+            "name": grader.user.username,
+            "url": reverse("view_grader", kwargs={"course_id": course.id, "grader_user_id": grader.user_id}),
+            "students_count": students_count,
+            "max_students": grader.max_students,
+            "graded_count": graded_counts.get(grader.user_id, 0),
+            "not_graded_count": not_graded_counts.get(grader.id, 0),
+            "available_slots_count": grader.max_students - students_count
+        })
+    return rows
@@ -0,0 +1,38 @@
+"""
+Database connection helpers
+
+With CONN_MAX_AGE set, a connection outlives the request that opened it. If the server (or a pooler)
+closes it in the meantime, Django only notices when the next request's first query fails, so
+check_connections() makes sure a connection that has been idle for a while is still usable before a
+request gets it.
+"""
+from time import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):  # pylint: disable=unused-argument
+    """
+    Closes open connections that have been idle for longer than SGA_DB_HEALTH_CHECK_INTERVAL and
+    no longer work, so that the request opens a new one (request_started receiver)
+    """
+    now = time()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        last_used = getattr(connection, "sga_last_used", None)
+        if last_used is not None and now - last_used < settings.SGA_DB_HEALTH_CHECK_INTERVAL:
+            continue
+        if not connection.is_usable():
+            connection.close()
+
+
+def mark_connections_used(**kwargs):  # pylint: disable=unused-argument
+    """
+    Notes when each open connection was last used (request_finished receiver)
+    """
+    now = time()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.sga_last_used = now
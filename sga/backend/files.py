@@ -2,20 +2,28 @@
 Backend logic for file uploads and downloads
 """
 
+import hashlib
 import os
 import re
-from io import BytesIO
+from io import BytesIO, UnsupportedOperation
+from time import time
 from zipfile import ZipFile, ZIP_DEFLATED
 
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import models
+from django.db.models.fields.files import FieldFile
 from django.http.response import StreamingHttpResponse
 
-from sga.backend.constants import INVALID_S3_CHARACTERS_REGEX, Roles
+from sga.backend import metrics
+from sga.backend.constants import INVALID_S3_CHARACTERS_REGEX, Roles, SubmissionStatus
 
 
 class StreamingBytesIO(BytesIO):
     """
     Implementation of BytesIO that allows us to keep track of the stream's virtual position
-    while simultaneously emptying the stream as we go.
+    while simultaneously emptying the stream as we go. The stream is not seekable, so ZipFile writes
+    sizes after each file instead of seeking back to the (already emptied) file header.
     """
     _position = 0
 
@@ -25,7 +33,19 @@ class StreamingBytesIO(BytesIO):
         """
         self._position = self.tell()
         self.truncate(0)
-        self.seek(0)
+        super().seek(0)
+
+    def seekable(self):
+        """
+        Returns False since earlier parts of the stream are gone
+        """
+        return False
+
+    def seek(self, *args):  # pylint: disable=unused-argument
+        """
+        Raises UnsupportedOperation since earlier parts of the stream are gone
+        """
+        raise UnsupportedOperation("seek")
 
     def tell(self):
         """
@@ -35,6 +55,131 @@ class StreamingBytesIO(BytesIO):
         return self._position + super().tell()
 
 
+class HashingUploadHandlerMixin():
+    """
+    Mixin for upload handlers that hashes uploaded files as their chunks stream in, and sets the
+    hex digest as the sha256 attribute of the uploaded file
+    """
+    content_hash = None
+
+    def new_file(self, *args, **kwargs):
+        """
+        Starts hashing a new file (before the handler, which may stop the handlers after it)
+        """
+        self.content_hash = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        """
+        Adds a chunk to the hash
+        """
+        self.content_hash.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        """
+        Sets the hash on the uploaded file, if this handler made it
+        """
+        uploaded_file = super().file_complete(file_size)
+        if uploaded_file is not None:
+            uploaded_file.sha256 = self.content_hash.hexdigest()
+        return uploaded_file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadHandlerMixin, MemoryFileUploadHandler):
+    """
+    MemoryFileUploadHandler that hashes uploaded files
+    """
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadHandlerMixin, TemporaryFileUploadHandler):
+    """
+    TemporaryFileUploadHandler that hashes uploaded files
+    """
+
+
+def get_content_hash(content):
+    """
+    Returns the SHA-256 hex digest of a file, using the one computed during upload if there is one
+    """
+    content_hash = getattr(content, "sha256", None) or getattr(getattr(content, "file", None), "sha256", None)
+    if content_hash is None:
+        hasher = hashlib.sha256()
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        content_hash = hasher.hexdigest()
+    return content_hash
+
+
+def content_addressed_file_path(content_hash, filename):
+    """
+    Returns the storage path of a file with the given content hash, keeping filename's extension
+    """
+    return "uploads/sha256/{prefix}/{content_hash}{extension}".format(
+        prefix=content_hash[:2],
+        content_hash=content_hash,
+        extension=os.path.splitext(filename)[1].lower()
+    )
+
+
+class ContentAddressedFieldFile(FieldFile):
+    """
+    FieldFile that saves files under their content hash, and only uploads files whose content isn't
+    stored yet
+    """
+    def save(self, name, content, save=True):
+        """
+        Sets the hash field and saves the file, unless a file with the same content is stored already
+        """
+        setattr(self.instance, self.field.hash_field, get_content_hash(content))
+        name = self.field.generate_filename(self.instance, name)
+        if self.storage.exists(name):
+            self.name = name
+        else:
+            self.name = self.storage.save(name, content, max_length=self.field.max_length)
+        setattr(self.instance, self.field.name, self.name)
+        self._size = content.size  # pylint: disable=attribute-defined-outside-init
+        self._committed = True
+        if save:
+            self.instance.save()
+    save.alters_data = True
+
+
+class ContentAddressedFileField(models.FileField):
+    """
+    FileField for files stored under their SHA-256 hash (see content_addressed_file_path), so that
+    identical uploads are stored once. hash_field names the model field that holds the hash.
+    """
+    attr_class = ContentAddressedFieldFile
+
+    def __init__(self, *args, hash_field=None, **kwargs):
+        self.hash_field = hash_field
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        """
+        Adds hash_field to the field's migration arguments
+        """
+        name, path, args, kwargs = super().deconstruct()
+        kwargs["hash_field"] = self.hash_field
+        return name, path, args, kwargs
+
+    def generate_filename(self, instance, filename):
+        """
+        Returns the storage path of the file from the instance's hash field
+        """
+        return content_addressed_file_path(getattr(instance, self.hash_field), filename)
+
+    def pre_save(self, model_instance, add):
+        """
+        Clears the hash field when the file is cleared
+        """
+        field_file = super().pre_save(model_instance, add)
+        if not field_file:
+            setattr(model_instance, self.hash_field, None)
+        return field_file
+
+
 def convert_illegal_S3_chars(path, replace_with="_"):
     """
     Converts illegal S3 characters to replace_with
@@ -53,19 +198,55 @@ def serve_zip_file(submissions, zipname="zipfile"):
 
 def submissions_zip_generator(submissions):
     """ Generator to create the streaming response from the submissions """
+    start = time()
     bytes_io = StreamingBytesIO()
-    with ZipFile(bytes_io, mode="w", compression=ZIP_DEFLATED, allowZip64=True) as zip_file:
-        for submission in submissions:
-            filename = os.path.basename(submission.student_document.name)
-            zip_file.writestr(filename, submission.student_document.read())
-            yield bytes_io.getvalue()
-            bytes_io.empty()
-    yield bytes_io.getvalue()
+    try:
+        with ZipFile(bytes_io, mode="w", compression=ZIP_DEFLATED, allowZip64=True) as zip_file:
+            for submission in submissions:
+                filename = get_student_document_filename(submission)
+                zip_file.writestr(filename, submission.student_document.read())
+                yield bytes_io.getvalue()
+                bytes_io.empty()
+        yield bytes_io.getvalue()
+    finally:
+        # Also recorded for downloads that were cut short
+        metrics.observe("sga_zip_download_bytes", bytes_io.tell())
+        metrics.observe("sga_zip_download_seconds", time() - start)
+
+
+def get_student_document_filename(submission):
+    """
+    Returns the file name of a submission's student document in ZIP downloads
+    """
+    return os.path.basename(student_submission_file_path(submission, submission.student_document.name))
+
+
+def get_submissions_zip_etag(request, course_id, assignment_id, not_graded_only=False,
+                             **kwargs):  # pylint: disable=unused-argument
+    """
+    Returns the ETag of a submissions ZIP download, made from the names and content hashes of the
+    documents in it. Returns None, so the ZIP is streamed, if a document has no hash yet (see the
+    hashdocuments command).
+    """
+    from sga.models import Assignment
+    assignment = Assignment.objects.filter(course_id=course_id, id=assignment_id).first()
+    if assignment is None:
+        return None
+    parts = [settings.VERSION, assignment.name]
+    documents = get_submitted_submissions(request, assignment, not_graded_only=not_graded_only).order_by(
+        "id"
+    ).values_list("student__username", "student_document", "student_document_sha256")
+    for username, document_name, document_hash in documents:
+        if document_hash is None:
+            return None
+        parts.extend([username, os.path.splitext(document_name)[1], document_hash])
+    return hashlib.sha1(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
 
 
 def student_submission_file_path(instance, filename):
     """
-    Returns the upload destination path (including filename) for a student submission
+    Returns the path (including filename) that student submissions were uploaded to before they were
+    stored under their content hash. Its file name is still used in ZIP downloads.
     """
     path = "{course_id}/student-uploads/{assignment_id}/{username}-{assignment_name}{extension}".format(
         course_id=instance.assignment.course.edx_id,
@@ -79,7 +260,8 @@ def student_submission_file_path(instance, filename):
 
 def grader_submission_file_path(instance, filename):
     """
-    Returns the upload destination path (including filename) for a grader submission
+    Returns the path (including filename) that grader submissions were uploaded to before they were
+    stored under their content hash
     """
     path = "{course_id}/grader-uploads/{assignment_id}/{username}-{assignment_name}{extension}".format(
         course_id=instance.assignment.course.edx_id,
@@ -95,19 +277,18 @@ def get_submitted_submissions(request, assignment, not_graded_only=False):
     """
     Retrieves a lazy list of submitted submissions for this assignment, taking into account the role of the user
     """
-    from sga.models import Submission, Grader
+    from sga.models import Submission
+    student_lookups = {"course": assignment.course_id}
+    if request.role == Roles.grader:
+        # Students' graders are graders of their course
+        student_lookups["grader__user"] = request.user
     # We can chain QuerySets because they are lazy
-    submissions = Submission.objects.filter(
+    submissions = Submission.objects.of_active_students(**student_lookups).filter(
         assignment=assignment,
-        student__student__deleted=False,
-        submitted=True
+        status__gte=SubmissionStatus.submitted
     ).exclude(
         student_document=""
     )
-    if request.role == Roles.grader:
-        grader = Grader.objects.get(user=request.user, course=assignment.course_id)
-        student_users = [student.user for student in grader.students.filter(deleted=False)]
-        submissions = submissions.filter(student__in=student_users)
     if not_graded_only:
-        submissions = submissions.exclude(graded=True)
+        submissions = submissions.filter(status=SubmissionStatus.submitted)
     return submissions
@@ -0,0 +1,102 @@
+"""
+Backend logic for exporting a course's grades
+"""
+import csv
+
+from django.http.response import StreamingHttpResponse
+
+from sga.backend.constants import SubmissionStatus
+from sga.models import Student, Submission
+
+# Number of students (rows) loaded per query
+GRADEBOOK_BATCH_SIZE = 500
+
+
+class Echo(object):
+    """
+    File-like object that returns what is written to it, so csv.writer output can be streamed
+    """
+    def write(self, value):  # pylint: disable=no-self-use
+        """
+        Returns value instead of buffering it
+        """
+        return value
+
+
+def get_submission_status(status):
+    """
+    Returns the gradebook status for a submission status (returned submissions are graded)
+    """
+    if status >= SubmissionStatus.graded:
+        return "Graded"
+    if status == SubmissionStatus.submitted:
+        return "Submitted"
+    return "Not Submitted"
+
+
+def get_student_rows(course, assignments, students):
+    """
+    Returns gradebook rows for a batch of students ((user id, username, email) tuples), with one
+    query for all of their submissions
+    """
+    submissions = Submission.objects.filter(
+        assignment__course=course,
+        student_id__in=[user_id for user_id, _, _ in students]
+    ).values_list("student_id", "assignment_id", "status", "grade", "graded_at")
+    submissions = {(values[0], values[1]): values[2:] for values in submissions}
+    rows = []
+    for user_id, username, email in students:
+        row = [username, email]
+        for assignment_id, _ in assignments:
+            status, grade, graded_at = submissions.get(
+                (user_id, assignment_id),
+                (SubmissionStatus.not_started, None, None)
+            )
+            graded = status >= SubmissionStatus.graded
+            row.extend([
+                get_submission_status(status),
+                grade if graded else "",
+                graded_at.isoformat() if graded and graded_at else ""
+            ])
+        rows.append(row)
+    return rows
+
+
+def gradebook_rows(course, grader=None):
+    """
+    Generator of gradebook rows for a course: a header row, then one row per active student (only
+    the grader's students if grader is set) with the status, grade and graded at time of each
+    assignment. Students are loaded in batches so memory use doesn't depend on the course size.
+    """
+    assignments = list(course.assignments.order_by("id").values_list("id", "name"))
+    header = ["Student", "Email"]
+    for _, name in assignments:
+        header.extend([
+            "{name} Status".format(name=name),
+            "{name} Grade".format(name=name),
+            "{name} Graded At".format(name=name)
+        ])
+    yield header
+    students = Student.objects.filter(course=course)
+    if grader is not None:
+        students = students.filter(grader=grader)
+    students = students.order_by("user__username").values_list("user_id", "user__username", "user__email")
+    batch = list(students[:GRADEBOOK_BATCH_SIZE])
+    while batch:
+        yield from get_student_rows(course, assignments, batch)
+        batch = list(students.filter(user__username__gt=batch[-1][1])[:GRADEBOOK_BATCH_SIZE])
+
+
+def serve_gradebook(course, grader=None):
+    """
+    Returns a streaming CSV response of the gradebook for a course
+    """
+    writer = csv.writer(Echo())
+    resp = StreamingHttpResponse(
+        (writer.writerow(row) for row in gradebook_rows(course, grader=grader)),
+        content_type="text/csv"
+    )
+    resp["Content-Disposition"] = "attachment; filename={course_edx_id} - Gradebook.csv".format(
+        course_edx_id=course.edx_id
+    )
+    return resp
@@ -0,0 +1,116 @@
+"""
+Backend logic for grading many submissions at once
+"""
+import csv
+import io
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, TextField, Value, When
+
+from sga.backend.cache import bump_course_version
+from sga.backend.constants import SubmissionStatus
+from sga.backend.send_grades import send_grades
+from sga.models import Submission
+
+# Number of submissions written per UPDATE statement
+BULK_GRADE_BATCH_SIZE = 500
+
+
+def bulk_grade_submissions(grades, grader_user):
+    """
+    Saves grades for many submissions at once. grades maps Submission objects to (grade, feedback)
+    tuples. All of the grades are written in one transaction with a single UPDATE per batch, and
+    the updated Submission objects are returned. Only submitted submissions are graded, since
+    update() doesn't check status changes the way Submission.save() does.
+    """
+    submissions = list(grades)
+    if not submissions:
+        return []
+    now = datetime.utcnow()
+    with transaction.atomic():
+        for start in range(0, len(submissions), BULK_GRADE_BATCH_SIZE):
+            batch = submissions[start:start + BULK_GRADE_BATCH_SIZE]
+            Submission.objects.filter(
+                pk__in=[submission.pk for submission in batch],
+                status__gte=SubmissionStatus.submitted
+            ).update(
+                grade=Case(
+                    *[When(pk=submission.pk, then=Value(grades[submission][0])) for submission in batch],
+                    output_field=IntegerField()
+                ),
+                feedback=Case(
+                    *[When(pk=submission.pk, then=Value(grades[submission][1])) for submission in batch],
+                    output_field=TextField()
+                ),
+                status=SubmissionStatus.graded,
+                graded_by=grader_user,
+                graded_at=now,
+                # update() skips auto_now fields, and cached table rows are keyed on updated_on
+                updated_on=now
+            )
+    # update() skips TimeStampedModel.save(), so invalidate the course's cached data here
+    for course_id in {submission.assignment.course_id for submission in submissions}:
+        bump_course_version(course_id)
+    for submission in submissions:
+        submission.grade, submission.feedback = grades[submission]
+        submission.status = SubmissionStatus.graded
+        submission.graded_by = grader_user
+        submission.graded_at = now
+        submission.updated_on = now
+    return submissions
+
+
+def mark_grades_returned(submissions):
+    """
+    Marks graded submissions as returned once their grades have been sent to edX
+    """
+    if not submissions:
+        return
+    now = datetime.utcnow()
+    Submission.objects.filter(
+        pk__in=[submission.pk for submission in submissions],
+        status=SubmissionStatus.graded
+    ).update(status=SubmissionStatus.returned, updated_on=now)
+    for course_id in {submission.assignment.course_id for submission in submissions}:
+        bump_course_version(course_id)
+    for submission in submissions:
+        submission.status = SubmissionStatus.returned
+        submission.updated_on = now
+
+
+def return_grades(submissions):
+    """
+    Sends the grades of graded submissions to edX and marks the ones that were sent as returned.
+    Returns a list of (submission, SendGradeFailure) for the grades that could not be sent, which
+    stay graded so they can be sent again.
+    """
+    failures = send_grades(submissions)
+    failed_submissions = {submission for submission, _ in failures}
+    mark_grades_returned([submission for submission in submissions if submission not in failed_submissions])
+    return failures
+
+
+def parse_grades_csv(csv_file):
+    """
+    Reads an uploaded CSV file with username, grade and (optional) feedback columns. Returns a list
+    of (username, grade, feedback) tuples with grade and feedback as unvalidated strings.
+    Raises ValueError if the file can't be read.
+    """
+    try:
+        text = csv_file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ValueError("The file must be UTF-8 encoded")
+    reader = csv.DictReader(io.StringIO(text))
+    fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+    if "username" not in fieldnames or "grade" not in fieldnames:
+        raise ValueError("The file must have a header row with username and grade columns")
+    reader.fieldnames = fieldnames
+    return [
+        (
+            (row["username"] or "").strip(),
+            (row["grade"] or "").strip(),
+            (row.get("feedback") or "").strip()
+        )
+        for row in reader
+    ]
@@ -0,0 +1,165 @@
+"""
+Per-request SQL and template timing, for sampled requests (see InstrumentationMiddleware)
+
+Profiling is switched on per thread, so requests that aren't sampled only pay for a thread-local
+lookup when a cursor is created or a template is rendered.
+"""
+import inspect
+import os
+import threading
+from time import time
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.utils import CursorWrapper
+from django.template.backends.django import Template
+
+import sga
+
+SGA_DIR = os.path.dirname(sga.__file__)
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestProfile(object):
+    """
+    Queries and template render time recorded during one request
+    """
+    def __init__(self):
+        self.start = time()
+        self.queries = []
+        self.template_duration = 0.0
+
+    def add_query(self, sql, duration, call_site):
+        """
+        Records an executed statement
+        """
+        self.queries.append((duration, sql, call_site))
+
+    @property
+    def db_duration(self):
+        """
+        Returns the total time (in seconds) spent executing statements
+        """
+        return sum(duration for duration, _, _ in self.queries)
+
+    def slowest_queries(self, count):
+        """
+        Returns the count slowest statements as (duration, sql, call site) tuples, slowest first
+        """
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[:count]
+
+    def server_timing(self, total_duration):
+        """
+        Returns a Server-Timing header value for the request
+        """
+        return 'db;dur={db:.1f};desc="{count} queries", tpl;dur={tpl:.1f}, total;dur={total:.1f}'.format(
+            db=self.db_duration * 1000,
+            count=len(self.queries),
+            tpl=self.template_duration * 1000,
+            total=total_duration * 1000
+        )
+
+
+def start_profile():
+    """
+    Starts profiling the current thread's request and returns the profile
+    """
+    _local.profile = RequestProfile()
+    return _local.profile
+
+
+def stop_profile():
+    """
+    Stops profiling the current thread and returns its profile (None if it wasn't being profiled)
+    """
+    profile = getattr(_local, "profile", None)
+    _local.profile = None
+    return profile
+
+
+def get_profile():
+    """
+    Returns the current thread's profile, or None if it isn't being profiled
+    """
+    return getattr(_local, "profile", None)
+
+
+def get_call_site():
+    """
+    Returns "path:line in function" for the innermost frame in SGA code (other than this module)
+    that led to the current call, or "" if there is none (e.g. a query made by Django itself)
+    """
+    frame = inspect.currentframe()
+    try:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(SGA_DIR) and filename != __file__:
+                return "{path}:{line} in {function}".format(
+                    path=os.path.relpath(filename, os.path.dirname(SGA_DIR)),
+                    line=frame.f_lineno,
+                    function=frame.f_code.co_name
+                )
+            frame = frame.f_back
+        return ""
+    finally:
+        del frame
+
+
+class ProfilingCursorWrapper(CursorWrapper):
+    """
+    Cursor wrapper that records each statement's duration and call site in a RequestProfile
+    """
+    def __init__(self, cursor, db, profile):
+        super().__init__(cursor, db)
+        self.profile = profile
+
+    def execute(self, sql, params=None):
+        start = time()
+        try:
+            return super().execute(sql, params)
+        finally:
+            self.profile.add_query(sql, time() - start, get_call_site())
+
+    def executemany(self, sql, param_list):
+        start = time()
+        try:
+            return super().executemany(sql, param_list)
+        finally:
+            self.profile.add_query(sql, time() - start, get_call_site())
+
+
+def install():
+    """
+    Hooks profiling into database cursors and template rendering. Safe to call more than once.
+    """
+    global _installed  # pylint: disable=global-statement
+    with _install_lock:
+        if _installed:
+            return
+        original_cursor = BaseDatabaseWrapper.cursor
+        original_render = Template.render
+
+        def cursor(self):
+            """ Wraps the cursor in a ProfilingCursorWrapper when the thread is being profiled """
+            wrapped = original_cursor(self)
+            profile = get_profile()
+            if profile is not None:
+                wrapped = ProfilingCursorWrapper(wrapped, self, profile)
+            return wrapped
+
+        def render(self, context=None, request=None):
+            """ Adds the render time to the thread's profile when it is being profiled """
+            profile = get_profile()
+            if profile is None:
+                return original_render(self, context=context, request=request)
+            start = time()
+            try:
+                return original_render(self, context=context, request=request)
+            finally:
+                profile.template_duration += time() - start
+
+        BaseDatabaseWrapper.cursor = cursor
+        Template.render = render
+        _installed = True
@@ -0,0 +1,157 @@
+"""
+Lateness of submissions, computed in SQL from submitted_at, the assignment's due_date and its
+grace_period (in hours)
+
+A submitted submission is on time up to the due date, in grace up to the end of the grace period
+and late after that. A submission that isn't submitted is missing once the grace period is over (and
+has no lateness before then). Each query compares against the current time when it runs.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import pytz
+from django.db.models import (
+    Case,
+    CharField,
+    DateTimeField,
+    F,
+    Func,
+    IntegerField,
+    Q,
+    Sum,
+    Value,
+    When
+)
+
+from sga.backend.constants import Lateness, SubmissionStatus
+
+
+def get_now(now=None):
+    """
+    Returns now, or the current time if it's None
+    """
+    return now or datetime.utcnow().replace(tzinfo=pytz.UTC)
+
+
+def get_deadline(due_date, grace_period):
+    """
+    Returns the time after which submissions are late, or None if there is no due date
+    """
+    if due_date is None:
+        return None
+    return due_date + timedelta(hours=grace_period)
+
+
+class AddHours(Func):
+    """
+    Adds a number of hours (an integer expression) to a datetime expression. Django can't multiply
+    durations on every backend, so each backend gets its own date arithmetic.
+    """
+    template = "(%(datetime)s + %(hours)s * INTERVAL '1 hour')"
+    sqlite_template = "datetime(%(datetime)s, %(hours)s || ' hours')"
+    mysql_template = "DATE_ADD(%(datetime)s, INTERVAL %(hours)s HOUR)"
+
+    def __init__(self, datetime_expression, hours):
+        super().__init__(datetime_expression, hours, output_field=DateTimeField())
+
+    def as_sql(self, compiler, connection, template=None):  # pylint: disable=arguments-differ
+        datetime_sql, datetime_params = compiler.compile(self.source_expressions[0])
+        hours_sql, hours_params = compiler.compile(self.source_expressions[1])
+        template = template or self.template
+        return template % {"datetime": datetime_sql, "hours": hours_sql}, datetime_params + hours_params
+
+    def as_sqlite(self, compiler, connection):
+        """ SQLite stores datetimes as text """
+        return self.as_sql(compiler, connection, template=self.sqlite_template)
+
+    def as_mysql(self, compiler, connection):
+        """ MySQL has no INTERVAL multiplication """
+        return self.as_sql(compiler, connection, template=self.mysql_template)
+
+
+def _get_deadline_expression(assignment_prefix):
+    """
+    Returns an expression for the deadline of the assignment at assignment_prefix
+    """
+    return AddHours(
+        F("{prefix}due_date".format(prefix=assignment_prefix)),
+        F("{prefix}grace_period".format(prefix=assignment_prefix))
+    )
+
+
+def _get_overdue_condition(now, assignment_prefix):
+    """
+    Returns a Q object matching assignments at assignment_prefix whose grace period is over
+    """
+    return Q(**{
+        "{prefix}due_date__lte".format(prefix=assignment_prefix): AddHours(
+            Value(now, output_field=DateTimeField()),
+            F("{prefix}grace_period".format(prefix=assignment_prefix)) * -1
+        )
+    })
+
+
+def get_lateness_conditions(now=None, prefix=""):
+    """
+    Returns an OrderedDict of lateness to the Q object matching submissions with that lateness.
+    prefix is the lookup path from the queried model to the submission (e.g.
+    "user__submitted_submissions__" for a Student queryset).
+    """
+    now = get_now(now)
+    assignment_prefix = "{prefix}assignment__".format(prefix=prefix)
+    due_date = "{prefix}due_date".format(prefix=assignment_prefix)
+    submitted_at = "{prefix}submitted_at".format(prefix=prefix)
+    submitted = Q(**{"{prefix}status__gte".format(prefix=prefix): SubmissionStatus.submitted})
+    deadline = _get_deadline_expression(assignment_prefix)
+    return OrderedDict([
+        (Lateness.on_time, submitted & (
+            Q(**{"{due_date}__isnull".format(due_date=due_date): True}) |
+            Q(**{"{submitted_at}__isnull".format(submitted_at=submitted_at): True}) |
+            Q(**{"{submitted_at}__lte".format(submitted_at=submitted_at): F(due_date)})
+        )),
+        (Lateness.in_grace, submitted & Q(**{
+            "{submitted_at}__gt".format(submitted_at=submitted_at): F(due_date),
+            "{submitted_at}__lte".format(submitted_at=submitted_at): deadline,
+        })),
+        (Lateness.late, submitted & Q(**{"{submitted_at}__gt".format(submitted_at=submitted_at): deadline})),
+        (Lateness.missing, ~submitted & _get_overdue_condition(now, assignment_prefix)),
+    ])
+
+
+def get_lateness_annotation(now=None, prefix=""):
+    """
+    Returns an expression for the lateness of a submission (None if it isn't due yet)
+    """
+    conditions = get_lateness_conditions(now, prefix)
+    return Case(
+        *[When(condition, then=Value(lateness)) for lateness, condition in conditions.items()],
+        default=Value(None),
+        output_field=CharField()
+    )
+
+
+def count_when(condition):
+    """
+    Returns an aggregate counting the rows that match a Q object
+    """
+    return Sum(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField()))
+
+
+def count_lateness(submissions, students_count, assignments, now=None):
+    """
+    Returns a dict of lateness to the number of submissions with that lateness, for submissions (a
+    Submission queryset) by students_count students for assignments (a list of Assignments). Students
+    without a submission for an assignment whose grace period is over count as missing too.
+    """
+    now = get_now(now)
+    conditions = get_lateness_conditions(now)
+    submitted_lateness = [Lateness.on_time, Lateness.in_grace, Lateness.late]
+    submitted = Q(status__gte=SubmissionStatus.submitted)
+    counts = submissions.filter(assignment__in=assignments).aggregate(
+        submitted_overdue=count_when(submitted & _get_overdue_condition(now, "assignment__")),
+        **{lateness: count_when(conditions[lateness]) for lateness in submitted_lateness}
+    )
+    overdue_assignments_count = len([assignment for assignment in assignments if assignment.is_past_deadline(now)])
+    result = {lateness: counts[lateness] or 0 for lateness in submitted_lateness}
+    result[Lateness.missing] = students_count * overdue_assignments_count - (counts["submitted_overdue"] or 0)
+    return result
@@ -0,0 +1,167 @@
+"""
+Logging helpers: JSON records with request context, sampling of noisy loggers, and handlers that
+do their I/O on a background thread
+
+configure_logging() is the LOGGING_CONFIG function. It applies LOGGING and then puts each handler
+named in LOGGING["queued_handlers"] behind a QueuedHandler, so a request thread only puts records
+on a queue and never waits on the console or the syslog server.
+"""
+import copy
+import json
+import logging
+import logging.config
+import os
+import platform
+import queue
+import random
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener  # pylint: disable=ungrouped-imports
+
+HOSTNAME = platform.node().split(".")[0]
+QUEUE_SIZE = 10000
+CONTEXT_FIELDS = ("request_id", "course_id", "role")
+# Attributes every LogRecord has; anything else on a record was passed in with extra=
+RECORD_ATTRIBUTES = set(logging.LogRecord("", logging.INFO, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+_context = threading.local()
+
+
+def set_log_context(**fields):
+    """
+    Sets context fields (request_id, course_id, role) added to records logged by the current thread
+    """
+    for field, value in fields.items():
+        setattr(_context, field, value)
+
+
+def clear_log_context():
+    """
+    Clears the current thread's context fields
+    """
+    for field in CONTEXT_FIELDS:
+        setattr(_context, field, None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Adds the logging thread's context fields to records
+    """
+    def filter(self, record):
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, getattr(_context, field, None))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through a share (rate) of the records at or below max_level, and every record above it
+    """
+    def __init__(self, rate=1.0, max_level="INFO"):
+        super().__init__()
+        self.rate = float(rate)
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+
+    def filter(self, record):
+        return record.levelno > self.max_level or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON objects, including context fields and extra= fields
+    """
+    def format(self, record):
+        fields = {
+            "time": datetime.utcfromtimestamp(record.created).isoformat() + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "host": HOSTNAME,
+            "process": record.process,
+            "location": "{filename}:{lineno}".format(filename=record.filename, lineno=record.lineno),
+        }
+        for field, value in record.__dict__.items():
+            if field not in RECORD_ATTRIBUTES and value is not None:
+                fields[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            fields["exc_info"] = record.exc_text
+        return json.dumps(fields, default=str)
+
+
+class QueuedHandler(QueueHandler):
+    """
+    Handler that puts records on a bounded queue for a background thread to pass on to handler.
+    Records are dropped (and counted in dropped_count) rather than blocking when the queue is full.
+    The thread is started in each process on its first record, since threads don't survive the
+    fork of a uWSGI worker.
+    """
+    def __init__(self, handler, maxsize=QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.handler = handler
+        self.setLevel(handler.level)
+        self.addFilter(ContextFilter())
+        self.dropped_count = 0
+        self.listener = None
+        self.listener_pid = None
+
+    def prepare(self, record):
+        """
+        Returns a copy of record that is safe to hand to another thread, with its message and
+        traceback already rendered
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self.listener_pid != os.getpid():
+            # Start this process' listener (Handler.handle() holds self.lock, so only one starts)
+            self.queue = queue.Queue(self.queue.maxsize)
+            self.listener = QueueListener(self.queue, self.handler, respect_handler_level=True)
+            self.listener.start()
+            self.listener_pid = os.getpid()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+
+    def flush(self):
+        """
+        Waits for queued records to be handled
+        """
+        if self.listener is not None and self.listener_pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+            self.listener_pid = None
+        self.handler.flush()
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+def configure_logging(config):
+    """
+    Applies a logging configuration dict, then moves the handlers named in its "queued_handlers"
+    list behind QueuedHandlers
+    """
+    logging.config.dictConfig(config)
+    queued_names = set(config.get("queued_handlers", []))
+    queued_handlers = {}
+    loggers = [logging.getLogger()] + [logging.getLogger(name) for name in config.get("loggers", {})]
+    for logger in loggers:
+        for handler in list(logger.handlers):
+            if handler.get_name() not in queued_names:
+                continue
+            if handler not in queued_handlers:
+                queued_handlers[handler] = QueuedHandler(handler)
+            logger.removeHandler(handler)
+            logger.addHandler(queued_handlers[handler])
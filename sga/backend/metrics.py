@@ -0,0 +1,287 @@
+"""
+Application metrics (counters and histograms) in the Prometheus text exposition format
+
+Each process keeps its metrics in memory and, when SGA_METRICS_DIR is set, regularly writes them
+to its own file in that directory (at most every SGA_METRICS_FLUSH_INTERVAL seconds). The metrics
+endpoint adds up the files of every process, so it reports the same totals whichever uWSGI process
+serves the scrape. When the metrics are collected, the files of processes that have exited (e.g.
+recycled uWSGI workers) are merged into one file for exited processes and removed, so counters
+never go backwards while the directory doesn't grow with every worker. SGA_METRICS_DIR must be
+local to the host, since processes are checked by pid. Without SGA_METRICS_DIR only the serving
+process' metrics are reported.
+"""
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+from time import time
+
+from django.conf import settings
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(11))  # 1 KiB to 1 GiB
+
+# Metric name: (type, help, histogram buckets)
+METRICS = {
+    "sga_lti_launches_total": (COUNTER, "LTI launch requests by outcome", None),
+    "sga_grade_passback_seconds": (HISTOGRAM, "Time taken to send a grade to edX", LATENCY_BUCKETS),
+    "sga_grade_passback_failures_total": (COUNTER, "Grades that could not be sent to edX", None),
+    "sga_zip_download_bytes": (HISTOGRAM, "Size of streamed submission ZIP downloads", SIZE_BUCKETS),
+    "sga_zip_download_seconds": (HISTOGRAM, "Time taken to stream submission ZIP downloads", LATENCY_BUCKETS),
+    "sga_upload_bytes": (HISTOGRAM, "Size of uploaded submission documents", SIZE_BUCKETS),
+    "sga_cache_requests_total": (COUNTER, "Cached course data lookups by cache name and result", None),
+    "sga_view_seconds": (HISTOGRAM, "Time taken to respond to requests by view", LATENCY_BUCKETS),
+}
+
+# File that the metrics of exited processes are merged into (see _merge_exited_processes())
+EXITED_PROCESSES_FILENAME = "metrics-exited.json"
+
+_lock = threading.Lock()
+# Sample key (see get_sample_key()) to a count for counters, or to [count per bucket..., +Inf count, sum]
+_values = {}
+_last_flush = 0.0
+_loaded_pid = None
+
+
+def get_sample_key(name, labels):
+    """
+    Returns the key of a metric sample, which is also how it is stored in metrics files
+    """
+    return json.dumps([name, sorted(labels.items())])
+
+
+def inc(metric, amount=1, **labels):
+    """
+    Increments a counter
+    """
+    key = get_sample_key(metric, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + amount
+    _flush_if_due()
+
+
+def observe(metric, value, **labels):
+    """
+    Adds an observation to a histogram
+    """
+    buckets = METRICS[metric][2]
+    key = get_sample_key(metric, labels)
+    with _lock:
+        sample = _values.setdefault(key, [0] * (len(buckets) + 2))
+        index = next((index for index, bound in enumerate(buckets) if value <= bound), len(buckets))
+        sample[index] += 1
+        sample[-1] += value
+    _flush_if_due()
+
+
+def _merge(totals, values):
+    """
+    Adds a set of sample values into totals
+    """
+    for key, value in values.items():
+        if isinstance(value, list):
+            total = totals.setdefault(key, [0] * len(value))
+            totals[key] = [current + added for current, added in zip(total, value)]
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+def _get_process_path(pid):
+    """
+    Returns the metrics file path for a process
+    """
+    return os.path.join(settings.SGA_METRICS_DIR, "metrics-{pid}.json".format(pid=pid))
+
+
+class _DirectoryLock():
+    """
+    Context manager holding an exclusive lock on SGA_METRICS_DIR across processes, so that collecting
+    metrics doesn't merge a file twice, or race with a process picking up a file left by its pid
+    """
+    lock_file = None
+
+    def __enter__(self):
+        os.makedirs(settings.SGA_METRICS_DIR, exist_ok=True)
+        self.lock_file = open(os.path.join(settings.SGA_METRICS_DIR, ".lock"), "w")
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX)
+
+    def __exit__(self, *args):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+
+
+def _write_values(path, values):
+    """
+    Writes sample values to a file in SGA_METRICS_DIR, through a temporary file that is renamed so that
+    readers never see a partial file
+    """
+    os.makedirs(settings.SGA_METRICS_DIR, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=settings.SGA_METRICS_DIR, prefix=".metrics-")
+    with os.fdopen(handle, "w") as metrics_file:
+        json.dump(values, metrics_file)
+    os.replace(temp_path, path)
+
+
+def _read_values(path):
+    """
+    Returns the sample values in a metrics file
+    """
+    with open(path) as metrics_file:
+        return json.load(metrics_file)
+
+
+def _is_running(pid):
+    """
+    Returns whether a process with this pid is running (on this host)
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # It exists but belongs to another user
+        return True
+    return True
+
+
+def _merge_exited_processes():
+    """
+    Merges the files of processes that are no longer running into EXITED_PROCESSES_FILENAME and removes
+    them (with the directory lock held)
+    """
+    exited_paths = []
+    for filename in os.listdir(settings.SGA_METRICS_DIR):
+        pid = filename[len("metrics-"):-len(".json")]
+        if filename.startswith("metrics-") and filename.endswith(".json") and pid.isdigit() and \
+                int(pid) != os.getpid() and not _is_running(int(pid)):
+            exited_paths.append(os.path.join(settings.SGA_METRICS_DIR, filename))
+    if not exited_paths:
+        return
+    exited_path = os.path.join(settings.SGA_METRICS_DIR, EXITED_PROCESSES_FILENAME)
+    totals = _read_values(exited_path) if os.path.exists(exited_path) else {}
+    for path in exited_paths:
+        _merge(totals, _read_values(path))
+    # Write the merged values before removing the files, so a failure can't lose counts
+    _write_values(exited_path, totals)
+    for path in exited_paths:
+        os.remove(path)
+
+
+def flush():
+    """
+    Writes this process' metrics to its file in SGA_METRICS_DIR, if it is set
+    """
+    global _last_flush, _loaded_pid  # pylint: disable=global-statement
+    if not settings.SGA_METRICS_DIR:
+        return
+    pid = os.getpid()
+    path = _get_process_path(pid)
+    with _lock:
+        if _loaded_pid != pid:
+            with _DirectoryLock():
+                # A file left by an earlier process with the same pid: carry on from its values
+                if os.path.exists(path):
+                    _merge(_values, _read_values(path))
+                _write_values(path, _values)
+            _loaded_pid = pid
+        else:
+            _write_values(path, _values)
+        _last_flush = time()
+
+
+def _flush_if_due():
+    """
+    Flushes this process' metrics if SGA_METRICS_FLUSH_INTERVAL has passed since the last flush
+    """
+    if settings.SGA_METRICS_DIR and time() - _last_flush >= settings.SGA_METRICS_FLUSH_INTERVAL:
+        flush()
+
+
+def collect():
+    """
+    Returns the sample values of every process (or of this process, without SGA_METRICS_DIR)
+    """
+    if not settings.SGA_METRICS_DIR:
+        with _lock:
+            return json.loads(json.dumps(_values))
+    flush()
+    totals = {}
+    with _DirectoryLock():
+        _merge_exited_processes()
+        for filename in os.listdir(settings.SGA_METRICS_DIR):
+            if filename.startswith("metrics-") and filename.endswith(".json"):
+                _merge(totals, _read_values(os.path.join(settings.SGA_METRICS_DIR, filename)))
+    return totals
+
+
+def _format_labels(labels, **extra):
+    """
+    Returns a label set in exposition format (e.g. {view="index"})
+    """
+    labels = list(labels) + sorted(extra.items())
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        '{name}="{value}"'.format(
+            name=name,
+            value=str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        )
+        for name, value in labels
+    ) + "}"
+
+
+def render_metrics():
+    """
+    Returns every metric in the Prometheus text exposition format
+    """
+    samples = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        samples.setdefault(name, []).append((labels, value))
+    lines = []
+    for name in sorted(METRICS):
+        metric_type, help_text, buckets = METRICS[name]
+        lines.append("# HELP {name} {help}".format(name=name, help=help_text))
+        lines.append("# TYPE {name} {type}".format(name=name, type=metric_type))
+        for labels, value in sorted(samples.get(name, []), key=lambda sample: sample[0]):
+            if metric_type == COUNTER:
+                lines.append("{name}{labels} {value}".format(name=name, labels=_format_labels(labels), value=value))
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ["+Inf"], value[:-1]):
+                cumulative += count
+                lines.append("{name}_bucket{labels} {count}".format(
+                    name=name,
+                    labels=_format_labels(labels, le=bound),
+                    count=cumulative
+                ))
+            lines.append("{name}_sum{labels} {sum}".format(name=name, labels=_format_labels(labels), sum=value[-1]))
+            lines.append("{name}_count{labels} {count}".format(
+                name=name,
+                labels=_format_labels(labels),
+                count=cumulative
+            ))
+    return "\n".join(lines) + "\n"
+
+
+def reset_metrics():
+    """
+    Clears this process' metrics (for tests)
+    """
+    with _lock:
+        _values.clear()
+
+
+@atexit.register
+def _flush_at_exit():
+    """
+    Writes this process' final metrics when it exits
+    """
+    if settings.SGA_METRICS_DIR:
+        flush()
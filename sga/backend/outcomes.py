@@ -0,0 +1,49 @@
+"""
+LTI outcome service parameters, which say where to send a student's grade for an assignment
+
+Every LTI launch brings them. They are kept in a LaunchOutcome row per student and assignment, and
+only stored on a Submission when the student submits, so students who only open an assignment don't
+get a Submission row.
+"""
+from sga.models import LaunchOutcome
+
+OUTCOME_FIELDS = ("edx_url", "result_id", "consumer_key")
+
+
+def get_launch_outcome(request):
+    """
+    Returns a dict of Submission outcome fields from an LTI launch request
+    """
+    return {
+        "edx_url": request.LTI["lis_outcome_service_url"],
+        "result_id": request.POST.get("lis_result_sourcedid"),
+        "consumer_key": request.POST.get("oauth_consumer_key"),
+    }
+
+
+def remember_outcome(student_user, assignment, outcome):
+    """
+    Stores the outcome fields of a student's launch of an assignment (writing only if they changed)
+    """
+    launch_outcome, created = LaunchOutcome.objects.get_or_create(
+        student=student_user,
+        assignment=assignment,
+        defaults=outcome
+    )
+    if not created and any(getattr(launch_outcome, field) != outcome.get(field) for field in OUTCOME_FIELDS):
+        LaunchOutcome.objects.filter(pk=launch_outcome.pk).update(**outcome)
+
+
+def apply_outcome(submission):
+    """
+    Sets a submission's outcome fields from the student's latest launch of its assignment, if there is
+    one. Returns whether the submission has outcome fields, which grade passback needs.
+    """
+    outcome = LaunchOutcome.objects.filter(
+        student_id=submission.student_id,
+        assignment_id=submission.assignment_id
+    ).values(*OUTCOME_FIELDS).first()
+    if outcome:
+        for field in OUTCOME_FIELDS:
+            setattr(submission, field, outcome[field])
+    return bool(submission.edx_url)
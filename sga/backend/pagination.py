@@ -0,0 +1,52 @@
+"""
+Keyset (cursor) pagination helpers
+"""
+from datetime import datetime, timedelta
+
+import pytz
+from django.db.models import Q
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.UTC)
+
+
+def encode_cursor(timestamp, pk):
+    """
+    Returns an opaque cursor string for the position (timestamp, pk)
+    """
+    delta = timestamp - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return "{micros}-{pk}".format(micros=micros, pk=pk)
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (timestamp, pk) position for a cursor string, or None if the cursor is missing or invalid
+    """
+    try:
+        micros, pk = cursor.split("-")
+        return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def keyset_page(queryset, field, cursor=None, limit=50):
+    """
+    Returns (objects, next_cursor) for the page of queryset (ordered newest first by field, then pk)
+    that comes after cursor. next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by("-{field}".format(field=field), "-pk")
+    position = decode_cursor(cursor)
+    if position:
+        timestamp, pk = position
+        queryset = queryset.filter(
+            Q(**{"{field}__lt".format(field=field): timestamp}) |
+            Q(**{field: timestamp, "pk__lt": pk})
+        )
+    # Fetch one extra row to find out if there is another page
+    objects = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(objects) > limit:
+        objects = objects[:limit]
+        last = objects[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return objects, next_cursor
@@ -0,0 +1,323 @@
+"""
+Backend logic for importing course rosters (admins, graders, students and assignments) in bulk
+
+A roster is a list of records. Each record has a role ("admin", "grader", "student" or "assignment")
+and a course (the course's edX id), plus:
+
+    admin:       username, email
+    grader:      username, email, max_students (optional)
+    student:     username, email, grader (optional username of the student's grader)
+    assignment:  edx_id, name, due_date (optional, ISO 8601)
+
+CSV rosters have one record per row with these as column names. JSON rosters are a list of objects.
+"""
+import csv
+import json
+from collections import Counter
+
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from sga.backend.cache import bump_course_version
+from sga.models import Assignment, Course, Grader, Student, User
+
+ROLES = ("admin", "grader", "assignment", "student")
+ROSTER_FORMATS = ("csv", "json")
+
+
+class RosterError(Exception):
+    """ Exception class for invalid rosters """
+
+
+def read_roster(roster_file, roster_format):
+    """
+    Returns the list of records in a roster file (a text file object)
+    """
+    if roster_format == "json":
+        try:
+            records = json.load(roster_file)
+        except ValueError as exc:
+            raise RosterError("Invalid JSON: {error}".format(error=exc))
+        if not isinstance(records, list):
+            raise RosterError("A JSON roster must be a list of records")
+    else:
+        records = list(csv.DictReader(roster_file))
+    for index, record in enumerate(records, start=1):
+        if record.get("role") not in ROLES:
+            raise RosterError("Record {index} has an invalid role {role!r}".format(
+                index=index,
+                role=record.get("role")
+            ))
+        if not record.get("course"):
+            raise RosterError("Record {index} has no course".format(index=index))
+        if record["role"] == "assignment" and not record.get("edx_id"):
+            raise RosterError("Record {index} has no edx_id".format(index=index))
+        if record["role"] != "assignment" and not record.get("username"):
+            raise RosterError("Record {index} has no username".format(index=index))
+        try:
+            parse_max_students(record.get("max_students"))
+        except ValueError:
+            raise RosterError("Record {index} has an invalid max_students {value!r}".format(
+                index=index,
+                value=record.get("max_students")
+            ))
+        try:
+            parse_due_date(record.get("due_date"))
+        except ValueError:
+            raise RosterError("Record {index} has an invalid due_date {value!r}, use ISO 8601".format(
+                index=index,
+                value=record.get("due_date")
+            ))
+    return records
+
+
+def parse_max_students(value):
+    """
+    Returns a record's max_students as an int, or None if it's empty. Raises ValueError if it isn't a
+    whole number of at least 0.
+    """
+    if value in (None, ""):
+        return None
+    max_students = int(str(value))
+    if max_students < 0:
+        raise ValueError("max_students can't be negative")
+    return max_students
+
+
+def parse_due_date(value):
+    """
+    Returns a record's due_date as a datetime, or None if it's empty. Raises ValueError if it isn't an
+    ISO 8601 date and time.
+    """
+    if value in (None, ""):
+        return None
+    due_date = parse_datetime(str(value))
+    if due_date is None:
+        raise ValueError("due_date isn't an ISO 8601 date and time")
+    return due_date
+
+
+def import_roster(records, batch_size=1000):
+    """
+    Creates or updates the users, admins, graders, students and assignments in records, batch_size
+    records at a time (each batch in one transaction, with a few queries per batch rather than per
+    record). Importing the same roster again changes nothing. Returns a Counter of rows created and
+    updated by kind.
+    """
+    # Students go last so that their graders exist by the time they are imported
+    records = sorted(records, key=lambda record: ROLES.index(record["role"]))
+    stats = Counter()
+    course_ids = set()
+    for start in range(0, len(records), batch_size):
+        with transaction.atomic():
+            course_ids.update(_import_batch(records[start:start + batch_size], stats))
+    # Bulk writes skip Model.save(), so update grader counts and invalidate cached course data here
+    Grader.update_active_students_counts(Grader.objects.filter(course_id__in=course_ids).values_list("id", flat=True))
+    for course_id in course_ids:
+        bump_course_version(course_id)
+    return stats
+
+
+def _get_or_create_courses(edx_ids, stats):
+    """
+    Returns a dict of edX id to Course id, creating missing courses
+    """
+    courses = dict(Course.objects.filter(edx_id__in=edx_ids).values_list("edx_id", "id"))
+    missing = [Course(edx_id=edx_id) for edx_id in edx_ids if edx_id not in courses]
+    if missing:
+        Course.objects.bulk_create(missing)
+        stats["courses created"] += len(missing)
+        # bulk_create() doesn't set primary keys on every database
+        courses = dict(Course.objects.filter(edx_id__in=edx_ids).values_list("edx_id", "id"))
+    return courses
+
+
+def _get_or_create_users(records, stats):
+    """
+    Returns a dict of username to User id for the users in records, creating missing users and
+    updating changed emails
+    """
+    emails = {record["username"]: record.get("email") or "" for record in records if record["role"] != "assignment"}
+    existing = {
+        username: (user_id, email)
+        for username, user_id, email in User.objects.filter(username__in=emails).values_list("username", "id", "email")
+    }
+    missing = [User(username=username, email=email) for username, email in emails.items() if username not in existing]
+    if missing:
+        User.objects.bulk_create(missing)
+        stats["users created"] += len(missing)
+    for username, (user_id, email) in existing.items():
+        if emails[username] and emails[username] != email:
+            User.objects.filter(pk=user_id).update(email=emails[username])
+            stats["users updated"] += 1
+    return dict(User.objects.filter(username__in=emails).values_list("username", "id"))
+
+
+def _import_batch(records, stats):
+    """
+    Imports a batch of roster records. Returns the ids of the courses they belong to.
+    """
+    courses = _get_or_create_courses({record["course"] for record in records}, stats)
+    users = _get_or_create_users(records, stats)
+    by_role = {role: [record for record in records if record["role"] == role] for role in ROLES}
+    _import_admins(by_role["admin"], courses, users, stats)
+    _import_graders(by_role["grader"], courses, users, stats)
+    _import_assignments(by_role["assignment"], courses, stats)
+    _import_students(by_role["student"], courses, users, _get_graders(courses.values(), records), stats)
+    return set(courses.values())
+
+
+def _import_admins(records, courses, users, stats):
+    """
+    Adds missing course administrators
+    """
+    Administrator = Course.administrators.through
+    admin_pairs = {(courses[record["course"]], users[record["username"]]) for record in records}
+    if not admin_pairs:
+        return
+    existing = set(Administrator.objects.filter(
+        course_id__in={course_id for course_id, _ in admin_pairs},
+        user_id__in={user_id for _, user_id in admin_pairs}
+    ).values_list("course_id", "user_id"))
+    missing = [
+        Administrator(course_id=course_id, user_id=user_id)
+        for course_id, user_id in admin_pairs - existing
+    ]
+    if missing:
+        Administrator.objects.bulk_create(missing)
+        stats["admins created"] += len(missing)
+
+
+def _import_graders(records, courses, users, stats):
+    """
+    Creates missing graders and updates changed max_students. Like change_student_to_grader, graders get
+    a deleted Student row, so they aren't added as students when they launch an assignment.
+    """
+    graders = _get_graders(courses.values(), records)
+    missing = []
+    for record in records:
+        key = (courses[record["course"]], users[record["username"]])
+        max_students = parse_max_students(record.get("max_students"))
+        if key not in graders:
+            grader = Grader(course_id=key[0], user_id=key[1])
+            if max_students is not None:
+                grader.max_students = max_students
+            missing.append(grader)
+            graders[key] = grader
+        elif max_students is not None and graders[key].max_students != max_students:
+            Grader.objects.filter(pk=graders[key].pk).update(max_students=max_students)
+            stats["graders updated"] += 1
+    if missing:
+        Grader.objects.bulk_create(missing)
+        stats["graders created"] += len(missing)
+    _deactivate_students({(courses[record["course"]], users[record["username"]]) for record in records}, stats)
+
+
+def _deactivate_students(keys, stats):
+    """
+    Creates or updates the Students for (course id, user id) keys so they are deleted and have no grader
+    """
+    if not keys:
+        return
+    existing = {
+        (student.course_id, student.user_id): student
+        for student in Student.all_objects.filter(
+            course_id__in={course_id for course_id, _ in keys},
+            user_id__in={user_id for _, user_id in keys}
+        )
+    }
+    active_ids = [
+        existing[key].pk for key in keys
+        if key in existing and (not existing[key].deleted or existing[key].grader_id is not None)
+    ]
+    if active_ids:
+        Student.all_objects.filter(pk__in=active_ids).update(deleted=True, grader=None)
+        stats["students deactivated"] += len(active_ids)
+    missing = [
+        Student(course_id=course_id, user_id=user_id, deleted=True)
+        for course_id, user_id in keys if (course_id, user_id) not in existing
+    ]
+    if missing:
+        Student.all_objects.bulk_create(missing)
+
+
+def _import_assignments(records, courses, stats):
+    """
+    Creates missing assignments and updates changed ones
+    """
+    assignment_records = {record["edx_id"]: record for record in records}
+    existing = {
+        assignment.edx_id: assignment
+        for assignment in Assignment.objects.filter(edx_id__in=assignment_records)
+    }
+    missing = []
+    for edx_id, record in assignment_records.items():
+        values = {
+            "course_id": courses[record["course"]],
+            "name": record.get("name") or edx_id,
+            "due_date": parse_due_date(record.get("due_date"))
+        }
+        if edx_id not in existing:
+            missing.append(Assignment(edx_id=edx_id, **values))
+        elif any(getattr(existing[edx_id], field) != value for field, value in values.items()):
+            Assignment.objects.filter(pk=existing[edx_id].pk).update(**values)
+            stats["assignments updated"] += 1
+    if missing:
+        Assignment.objects.bulk_create(missing)
+        stats["assignments created"] += len(missing)
+
+
+def _import_students(records, courses, users, graders, stats):
+    """
+    Creates missing students, and undeletes students or changes their grader as needed. Records for users
+    who are graders in the course are skipped.
+    """
+    student_records = {(courses[record["course"]], users[record["username"]]): record for record in records}
+    grader_keys = set(Grader.objects.filter(
+        course_id__in={course_id for course_id, _ in student_records},
+        user_id__in={user_id for _, user_id in student_records}
+    ).values_list("course_id", "user_id")) & set(student_records)
+    if grader_keys:
+        stats["student records skipped (graders)"] += len(grader_keys)
+        student_records = {key: record for key, record in student_records.items() if key not in grader_keys}
+    existing = {
+        (student.course_id, student.user_id): student
+        for student in Student.all_objects.filter(
+            course_id__in={course_id for course_id, _ in student_records},
+            user_id__in={user_id for _, user_id in student_records}
+        )
+    }
+    grader_user_ids = dict(
+        User.objects.filter(
+            username__in={record["grader"] for record in records if record.get("grader")}
+        ).values_list("username", "id")
+    )
+    missing = []
+    for (course_id, user_id), record in student_records.items():
+        grader = graders.get((course_id, grader_user_ids.get(record.get("grader"))))
+        if (course_id, user_id) not in existing:
+            missing.append(Student(course_id=course_id, user_id=user_id, grader=grader))
+            continue
+        student = existing[(course_id, user_id)]
+        if student.deleted or (grader is not None and student.grader_id != grader.id):
+            Student.all_objects.filter(pk=student.pk).update(
+                deleted=False,
+                grader=grader.id if grader is not None else student.grader_id
+            )
+            stats["students updated"] += 1
+    if missing:
+        Student.objects.bulk_create(missing)
+        stats["students created"] += len(missing)
+
+
+def _get_graders(course_ids, records):
+    """
+    Returns a dict of (course id, user id) to Grader for the graders in the courses that might be
+    referenced by records
+    """
+    usernames = {record["username"] for record in records if record["role"] == "grader"}
+    usernames.update(record["grader"] for record in records if record["role"] == "student" and record.get("grader"))
+    return {
+        (grader.course_id, grader.user_id): grader
+        for grader in Grader.objects.filter(course_id__in=course_ids, user__username__in=usernames)
+    }
@@ -0,0 +1,104 @@
+"""
+Database routing to a read replica for read-only staff views
+
+Views decorated with read_from_replica read from the SGA_DB_REPLICA_ALIAS database while handling
+GET and HEAD requests, including while a streamed response (e.g. a ZIP download) is being sent.
+Everything else, and every write, uses the primary. A session that has just made a non-GET request
+is pinned to the primary for SGA_DB_REPLICA_PIN_SECONDS (see ReplicaPinMiddleware), so it sees its
+own changes even when the replica lags behind. Without a replica everything uses the primary.
+"""
+import threading
+from functools import wraps
+from time import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+READ_METHODS = ("GET", "HEAD")
+PIN_SESSION_KEY = "sga_primary_pinned_until"
+
+_local = threading.local()
+
+
+def get_replica_alias():
+    """
+    Returns the replica's database alias, or None if no replica is configured
+    """
+    return settings.SGA_DB_REPLICA_ALIAS or None
+
+
+def pin_to_primary(session):
+    """
+    Makes the session's reads use the primary for the next SGA_DB_REPLICA_PIN_SECONDS
+    """
+    session[PIN_SESSION_KEY] = time() + settings.SGA_DB_REPLICA_PIN_SECONDS
+
+
+def is_pinned_to_primary(session):
+    """
+    Returns True if the session has written recently enough that it must read from the primary
+    """
+    return session.get(PIN_SESSION_KEY, 0) > time()
+
+
+def reset_replica_reads(**kwargs):  # pylint: disable=unused-argument
+    """
+    Switches the current thread back to reading from the primary (request_started and
+    request_finished receiver)
+    """
+    _local.use_replica = False
+
+
+def read_from_replica(view_func):
+    """
+    Decorator for read-only views that makes the rest of the request read from the replica, unless the
+    request isn't a GET or HEAD or its session is pinned to the primary
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        """ Wrapped function """
+        if (
+                get_replica_alias() and request.method in READ_METHODS and
+                not is_pinned_to_primary(request.session)
+        ):
+            _local.use_replica = True
+        return view_func(request, *args, **kwargs)
+    return _wrapped_view
+
+
+class ReplicaRouter(object):
+    """
+    Database router that sends reads to the replica in views decorated with read_from_replica, and
+    everything else to the primary
+    """
+    def db_for_read(self, model, **hints):  # pylint: disable=no-self-use,unused-argument
+        """
+        Returns the replica alias while the current thread reads from the replica
+        """
+        replica = get_replica_alias()
+        if replica and getattr(_local, "use_replica", False):
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):  # pylint: disable=no-self-use,unused-argument
+        """
+        Returns the primary, including for objects that were read from the replica
+        """
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):  # pylint: disable=no-self-use,unused-argument
+        """
+        Allows relations between objects from the primary and the replica, which hold the same data
+        """
+        databases = {DEFAULT_DB_ALIAS, get_replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:  # pylint: disable=protected-access
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):  # pylint: disable=no-self-use,unused-argument
+        """
+        Only migrates the primary; the replica gets its schema through replication
+        """
+        if db == get_replica_alias():
+            return False
+        return None
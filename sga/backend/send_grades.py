@@ -4,31 +4,85 @@ This module handles sending grades back to edX
 Most of this module is a python 3 port of pylti (github.com/mitodl/sga-lti)
 and should be moved back into that library.
 """
+import logging
 import uuid
+from time import time
 from xml.etree import ElementTree as etree
 
 import oauth2
 from django.conf import settings
 
+from sga.backend import metrics
+
+log = logging.getLogger(__name__)
+
 
 class SendGradeFailure(Exception):
     """ Exception class for failures sending grades to edX"""
 
 
-def send_grade(consumer_key, edx_url, result_id, grade):
-    """ Sends a grade to edX """
+def send_grade(consumer_key, edx_url, result_id, grade, client=None):
+    """ Sends a grade to edX (using client, an oauth2.Client for consumer_key, if one is passed in) """
     if consumer_key not in settings.LTI_OAUTH_CREDENTIALS:
+        metrics.inc("sga_grade_passback_failures_total", reason="invalid_consumer_key")
         raise SendGradeFailure("Invalid consumer_key %s" % consumer_key)
     body = generate_request_xml(str(uuid.uuid1()), "replaceResult", result_id, grade)
     secret = settings.LTI_OAUTH_CREDENTIALS[consumer_key]
-    response, content = _post_patched_request(consumer_key, secret, body, edx_url, "POST", "application/xml")
+    start = time()
+    try:
+        response, content = _post_patched_request(
+            consumer_key,
+            secret,
+            body,
+            edx_url,
+            "POST",
+            "application/xml",
+            client=client
+        )
+    except Exception:
+        metrics.inc("sga_grade_passback_failures_total", reason="error")
+        raise
+    finally:
+        metrics.observe("sga_grade_passback_seconds", time() - start)
     if isinstance(content, bytes):
         content = content.decode("utf8")
     if "<imsx_codeMajor>success</imsx_codeMajor>" not in content:
+        metrics.inc("sga_grade_passback_failures_total", reason="rejected")
         raise SendGradeFailure("Send grades to edX returned %s" % response.status)
 
 
-def _post_patched_request(lti_key, secret, body, url, method, content_type):  # pylint: disable=too-many-arguments
+def send_grades(submissions):
+    """
+    Sends the grades of several submissions to edX, sharing one OAuth client (and so its HTTP
+    connections) per consumer key. Returns a list of (submission, SendGradeFailure) for the grades
+    that could not be sent, whatever the error.
+    """
+    clients = {}
+    failures = []
+    for submission in submissions:
+        consumer_key = submission.consumer_key
+        if consumer_key in settings.LTI_OAUTH_CREDENTIALS and consumer_key not in clients:
+            consumer = oauth2.Consumer(key=consumer_key, secret=settings.LTI_OAUTH_CREDENTIALS[consumer_key])
+            clients[consumer_key] = oauth2.Client(consumer)
+        try:
+            send_grade(
+                consumer_key,
+                submission.edx_url,
+                submission.result_id,
+                submission.edx_grade(),
+                client=clients.get(consumer_key)
+            )
+        except SendGradeFailure as exc:
+            failures.append((submission, exc))
+        except Exception:  # pylint: disable=broad-except
+            # Network and OAuth errors fail this grade only, so the rest of the batch is still sent
+            log.exception("Error sending the grade of submission %s to edX", submission.pk)
+            failures.append((submission, SendGradeFailure("Could not reach edX")))
+    return failures
+
+
+def _post_patched_request(lti_key, secret, body, url, method, content_type, client=None):
+    # pylint: disable=too-many-arguments
     """
     Authorization header needs to be capitalized for some LTI clients
     this function ensures that header is capitalized
@@ -39,8 +93,9 @@ def _post_patched_request(lti_key, secret, body, url, method, content_type):  #
     :return: response
     """
 
-    consumer = oauth2.Consumer(key=lti_key, secret=secret)
-    client = oauth2.Client(consumer)
+    if client is None:
+        consumer = oauth2.Consumer(key=lti_key, secret=secret)
+        client = oauth2.Client(consumer)
 
     import httplib2
 
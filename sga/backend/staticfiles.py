@@ -0,0 +1,140 @@
+"""
+Static files storage that names files by their content hash and precompresses them
+
+collectstatic writes each file under a name that includes a hash of its content (so it can be cached
+forever and is replaced by a new name when it changes), a staticfiles.json manifest that maps the
+original names to the hashed ones, and .gz (and, with the brotli package installed, .br) copies of
+the text files next to them. uWSGI (see uwsgi.ini) or a CDN can then serve these files as they are.
+Without uWSGI, StaticFilesCling serves them the same way from the WSGI application.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from io import BytesIO
+
+import dj_static
+import static
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Extensions of files worth compressing; images and web fonts other than these are compressed already
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".map", ".svg", ".eot", ".ttf", ".json", ".txt", ".html", ".xml"}
+# A compressed copy is only written if it is at most this share of the original's size
+MAX_COMPRESSED_RATIO = 0.95
+# Hashed names have the first 12 hex digits of the content's MD5 before the extension
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^/.]+$")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Content-Encoding values, most preferred first, and the extensions of their precompressed copies
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def gzip_compress(content):
+    """
+    Returns content compressed with gzip. The header has no timestamp, so the result only depends on
+    the content.
+    """
+    buffer = BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=9, mtime=0) as gzip_file:
+        gzip_file.write(content)
+    return buffer.getvalue()
+
+
+def get_compressors():
+    """
+    Returns (extension, compress function) pairs for the available compression formats
+    """
+    compressors = [(".gz", gzip_compress)]
+    if brotli is not None:
+        compressors.append((".br", brotli.compress))
+    return compressors
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage that also writes compressed copies of the hashed files. Files missing
+    from the manifest (e.g. before collectstatic has run in development and tests) are served under
+    their original names unless manifest_strict is set.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            if self.manifest_strict:
+                raise
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        for post_processed in super().post_process(paths, dry_run=dry_run, **options):
+            yield post_processed
+        if dry_run:
+            return
+        for hashed_name in set(self.hashed_files.values()):
+            if os.path.splitext(hashed_name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        """
+        Writes compressed copies of a file, in each available format, where it makes the file smaller
+        """
+        with self.open(name) as original:
+            content = original.read()
+        for extension, compress_function in get_compressors():
+            compressed = compress_function(content)
+            if len(compressed) > len(content) * MAX_COMPRESSED_RATIO:
+                continue
+            compressed_name = name + extension
+            if self.exists(compressed_name):
+                self.delete(compressed_name)
+            self._save(compressed_name, ContentFile(compressed))
+
+
+class PrecompressedCling(static.Cling):
+    """
+    static.Cling that sends a precompressed copy of a file to clients that accept its encoding, and
+    marks files with hashed names as cacheable forever
+    """
+    def __call__(self, environ, start_response):
+        path_info = environ.get("PATH_INFO", "")
+        headers = [("Vary", "Accept-Encoding")]
+        if HASHED_NAME_RE.search(path_info):
+            headers.append(("Cache-Control", IMMUTABLE_CACHE_CONTROL))
+        accepted = [value.split(";")[0].strip() for value in environ.get("HTTP_ACCEPT_ENCODING", "").split(",")]
+        for encoding, extension in ENCODINGS:
+            if encoding in accepted and os.path.isfile(self._full_path(path_info + extension)):
+                environ = dict(environ, PATH_INFO=path_info + extension)
+                headers.append(("Content-Encoding", encoding))
+                break
+
+        def add_headers(status, response_headers, exc_info=None):
+            """ Adds the headers to successful responses """
+            if status.startswith(("200", "304")):
+                response_headers = response_headers + headers
+            return start_response(status, response_headers, exc_info)
+        return super().__call__(environ, add_headers)
+
+    def _guess_type(self, full_path):
+        """
+        Returns the content type of the file a compressed copy was made from
+        """
+        for _, extension in ENCODINGS:
+            if full_path.endswith(extension):
+                full_path = full_path[:-len(extension)]
+        return mimetypes.guess_type(full_path)[0] or "text/plain"
+
+
+class StaticFilesCling(dj_static.Cling):
+    """
+    dj_static.Cling that serves precompressed copies and immutable cache headers (see
+    PrecompressedCling), for deployments where uWSGI doesn't serve static files itself
+    """
+    def __init__(self, application, base_dir=None, ignore_debug=False):
+        super().__init__(application, base_dir=base_dir, ignore_debug=ignore_debug)
+        self.cling = PrecompressedCling(self.cling.root)
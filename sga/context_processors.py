@@ -4,6 +4,8 @@ Injects context into all views
 from datetime import datetime
 
 import pytz
+from django.conf import settings
+
 from sga.backend.constants import SGA_DATETIME_FORMAT, EPOCH_FORMAT, Roles
 
 
@@ -30,3 +32,21 @@ def datetime_formats(request):  # pylint: disable=unused-argument
         "EPOCH_FORMAT": EPOCH_FORMAT,
         "CURRENT_TIME": datetime.utcnow().replace(tzinfo=pytz.UTC)
     }
+
+
+def fragment_cache(request):  # pylint: disable=unused-argument
+    """
+    Injects the timeout for cached template fragments
+    """
+    return {
+        "FRAGMENT_CACHE_TIMEOUT": settings.SGA_FRAGMENT_CACHE_TIMEOUT
+    }
+
+
+def datatables(request):  # pylint: disable=unused-argument
+    """
+    Injects the page size of the server-side staff tables
+    """
+    return {
+        "DATATABLES_PAGE_SIZE": settings.SGA_DATATABLES_PAGE_SIZE
+    }
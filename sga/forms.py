@@ -3,8 +3,10 @@ Django form definitions
 """
 
 from django import forms
-from django.db.models import Count, F
+from django.conf import settings
+from django.db.models import F
 
+from sga.backend.grading import parse_grades_csv
 from sga.models import Submission, Grader, Student
 
 
@@ -69,12 +71,22 @@ class AssignStudentToGraderForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields["students"].queryset = Student.objects.filter(
             grader=None,
-            course=self.instance.course,
-            deleted=False
+            course=self.instance.course
+        ).select_related(
+            "user"
         ).order_by(
             "user__username"
         )
 
+    def clean(self):
+        """
+        Checks that the grader can accept another student
+        """
+        cleaned_data = super().clean()
+        if self.instance.available_student_slots_count() <= 0:
+            raise forms.ValidationError("This grader already has the maximum number of students")
+        return cleaned_data
+
     def save(self, grader=None):
         """
         Save student-grader foreign key relationship
@@ -99,11 +111,11 @@ class AssignGraderToStudentForm(forms.ModelForm):
         Filters graders for only ones that are available for assigning students to
         """
         super().__init__(*args, **kwargs)
-        self.fields["grader"].queryset = self.fields["grader"].queryset.annotate(
-            Count("students")
-        ).filter(
-            max_students__gt=F("students__count"),
+        self.fields["grader"].queryset = self.fields["grader"].queryset.filter(
+            max_students__gt=F("active_students_count"),
             course=self.instance.course
+        ).select_related(
+            "user"
         ).order_by(
             "user__username"
         )
@@ -113,3 +125,116 @@ class AssignGraderToStudentForm(forms.ModelForm):
         fields = [
             "grader"
         ]
+
+
+class BulkGradeForm(forms.Form):
+    """
+    Form for entering grades and feedback for many submissions at once (one row per submission)
+    """
+    def __init__(self, submissions, *args, **kwargs):
+        """
+        Adds grade and feedback fields for each submission
+        """
+        super().__init__(*args, **kwargs)
+        self.submissions = list(submissions)
+        for submission in self.submissions:
+            self.fields[self.grade_field_name(submission)] = forms.IntegerField(
+                required=False,
+                min_value=0,
+                max_value=100,
+                initial=submission.grade,
+                label=submission.student.username
+            )
+            self.fields[self.feedback_field_name(submission)] = forms.CharField(
+                required=False,
+                initial=submission.feedback,
+                label="Feedback"
+            )
+
+    @staticmethod
+    def grade_field_name(submission):
+        """
+        Returns the name of the grade field for a submission
+        """
+        return "grade_{pk}".format(pk=submission.pk)
+
+    @staticmethod
+    def feedback_field_name(submission):
+        """
+        Returns the name of the feedback field for a submission
+        """
+        return "feedback_{pk}".format(pk=submission.pk)
+
+    def rows(self):
+        """
+        Returns (submission, grade field, feedback field) for each submission, for rendering
+        """
+        return [
+            (submission, self[self.grade_field_name(submission)], self[self.feedback_field_name(submission)])
+            for submission in self.submissions
+        ]
+
+    def clean(self):
+        """
+        Limits the number of grades entered at once, since each grade is sent to edX during the request
+        """
+        cleaned_data = super().clean()
+        if not self.errors:
+            max_grades = settings.SGA_BULK_GRADE_MAX_SUBMISSIONS
+            if len(self.get_grades()) > max_grades:
+                raise forms.ValidationError(
+                    "At most {max_grades} submissions can be graded at once.".format(max_grades=max_grades)
+                )
+        return cleaned_data
+
+    def get_grades(self):
+        """
+        Returns a dict of submission to (grade, feedback) for each row that has a grade entered
+        """
+        grades = {}
+        for submission in self.submissions:
+            grade = self.cleaned_data[self.grade_field_name(submission)]
+            if grade is not None:
+                grades[submission] = (grade, self.cleaned_data[self.feedback_field_name(submission)])
+        return grades
+
+
+class BulkGradeUploadForm(forms.Form):
+    """
+    Form for uploading a CSV file of grades (with username, grade and optional feedback columns)
+    """
+    grades_file = forms.FileField(label="Grades CSV File")
+
+    def __init__(self, submissions, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submissions = list(submissions)
+
+    def clean_grades_file(self):
+        """
+        Parses the file and matches its rows to submissions by username
+        """
+        try:
+            rows = parse_grades_csv(self.cleaned_data["grades_file"])
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
+        submissions_by_username = {submission.student.username: submission for submission in self.submissions}
+        unknown_usernames = [username for username, _, _ in rows if username not in submissions_by_username]
+        if unknown_usernames:
+            raise forms.ValidationError(
+                "No submitted submission to grade for: {usernames}".format(usernames=", ".join(unknown_usernames))
+            )
+        self.cleaned_data["rows"] = [
+            (submissions_by_username[username], grade, feedback) for username, grade, feedback in rows
+        ]
+        return self.cleaned_data["grades_file"]
+
+    def get_bulk_grade_form(self):
+        """
+        Returns a BulkGradeForm bound to the uploaded grades, so that they are validated the same
+        way as grades entered on the page
+        """
+        data = {}
+        for submission, grade, feedback in self.cleaned_data["rows"]:
+            data[BulkGradeForm.grade_field_name(submission)] = grade
+            data[BulkGradeForm.feedback_field_name(submission)] = feedback
+        return BulkGradeForm(self.submissions, data)
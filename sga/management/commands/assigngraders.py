@@ -0,0 +1,41 @@
+"""
+Contains a management command for assigning unassigned students to graders
+"""
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.auto_assign import auto_assign_graders
+from sga.models import Course
+
+
+class AssignGradersCommand(BaseCommand):
+    """
+    Management command for assigning unassigned students to graders
+    """
+    help = "Assigns a course's unassigned students to graders that have room for them"
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_edx_id", help="edX id of the course")
+        parser.add_argument(
+            "--balance-workload",
+            action="store_true",
+            dest="balance_workload",
+            default=False,
+            help="Balance graders by not graded submissions instead of by number of students"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for assigning students to graders
+        """
+        try:
+            course = Course.objects.get(edx_id=options["course_edx_id"])
+        except Course.DoesNotExist:
+            raise CommandError("Course {edx_id} does not exist".format(edx_id=options["course_edx_id"]))
+        plan = auto_assign_graders(course, balance_workload=options["balance_workload"])
+        assigned_count = sum(len(student_ids) for student_ids in plan.values())
+        self.stdout.write(self.style.SUCCESS(
+            "Assigned {students} students to {graders} graders.".format(students=assigned_count, graders=len(plan))
+        ))
+
+
+Command = AssignGradersCommand  # pylint: disable=invalid-name
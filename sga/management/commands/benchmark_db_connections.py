@@ -0,0 +1,82 @@
+"""
+Contains a management command for measuring the cost of opening a database connection per request
+"""
+from time import time
+
+from django.core.management import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from sga.models import Assignment, Course, Student
+
+
+def simulate_request(queries):
+    """
+    Runs queries like a request does (between the request_started and request_finished signals, so
+    connections are opened, checked and closed as they would be) and returns its duration in seconds
+    """
+    start = time()
+    request_started.send(sender=BenchmarkDbConnectionsCommand)
+    try:
+        for index in range(queries):
+            model = (Course, Assignment, Student)[index % 3]
+            list(model.objects.all()[:1])
+    finally:
+        request_finished.send(sender=BenchmarkDbConnectionsCommand)
+    return time() - start
+
+
+def summarize(durations):
+    """
+    Returns the mean, median and 95th percentile of durations, in milliseconds
+    """
+    durations = sorted(durations)
+    return (
+        sum(durations) / len(durations) * 1000,
+        durations[len(durations) // 2] * 1000,
+        durations[min(len(durations) - 1, int(len(durations) * 0.95))] * 1000
+    )
+
+
+class BenchmarkDbConnectionsCommand(BaseCommand):
+    """
+    Management command for measuring the cost of opening a database connection per request
+    """
+    help = "Measures per-request latency with and without database connection reuse (CONN_MAX_AGE)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Number of requests per mode (default 200)")
+        parser.add_argument("--queries", type=int, default=3, help="Number of queries per request (default 3)")
+        parser.add_argument("--database", default="default", help="Database alias (default default)")
+        parser.add_argument(
+            "--max-age",
+            type=int,
+            dest="max_age",
+            default=None,
+            help="CONN_MAX_AGE to use for the reuse mode (default: the configured value, or 60 if that is 0)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for benchmarking database connections
+        """
+        connection = connections[options["database"]]
+        configured_max_age = connection.settings_dict["CONN_MAX_AGE"]
+        reuse_max_age = options["max_age"] if options["max_age"] is not None else (configured_max_age or 60)
+        try:
+            for label, max_age in (("Without reuse", 0), ("With reuse", reuse_max_age)):
+                connection.settings_dict["CONN_MAX_AGE"] = max_age
+                connection.close()
+                # Warm up, so both modes start from the same state
+                simulate_request(options["queries"])
+                durations = [simulate_request(options["queries"]) for _ in range(options["requests"])]
+                self.stdout.write(
+                    "{label} (CONN_MAX_AGE={max_age}): mean {0:.2f} ms, median {1:.2f} ms, p95 {2:.2f} ms "
+                    "per request".format(*summarize(durations), label=label, max_age=max_age)
+                )
+        finally:
+            connection.settings_dict["CONN_MAX_AGE"] = configured_max_age
+            connection.close()
+
+
+Command = BenchmarkDbConnectionsCommand  # pylint: disable=invalid-name
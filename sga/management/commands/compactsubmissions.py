@@ -0,0 +1,72 @@
+"""
+Contains a management command for deleting placeholder Submission rows
+"""
+from datetime import datetime, timedelta
+
+import pytz
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from sga.backend.cache import bump_course_version
+from sga.models import Submission
+
+
+class CompactSubmissionsCommand(BaseCommand):
+    """
+    Management command for deleting placeholder Submission rows
+    """
+    help = (
+        "Deletes Submission rows that hold nothing but LTI outcome fields (students used to get one for "
+        "opening an assignment). The outcome fields are kept in the students' LaunchOutcome rows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of rows deleted per query (default 1000)"
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=settings.SESSION_COOKIE_AGE,
+            help="Only delete rows not updated for this many seconds (default SESSION_COOKIE_AGE)"
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            dest="dry_run",
+            default=False,
+            help="Count the rows that would be deleted without deleting them"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for deleting placeholder submissions in batches
+        """
+        updated_before = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(seconds=options["min_age"])
+        placeholders = Submission.objects.placeholders().filter(updated_on__lt=updated_before)
+        if options["dry_run"]:
+            self.stdout.write("Would delete {count} placeholder submissions.".format(count=placeholders.count()))
+            return
+        deleted_count = 0
+        course_ids = set()
+        while True:
+            batch = list(
+                placeholders.order_by("id").values_list("id", "assignment__course_id")[:options["batch_size"]]
+            )
+            if not batch:
+                break
+            # Filter again, so rows that were submitted since they were selected are kept
+            deleted_count += placeholders.filter(id__in=[submission_id for submission_id, _ in batch]).delete()[0]
+            course_ids.update(course_id for _, course_id in batch)
+        # QuerySet deletes skip Model.delete(), so invalidate cached course data here
+        for course_id in course_ids:
+            bump_course_version(course_id)
+        self.stdout.write(self.style.SUCCESS(
+            "Deleted {count} placeholder submissions.".format(count=deleted_count)
+        ))
+
+
+Command = CompactSubmissionsCommand  # pylint: disable=invalid-name
@@ -1,90 +1,197 @@
 """
 Contains a management command for creating mock data
 """
-from datetime import datetime
+import random
+from datetime import datetime, timedelta
+from math import ceil
+from time import time
+
+import pytz
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.core.management import BaseCommand
 
-from sga.models import Course, Assignment, Grader, Student, User
+from sga.backend.cache import bump_course_version
+from sga.backend.constants import SubmissionStatus
+from sga.backend.files import content_addressed_file_path, get_content_hash
+from sga.backend.roster import import_roster
+from sga.models import Course, Student, Submission, User
+
+MOCK_DATA_DEFAULTS = {
+    "courses": 1,
+    "students": 4,
+    "graders": 2,
+    "assignments": 2,
+    "submission_ratio": 0.0,
+    "graded_ratio": 0.0,
+    "with_files": False,
+    "seed": 0,
+    "batch_size": 5000,
+}
+FIRST_DUE_DATE = datetime(2016, 7, 1, tzinfo=pytz.UTC)
+ADMIN_USERNAME = "_admin_user"
+
+
+def get_course_edx_id(index):
+    """
+    Returns the edX id of the index-th mock course
+    """
+    return "course-v1:MITx+B{number}+2015_T3".format(number=101 + index)
+
+
+def get_assignment_edx_id(course_index, index):
+    """
+    Returns the edX id of the index-th mock assignment of a course (edX ids are unique across courses)
+    """
+    if course_index == 0:
+        return "_assignment{number}id".format(number=index + 1)
+    return "_course{course}_assignment{number}id".format(course=course_index + 1, number=index + 1)
+
+
+def get_roster(options):
+    """
+    Returns roster records (see sga.backend.roster) for the mock courses. Every course has the same
+    admin, graders and students, and students are spread evenly across the graders.
+    """
+    records = []
+    max_students = ceil(options["students"] / options["graders"]) if options["graders"] else 0
+    for course_index in range(options["courses"]):
+        course = get_course_edx_id(course_index)
+        records.append({"role": "admin", "course": course, "username": ADMIN_USERNAME})
+        for index in range(options["graders"]):
+            records.append({
+                "role": "grader",
+                "course": course,
+                "username": "_grader{number}".format(number=index + 1),
+                "max_students": max_students
+            })
+        for index in range(options["students"]):
+            username = "_student{number}".format(number=index + 1)
+            grader = "_grader{number}".format(number=index % options["graders"] + 1) if options["graders"] else None
+            records.append({
+                "role": "student",
+                "course": course,
+                "username": username,
+                "email": "{username}@test".format(username=username),
+                "grader": grader
+            })
+        for index in range(options["assignments"]):
+            records.append({
+                "role": "assignment",
+                "course": course,
+                "edx_id": get_assignment_edx_id(course_index, index),
+                "name": "_Assignment {number} Name".format(number=index + 1),
+                "due_date": (FIRST_DUE_DATE + timedelta(weeks=index)).isoformat()
+            })
+    return records
+
+
+def create_submissions(options, rng):  # pylint: disable=too-many-locals
+    """
+    Creates submissions for a share (submission_ratio) of the students in each mock assignment, a share
+    (graded_ratio) of which are graded. Returns the number of submissions created.
+    """
+    document = document_hash = None
+    if options["with_files"]:
+        # Every mock submission shares one stored file
+        content = ContentFile(b"%PDF-1.4 mock submission")
+        document_hash = get_content_hash(content)
+        document = content_addressed_file_path(document_hash, "submission.pdf")
+        if not default_storage.exists(document):
+            default_storage.save(document, content)
+    admin_user_id = User.objects.get(username=ADMIN_USERNAME).id
+    course_edx_ids = [get_course_edx_id(index) for index in range(options["courses"])]
+    created_count = 0
+    for course in Course.objects.filter(edx_id__in=course_edx_ids).order_by("edx_id"):
+        students = list(
+            Student.objects.filter(course=course).order_by("user__username").values_list(
+                "user_id",
+                "grader__user_id"
+            )
+        )
+        for assignment in course.assignments.order_by("edx_id"):
+            existing = set(assignment.submissions.values_list("student_id", flat=True))
+            submissions = []
+            for student_id, grader_user_id in students:
+                # Always draw the same numbers per student so the data doesn't depend on what exists
+                submitted, graded = rng.random() < options["submission_ratio"], rng.random() < options["graded_ratio"]
+                submitted_at = assignment.due_date - timedelta(minutes=rng.randint(0, 7 * 24 * 60))
+                grade = rng.randint(0, 100)
+                if not submitted or student_id in existing:
+                    continue
+                submissions.append(Submission(
+                    assignment=assignment,
+                    student_id=student_id,
+                    student_document=document,
+                    student_document_sha256=document_hash,
+                    submitted_at=submitted_at,
+                    status=SubmissionStatus.graded if graded else SubmissionStatus.submitted,
+                    grade=grade if graded else None,
+                    feedback="_Feedback" if graded else None,
+                    graded_by_id=(grader_user_id or admin_user_id) if graded else None,
+                    graded_at=submitted_at + timedelta(days=1) if graded else None
+                ))
+                if len(submissions) >= options["batch_size"]:
+                    Submission.objects.bulk_create(submissions)
+                    created_count += len(submissions)
+                    submissions = []
+            Submission.objects.bulk_create(submissions)
+            created_count += len(submissions)
+        # bulk_create() skips Model.save(), so invalidate cached course data here
+        bump_course_version(course.id)
+    return created_count
 
 
 class CreateMockDataCommand(BaseCommand):
     """
     Management command for creating mock data
     """
-    help = "Creates mock data (Course, Users, Students, Graders, Administrator, Assignments"
+    help = "Creates mock data (Course, Users, Students, Graders, Administrator, Assignments, Submissions)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, help="Number of courses (default 1)")
+        parser.add_argument("--students", type=int, help="Number of students per course (default 4)")
+        parser.add_argument("--graders", type=int, help="Number of graders per course (default 2)")
+        parser.add_argument("--assignments", type=int, help="Number of assignments per course (default 2)")
+        parser.add_argument(
+            "--submission-ratio",
+            type=float,
+            dest="submission_ratio",
+            help="Share of students that submitted each assignment, from 0 to 1 (default 0)"
+        )
+        parser.add_argument(
+            "--graded-ratio",
+            type=float,
+            dest="graded_ratio",
+            help="Share of submitted submissions that are graded, from 0 to 1 (default 0)"
+        )
+        parser.add_argument(
+            "--with-files",
+            action="store_true",
+            dest="with_files",
+            default=None,
+            help="Attach a (shared) student document to every submission"
+        )
+        parser.add_argument("--seed", type=int, help="Random seed (default 0)")
+        parser.add_argument("--batch-size", type=int, dest="batch_size", help="Rows per bulk insert (default 5000)")
 
     def handle(self, *args, **options):
         """
         Function for creating mock data
         """
-        admin_user, _ = User.objects.get_or_create(
-            username="_admin_user"
-        )
-        course, _ = Course.objects.get_or_create(
-            edx_id="course-v1:MITx+B101+2015_T3"
-        )
-        course.administrators.add(admin_user)
-        grader_user_1, _ = User.objects.get_or_create(
-            username="_grader1"
-        )
-        grader_user_2, _ = User.objects.get_or_create(
-            username="_grader2"
-        )
-        grader_1, _ = Grader.objects.get_or_create(
-            max_students=3,
-            user=grader_user_1,
-            course=course
-        )
-        grader_2, _ = Grader.objects.get_or_create(
-            max_students=1,
-            user=grader_user_2,
-            course=course
-        )
-        student_user_1, _ = User.objects.get_or_create(
-            username="_student1",
-            email="_student1@test"
-        )
-        student_user_2, _ = User.objects.get_or_create(
-            username="_student2",
-            email="_student2@test"
-        )
-        student_user_3, _ = User.objects.get_or_create(
-            username="_student3",
-            email="_student3@test"
-        )
-        student_user_4, _ = User.objects.get_or_create(
-            username="_student4",
-            email="_student4@test"
-        )
-        Student.objects.get_or_create(
-            user=student_user_1,
-            course=course,
-            grader=grader_1
-        )
-        Student.objects.get_or_create(
-            user=student_user_2,
-            course=course,
-            grader=grader_1
-        )
-        Student.objects.get_or_create(
-            user=student_user_3,
-            course=course,
-            grader=grader_2
-        )
-        Student.objects.get_or_create(
-            user=student_user_4,
-            course=course
-        )
-        Assignment.objects.get_or_create(
-            edx_id="_assignment1id",
-            name="_Assignment 1 Name",
-            due_date=datetime.utcnow(),
-            course=course
-        )
-        Assignment.objects.get_or_create(
-            edx_id="_assignment2id",
-            name="_Assignment 2 Name",
-            due_date=datetime.utcnow(),
-            course=course
-        )
+        options = dict(
+            MOCK_DATA_DEFAULTS,
+            **{key: value for key, value in options.items() if key in MOCK_DATA_DEFAULTS and value is not None}
+        )
+        start = time()
+        rng = random.Random(options["seed"])
+        import_roster(get_roster(options), batch_size=options["batch_size"])
+        submissions_count = create_submissions(options, rng)
+        self.stdout.write("Created {count} submissions in {duration:.2f}s.".format(
+            count=submissions_count,
+            duration=time() - start
+        ))
         self.stdout.write(self.style.SUCCESS("Successfully created mock data."))
+
+
+Command = CreateMockDataCommand  # pylint: disable=invalid-name
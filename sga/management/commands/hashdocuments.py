@@ -0,0 +1,67 @@
+"""
+Contains a management command for recording and checking the content hashes of submission documents
+"""
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.files import get_content_hash
+from sga.models import Submission
+
+DOCUMENT_FIELDS = ("student_document", "grader_document")
+
+
+class HashDocumentsCommand(BaseCommand):
+    """
+    Management command for recording and checking the content hashes of submission documents
+    """
+    help = (
+        "Records the SHA-256 hashes of submission documents uploaded before hashes were recorded (the "
+        "documents keep their paths). With --verify, also checks every stored document against its hash."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            dest="verify",
+            default=False,
+            help="Check documents that have a hash against their stored content"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for hashing (and verifying) submission documents
+        """
+        hashed_count = checked_count = 0
+        problems = []
+        for field_name in DOCUMENT_FIELDS:
+            field = Submission._meta.get_field(field_name)
+            submissions = Submission.objects.exclude(**{field_name: ""}).exclude(**{field_name + "__isnull": True})
+            if not options["verify"]:
+                submissions = submissions.filter(**{field.hash_field + "__isnull": True})
+            rows = submissions.order_by("id").values_list("id", field_name, field.hash_field)
+            for submission_id, document_name, document_hash in rows.iterator():
+                if not field.storage.exists(document_name):
+                    problems.append("Submission {id}: {name} is missing".format(id=submission_id, name=document_name))
+                    continue
+                with field.storage.open(document_name) as document:
+                    content_hash = get_content_hash(document)
+                if document_hash is None:
+                    Submission.objects.filter(id=submission_id).update(**{field.hash_field: content_hash})
+                    hashed_count += 1
+                else:
+                    checked_count += 1
+                    if content_hash != document_hash:
+                        problems.append("Submission {id}: {name} doesn't match its hash".format(
+                            id=submission_id,
+                            name=document_name
+                        ))
+        self.stdout.write("Hashed {count} documents.".format(count=hashed_count))
+        if problems:
+            raise CommandError("\n".join(problems))
+        if options["verify"]:
+            self.stdout.write(self.style.SUCCESS(
+                "Checked {count} documents, which all match their hashes.".format(count=checked_count)
+            ))
+
+
+Command = HashDocumentsCommand  # pylint: disable=invalid-name
@@ -0,0 +1,60 @@
+"""
+Contains a management command for importing course rosters
+"""
+import os
+from time import time
+
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.roster import ROSTER_FORMATS, RosterError, import_roster, read_roster
+
+
+class ImportRosterCommand(BaseCommand):
+    """
+    Management command for importing course rosters
+    """
+    help = "Creates or updates admins, graders, students and assignments from a CSV or JSON roster file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("roster_file", help="Path to the roster file")
+        parser.add_argument(
+            "--format",
+            choices=ROSTER_FORMATS,
+            dest="roster_format",
+            help="Roster file format (by default, taken from the file extension)"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            dest="batch_size",
+            help="Number of records imported per transaction"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for importing a roster
+        """
+        roster_format = options["roster_format"] or os.path.splitext(options["roster_file"])[1].lstrip(".").lower()
+        if roster_format not in ROSTER_FORMATS:
+            raise CommandError("Unknown roster format {format!r}, use --format".format(format=roster_format))
+        start = time()
+        try:
+            with open(options["roster_file"], newline="", encoding="utf-8-sig") as roster_file:
+                records = read_roster(roster_file, roster_format)
+        except (OSError, RosterError) as exc:
+            raise CommandError(str(exc))
+        stats = import_roster(records, batch_size=options["batch_size"])
+        duration = time() - start
+        for kind, count in sorted(stats.items()):
+            self.stdout.write("{count} {kind}".format(count=count, kind=kind))
+        self.stdout.write(self.style.SUCCESS(
+            "Imported {count} records in {duration:.2f}s ({rate:.0f} records/sec).".format(
+                count=len(records),
+                duration=duration,
+                rate=len(records) / duration if duration else 0
+            )
+        ))
+
+
+Command = ImportRosterCommand  # pylint: disable=invalid-name
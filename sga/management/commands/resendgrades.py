@@ -0,0 +1,65 @@
+"""
+Contains a management command for sending grades that haven't reached edX yet
+"""
+from django.core.management import BaseCommand, CommandError
+
+from sga.backend.constants import SubmissionStatus
+from sga.backend.grading import return_grades
+from sga.models import Submission
+
+
+class ResendGradesCommand(BaseCommand):
+    """
+    Management command for sending grades that haven't reached edX yet
+    """
+    help = (
+        "Sends the grades of graded submissions that haven't been returned to edX (because sending them "
+        "failed) and marks the ones that were sent as returned. Lists the grades that still failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("course_edx_id", nargs="?", help="Only resend grades for this course (edX id)")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            dest="batch_size",
+            help="Number of grades sent per batch (default 100)"
+        )
+
+    def handle(self, *args, **options):
+        """
+        Function for resending grades in batches
+        """
+        submissions = Submission.objects.filter(status=SubmissionStatus.graded)
+        if options["course_edx_id"]:
+            submissions = submissions.filter(assignment__course__edx_id=options["course_edx_id"])
+        submissions = submissions.select_related("student", "assignment").order_by("id")
+        sent_count = 0
+        problems = []
+        last_id = 0
+        while True:
+            # Failed grades stay graded, so page by id rather than by offset
+            batch = list(submissions.filter(id__gt=last_id)[:options["batch_size"]])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            failures = return_grades(batch)
+            sent_count += len(batch) - len(failures)
+            problems.extend(
+                "{student} ({assignment}): {error}".format(
+                    student=submission.student.username,
+                    assignment=submission.assignment.name,
+                    error=error
+                )
+                for submission, error in failures
+            )
+        self.stdout.write("Sent {count} grades to edX.".format(count=sent_count))
+        if problems:
+            raise CommandError("Could not send {count} grades:\n{problems}".format(
+                count=len(problems),
+                problems="\n".join(problems)
+            ))
+
+
+Command = ResendGradesCommand  # pylint: disable=invalid-name
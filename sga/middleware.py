@@ -1,12 +1,23 @@
 """
 Custom middleware
 """
-from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+import logging
+import random
+import uuid
+from time import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, SuspiciousOperation
 from django.http import HttpResponseBadRequest
 from django.shortcuts import redirect
 from django.utils.dateparse import parse_datetime
 from django_auth_lti.backends import LTIAuthBackend
 
+from sga.backend import instrumentation, metrics
+from sga.backend.cache import bump_course_version
+from sga.backend.logs import clear_log_context, set_log_context
+from sga.backend.outcomes import get_launch_outcome, remember_outcome
+from sga.backend.routers import READ_METHODS, get_replica_alias, pin_to_primary
 from sga.backend.constants import STUDIO_USER_USERNAME, Roles
 from sga.models import Course, Assignment, Student, Grader, Submission
 from sga.backend.authentication import get_role
@@ -36,51 +47,53 @@ class SGAMiddleware(object):
             return
         if not request.lti_authentication_successful:
             # Raise 400; user is using bad LTI credentials
+            metrics.inc("sga_lti_launches_total", outcome="bad_credentials")
             return HttpResponseBadRequest(self.UNSUCCESSFUL_LTI_AUTHENTICATION_MESSAGE)
         if not request.LTI.get("context_id"):
             # Raise a 400 error
+            metrics.inc("sga_lti_launches_total", outcome="no_context_id")
             raise SuspiciousOperation(self.NO_CONTEXT_ID_MESSAGE)
         if not request.LTI.get("resource_link_id"):
             # Raise a 400 error
+            metrics.inc("sga_lti_launches_total", outcome="no_resource_link_id")
             raise SuspiciousOperation(self.NO_RESOURCE_LINK_ID_MESSAGE)
         if not request.LTI.get("lis_outcome_service_url"):
+            metrics.inc("sga_lti_launches_total", outcome="not_graded_block")
             return redirect("not_graded_block_error_page")
         if request.user.username == STUDIO_USER_USERNAME:
+            metrics.inc("sga_lti_launches_total", outcome="studio")
             return redirect("studio_message_page")
         if request.user.username.startswith(LTIAuthBackend.unknown_user_prefix):
             request.user.delete()
+            metrics.inc("sga_lti_launches_total", outcome="username_not_shared")
             return HttpResponseBadRequest(self.REQUEST_USERNAME_FALSE_MESSAGE)
         # On the initial request, we have potentially gotten new information
         # from edX; update the database accordingly
         # Course
         course, _ = Course.objects.get_or_create(edx_id=request.LTI["context_id"])
         # Assignment
-        due_date = request.POST.get("custom_component_due_date")
-        if due_date:
-            due_date = parse_datetime(due_date)
-        name = request.POST.get("custom_component_display_name", request.LTI["resource_link_id"])
-        defaults = {"course": course, "due_date": due_date, "name": name}
-        assignment, _ = Assignment.objects.update_or_create(
-            edx_id=request.LTI["resource_link_id"],
-            defaults=defaults
-        )
+        assignment = self.update_launch_assignment(request, course)
         if any([r for r in self.ADMIN_ROLES if r in request.LTI.get("roles", [])]):
             course.administrators.add(request.user)
             Grader.objects.filter(user=request.user, course=course).delete()
-            Student.objects.filter(user=request.user, course=course).delete()
+            students = Student.all_objects.filter(user=request.user, course=course)
+            grader_ids = list(students.values_list("grader", flat=True))
+            students.delete()
+            # QuerySet deletes don't go through Model.delete(), so update grader counts and invalidate
+            # cached course data here
+            Grader.update_active_students_counts(grader_ids)
+            bump_course_version(course.id)
         else:
             course.administrators.remove(request.user)
             # Ensure the student object exists; graders also should have a student object, since
             # they are promoted from students and if they are ever demoted, their student data
             # should still exist
-            Student.objects.get_or_create(course=course, user=request.user)
-            # If this user is a student, we need to generate a Submission object and store
-            # grade submission information
-            submission, _ = Submission.objects.get_or_create(student=request.user, assignment=assignment)
-            submission.edx_url = request.LTI["lis_outcome_service_url"]
-            submission.result_id = request.POST.get("lis_result_sourcedid")
-            submission.consumer_key = request.POST.get("oauth_consumer_key")
-            submission.save()
+            Student.all_objects.get_or_create(course=course, user=request.user)
+            # If this user is a student, store the grade submission information. The Submission
+            # is only created when the student submits, and gets it from the LaunchOutcome then.
+            outcome = get_launch_outcome(request)
+            remember_outcome(request.user, assignment, outcome)
+            Submission.objects.filter(student=request.user, assignment=assignment).update(**outcome)
 
         # We only check for role on the initial LTI request since the user's session in our tool
         # is expected to be short-lived enough to not warrant checking on every request.
@@ -88,9 +101,30 @@ class SGAMiddleware(object):
         # to the decorator and views.
         user_role = get_role(request.user, course.id)
         request.session["course_roles"][str(course.id)] = user_role
+        metrics.inc("sga_lti_launches_total", outcome=user_role)
         # Redirect edX launch to the appropriate page
         return self.redirect_edx_launch(user_role, course, assignment)
 
+    @staticmethod
+    def update_launch_assignment(request, course):
+        """
+        Creates or updates the launched assignment. It's only saved when the launch changes it, since
+        saves invalidate the course's cached data.
+        """
+        due_date = request.POST.get("custom_component_due_date")
+        if due_date:
+            due_date = parse_datetime(due_date)
+        name = request.POST.get("custom_component_display_name", request.LTI["resource_link_id"])
+        defaults = {"course_id": course.id, "due_date": due_date, "name": name}
+        assignment, created = Assignment.objects.get_or_create(
+            edx_id=request.LTI["resource_link_id"],
+            defaults=defaults
+        )
+        changed = {field: value for field, value in defaults.items() if getattr(assignment, field) != value}
+        if changed and not created:
+            assignment.update(**changed)
+        return assignment
+
     @staticmethod
     def redirect_edx_launch(user_role, course, assignment):
         """
@@ -101,3 +135,125 @@ class SGAMiddleware(object):
         if user_role in [Roles.admin, Roles.grader]:
             return redirect("view_assignment", course_id=course.id, assignment_id=assignment.id)
         raise Exception("Bad role %s" % user_role)
+
+
+class LoggingContextMiddleware(object):
+    """
+    Middleware that adds the request id (the X-Request-ID header if there is one), course id and
+    role to records logged while handling a request (see sga.backend.logs)
+    """
+    def process_request(self, request):  # pylint: disable=no-self-use
+        """
+        Sets the request id, and returns it in the X-Request-ID response header
+        """
+        clear_log_context()
+        request.request_id = request.META.get("HTTP_X_REQUEST_ID") or uuid.uuid4().hex
+        set_log_context(request_id=request.request_id)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):  # pylint: disable=no-self-use,unused-argument
+        """
+        Sets the course id and role for views of a course
+        """
+        course_id = view_kwargs.get("course_id")
+        if course_id is not None:
+            set_log_context(course_id=course_id, role=request.session.get("course_roles", {}).get(course_id))
+
+    def process_response(self, request, response):  # pylint: disable=no-self-use
+        """
+        Clears the request's context
+        """
+        request_id = getattr(request, "request_id", None)
+        if request_id is not None:
+            response["X-Request-ID"] = request_id
+        clear_log_context()
+        return response
+
+
+class ReplicaPinMiddleware(object):
+    """
+    Middleware that pins a session to the primary database after a request that can write (anything
+    but GET and HEAD), so its reads don't go to a replica that hasn't caught up yet (see
+    sga.backend.routers)
+    """
+    def process_request(self, request):  # pylint: disable=no-self-use
+        """
+        Pins the session to the primary for non-read requests, when there is a replica
+        """
+        if get_replica_alias() and request.method not in READ_METHODS:
+            pin_to_primary(request.session)
+
+
+class MetricsMiddleware(object):
+    """
+    Middleware that records how long each view takes to respond (see sga.backend.metrics)
+    """
+    def process_request(self, request):  # pylint: disable=no-self-use
+        """
+        Notes when the request started
+        """
+        request.metrics_start = time()
+
+    def process_response(self, request, response):  # pylint: disable=no-self-use
+        """
+        Records the request's duration under its view's url name
+        """
+        start = getattr(request, "metrics_start", None)
+        if start is not None:
+            resolver_match = getattr(request, "resolver_match", None)
+            view = resolver_match.url_name if resolver_match and resolver_match.url_name else "unknown"
+            metrics.observe("sga_view_seconds", time() - start, view=view)
+        return response
+
+
+class InstrumentationMiddleware(object):
+    """
+    Middleware that profiles a sample of requests (SGA_INSTRUMENTATION_SAMPLE_RATE) and reports their
+    query count, database time, slowest statements and template render time in a log record and a
+    Server-Timing header. Disabled when the sample rate is 0.
+    """
+    log = logging.getLogger("sga.instrumentation")
+
+    def __init__(self):
+        if not settings.SGA_INSTRUMENTATION_SAMPLE_RATE:
+            raise MiddlewareNotUsed()
+        instrumentation.install()
+
+    def process_request(self, request):  # pylint: disable=no-self-use,unused-argument
+        """
+        Starts profiling if this request is sampled
+        """
+        if random.random() < settings.SGA_INSTRUMENTATION_SAMPLE_RATE:
+            instrumentation.start_profile()
+        else:
+            instrumentation.stop_profile()
+
+    def process_response(self, request, response):
+        """
+        Reports the request's profile, if it was sampled
+        """
+        profile = instrumentation.stop_profile()
+        if profile is None:
+            return response
+        total_duration = time() - profile.start
+        response["Server-Timing"] = profile.server_timing(total_duration)
+        slow_queries = [
+            {"duration_ms": round(duration * 1000, 1), "sql": sql, "call_site": call_site}
+            for duration, sql, call_site in profile.slowest_queries(settings.SGA_INSTRUMENTATION_SLOW_QUERIES)
+        ]
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "query_count": len(profile.queries),
+            "db_ms": round(profile.db_duration * 1000, 1),
+            "template_ms": round(profile.template_duration * 1000, 1),
+            "total_ms": round(total_duration * 1000, 1),
+            "slow_queries": slow_queries,
+        }
+        self.log.info(
+            "%(method)s %(path)s %(status)s queries=%(query_count)s db_ms=%(db_ms)s "
+            "template_ms=%(template_ms)s total_ms=%(total_ms)s",
+            fields,
+            extra=fields
+        )
+        return response
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 20:55
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0004_auto_20160705_1742'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='submission',
+            index_together=set([('graded_by', 'graded_at')]),
+        ),
+    ]
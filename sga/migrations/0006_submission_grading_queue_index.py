@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 20:56
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0005_submission_graded_by_graded_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='submission',
+            index_together=set([('graded_by', 'graded_at'), ('assignment', 'submitted', 'graded')]),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 22:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def populate_active_students_count(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Sets active_students_count for existing graders
+    """
+    Grader = apps.get_model("sga", "Grader")
+    Student = apps.get_model("sga", "Student")
+    counts = dict(
+        Student.objects.filter(deleted=False, grader__isnull=False).values_list(
+            "grader"
+        ).annotate(models.Count("id"))
+    )
+    for grader_id, count in counts.items():
+        Grader.objects.filter(pk=grader_id).update(active_students_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0006_submission_grading_queue_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='grader',
+            name='active_students_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_active_students_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 23:05
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# Status values as of this migration (see sga.backend.constants.SubmissionStatus)
+NOT_STARTED = 0
+SUBMITTED = 1
+GRADED = 2
+
+
+def populate_status(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Sets status from the submitted and graded flags. Whether a grade reached edX wasn't recorded,
+    so graded submissions stay graded rather than returned.
+    """
+    Submission = apps.get_model("sga", "Submission")
+    Submission.objects.filter(graded=True).update(status=GRADED)
+    Submission.objects.filter(submitted=True, graded=False).update(status=SUBMITTED)
+
+
+def populate_flags(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Sets the submitted and graded flags from status
+    """
+    Submission = apps.get_model("sga", "Submission")
+    Submission.objects.filter(status__gte=SUBMITTED).update(submitted=True)
+    Submission.objects.filter(status__gte=GRADED).update(graded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0007_grader_active_students_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='status',
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, 'Not Started'), (1, 'Submitted'), (2, 'Graded'), (3, 'Returned')],
+                db_index=True,
+                default=NOT_STARTED
+            ),
+        ),
+        migrations.RunPython(populate_status, populate_flags),
+        migrations.AlterIndexTogether(
+            name='submission',
+            index_together=set([('graded_by', 'graded_at'), ('assignment', 'status')]),
+        ),
+        migrations.RemoveField(
+            model_name='submission',
+            name='graded',
+        ),
+        migrations.RemoveField(
+            model_name='submission',
+            name='submitted',
+        ),
+    ]
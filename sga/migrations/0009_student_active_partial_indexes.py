@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 23:40
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# Partial indexes on active students only (Student.objects), for backends that support them
+ACTIVE_STUDENT_INDEXES = (
+    ("sga_student_active_course_user", "course_id, user_id"),
+    ("sga_student_active_grader", "grader_id"),
+)
+PARTIAL_INDEX_VENDORS = ("postgresql", "sqlite")
+
+
+def create_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Creates the partial indexes
+    """
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+    for name, columns in ACTIVE_STUDENT_INDEXES:
+        schema_editor.execute(
+            "CREATE INDEX {name} ON sga_student ({columns}) WHERE NOT deleted".format(name=name, columns=columns)
+        )
+
+
+def drop_indexes(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Drops the partial indexes
+    """
+    if schema_editor.connection.vendor not in PARTIAL_INDEX_VENDORS:
+        return
+    for name, _ in ACTIVE_STUDENT_INDEXES:
+        schema_editor.execute("DROP INDEX {name}".format(name=name))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0008_submission_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 23:55
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import sga.backend.files
+import sga.backend.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sga', '0009_student_active_partial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='grader_document_sha256',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='student_document_sha256',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='grader_document',
+            field=sga.backend.files.ContentAddressedFileField(hash_field='grader_document_sha256', max_length=512, null=True, upload_to='', validators=[sga.backend.validators.validate_file_extension, sga.backend.validators.validate_file_size]),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='student_document',
+            field=sga.backend.files.ContentAddressedFileField(hash_field='student_document_sha256', max_length=512, null=True, upload_to='', validators=[sga.backend.validators.validate_file_extension, sga.backend.validators.validate_file_size]),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.4 on 2026-10-18 22:53
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_submission_outcomes(apps, schema_editor):  # pylint: disable=unused-argument
+    """
+    Creates LaunchOutcomes from the outcome fields of existing Submissions (including placeholders),
+    so students can submit without launching again
+    """
+    Submission = apps.get_model("sga", "Submission")
+    LaunchOutcome = apps.get_model("sga", "LaunchOutcome")
+    rows = Submission.objects.filter(edx_url__isnull=False).values_list(
+        "assignment_id", "student_id", "edx_url", "result_id", "consumer_key"
+    )
+    batch = []
+    for assignment_id, student_id, edx_url, result_id, consumer_key in rows.iterator():
+        batch.append(LaunchOutcome(
+            assignment_id=assignment_id,
+            student_id=student_id,
+            edx_url=edx_url,
+            result_id=result_id,
+            consumer_key=consumer_key
+        ))
+        if len(batch) == 1000:
+            LaunchOutcome.objects.bulk_create(batch)
+            batch = []
+    LaunchOutcome.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('sga', '0010_submission_document_hashes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LaunchOutcome',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('edx_url', models.CharField(max_length=256, null=True)),
+                ('result_id', models.CharField(max_length=256, null=True)),
+                ('consumer_key', models.CharField(max_length=256, null=True)),
+                ('assignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='launch_outcomes', to='sga.Assignment')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='launch_outcomes', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='launchoutcome',
+            unique_together=set([('assignment', 'student')]),
+        ),
+        migrations.RunPython(copy_submission_outcomes, migrations.RunPython.noop),
+    ]
@@ -1,14 +1,18 @@
 """
 Model definitions
 """
-from datetime import datetime
 
-import pytz
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
 
-from sga.backend.files import student_submission_file_path, grader_submission_file_path
+from sga.backend.cache import bump_course_version
+from sga.backend.constants import SUBMISSION_STATUS_CHOICES, SUBMISSION_STATUS_TRANSITIONS, SubmissionStatus
+from sga.backend.files import ContentAddressedFileField
+from sga.backend.lateness import count_lateness, get_deadline, get_lateness_annotation, get_now
+from sga.backend.pagination import keyset_page
 from sga.backend.validators import validate_file_extension, validate_file_size
 
 
@@ -29,6 +33,27 @@ class TimeStampedModel(models.Model):
             update_fields.add(k)
         self.save(update_fields=update_fields)
 
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Saves the object and invalidates cached data for its course
+        """
+        super().save(*args, **kwargs)
+        bump_course_version(self.get_cache_course_id())
+
+    def delete(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Deletes the object and invalidates cached data for its course
+        """
+        course_id = self.get_cache_course_id()
+        super().delete(*args, **kwargs)
+        bump_course_version(course_id)
+
+    def get_cache_course_id(self):
+        """
+        Returns the id of the course whose cached data depends on this object
+        """
+        return getattr(self, "course_id", None)
+
     class Meta:
         abstract = True
 
@@ -38,51 +63,109 @@ class Grader(TimeStampedModel):
     Grader model (intermediate between Course and User)
     """
     max_students = models.IntegerField(default=10)
+    # Number of active students assigned to this grader (maintained by Student.save() and Student.delete()),
+    # so that capacity checks don't need to count students
+    active_students_count = models.IntegerField(default=0)
     user = models.ForeignKey(User)
     course = models.ForeignKey("Course")
 
     def __str__(self):
         return self.user.username
 
+    @staticmethod
+    def update_active_students_counts(grader_ids):
+        """
+        Recounts active_students_count for the graders with the given ids
+        """
+        grader_ids = {grader_id for grader_id in grader_ids if grader_id is not None}
+        if not grader_ids:
+            return
+        counts = dict(
+            Student.objects.filter(grader_id__in=grader_ids).values_list(
+                "grader"
+            ).annotate(models.Count("id"))
+        )
+        for grader_id in grader_ids:
+            Grader.objects.filter(pk=grader_id).update(active_students_count=counts.get(grader_id, 0))
+
     def get_number_of_students(self):
         """ Gets the number of students assigned to the grader """
-        return self.students.filter(deleted=False).count()
+        return self.students.count()
 
     def graded_submissions_count(self):
         """
         Returns a count of submission that are graded by this grader (will count all Submissions graded
         by this Grader, even if the Student for that Submission is no longer assigned to this Grader)
         """
-        return Submission.objects.filter(
+        return Submission.objects.of_active_students().filter(
             graded_by=self.user,
-            student__student__deleted=False,
             assignment__course=self.course,
-            submitted=True,
-            graded=True
+            status__gte=SubmissionStatus.graded
         ).count()
 
+    def graded_submissions_history(self, cursor=None, limit=None):
+        """
+        Returns (submissions, next_cursor) for a page of the Submissions in this course graded by this
+        grader, newest first. Pass next_cursor back in as cursor to get the following page.
+        """
+        submissions = Submission.objects.filter(
+            graded_by=self.user,
+            assignment__course=self.course,
+            status__gte=SubmissionStatus.graded,
+            graded_at__isnull=False
+        ).select_related(
+            "assignment",
+            "student"
+        )
+        return keyset_page(
+            submissions,
+            "graded_at",
+            cursor=cursor,
+            limit=limit or settings.SGA_GRADED_SUBMISSIONS_PAGE_SIZE
+        )
+
     def not_graded_submissions_count(self):
         """
         Returns a count of submission that are submitted but not graded by this grader
         """
-        student_users = [s.user for s in self.students.filter(deleted=False)]
-        return Submission.objects.filter(
-            student__in=student_users,
+        return Submission.objects.of_active_students(grader=self).filter(
             assignment__course=self.course,
-            submitted=True,
-            graded=False
+            status=SubmissionStatus.submitted
         ).count()
 
     def available_student_slots_count(self):
         """
         Returns a count of the number of students this grader can still accept
         """
-        return self.max_students - self.students.filter(deleted=False).count()
+        return self.max_students - self.active_students_count
+
+    def get_lateness_counts(self, now=None):
+        """
+        Returns a dict of lateness to the number of submissions by this grader's active students with
+        that lateness, for all assignments in the course
+        """
+        return count_lateness(
+            Submission.objects.of_active_students(grader=self),
+            self.active_students_count,
+            list(self.course.assignments.all()),
+            now=now
+        )
 
     class Meta():
         unique_together = (("user", "course"),)
 
 
+class ActiveStudentManager(models.Manager):
+    """
+    Manager of the students that aren't deleted (students become deleted when they are made graders)
+    """
+    def get_queryset(self):
+        """
+        Excludes deleted students
+        """
+        return super().get_queryset().filter(deleted=False)
+
+
 class Student(TimeStampedModel):
     """
     Student model (intermediate between Course and User)
@@ -92,9 +175,50 @@ class Student(TimeStampedModel):
     course = models.ForeignKey("Course")
     deleted = models.BooleanField(default=False)
 
+    # The default manager (also used by grader.students) only has active students; all_objects
+    # includes deleted ones
+    objects = ActiveStudentManager()
+    all_objects = models.Manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the loaded values so that save() knows which graders' counts to update
+        self._saved_grader_id = self.__dict__.get("grader_id") if self.pk else None
+        self._saved_deleted = self.__dict__.get("deleted") if self.pk else None
+
     def __str__(self):
         return self.user.username
 
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Saves the student and updates the active student counts of its old and new graders
+        """
+        super().save(*args, **kwargs)
+        if (self.grader_id, self.deleted) != (self._saved_grader_id, self._saved_deleted):
+            Grader.update_active_students_counts([self._saved_grader_id, self.grader_id])
+        self._saved_grader_id = self.grader_id
+        self._saved_deleted = self.deleted
+
+    def delete(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Deletes the student and updates the active student count of its grader
+        """
+        grader_id = self.grader_id
+        super().delete(*args, **kwargs)
+        Grader.update_active_students_counts([grader_id])
+
+    def get_lateness_counts(self, assignments=None, now=None):
+        """
+        Returns a dict of lateness to the number of this student's submissions with that lateness, for
+        assignments (all assignments in the course by default)
+        """
+        return count_lateness(
+            Submission.objects.filter(student_id=self.user_id),
+            1,
+            list(self.course.assignments.all()) if assignments is None else assignments,
+            now=now
+        )
+
     class Meta():
         unique_together = (("user", "course"),)
 
@@ -108,11 +232,17 @@ class Course(TimeStampedModel):
     graders = models.ManyToManyField(User, through=Grader, related_name="grader_courses")
     students = models.ManyToManyField(User, through=Student, related_name="student_courses")
 
+    def get_cache_course_id(self):
+        """
+        Returns the id of the course whose cached data depends on this object
+        """
+        return self.id
+
     def has_student(self, user):
         """
         Returns a boolean of whether or not user is a Student in this course
         """
-        return self.students.filter(pk=user.pk, student__deleted=False).exists()
+        return Student.objects.filter(course=self, user=user).exists()
 
     def has_grader(self, user):
         """
@@ -130,13 +260,10 @@ class Course(TimeStampedModel):
         """
         Returns a count of submissions by this student that are submitted but not graded
         """
-        if student.deleted:
-            return "N/A"
         return Submission.objects.filter(
             assignment__course=self,
             student=student.user,
-            submitted=True,
-            graded=False
+            status=SubmissionStatus.submitted
         ).count()
 
 
@@ -147,14 +274,14 @@ class Assignment(TimeStampedModel):
     edx_id = models.CharField(max_length=128, unique=True)
     name = models.CharField(max_length=128)
     due_date = models.DateTimeField(null=True)
-    grace_period = models.IntegerField(default=0)
+    grace_period = models.IntegerField(default=0)  # Hours after due_date that submissions are in grace
     course = models.ForeignKey(Course, related_name="assignments")
 
     def graded_submissions_count(self):
         """
         Returns a count of submissions for this assignment that are graded
         """
-        return self.submissions.filter(submitted=True, graded=True, student__student__deleted=False).count()
+        return self.submissions.of_active_students().filter(status__gte=SubmissionStatus.graded).count()
 
     def graded_submissions_count_by_grader(self, grader=None, grader_user=None, limit_to_current_students=True):
         """
@@ -163,23 +290,18 @@ class Assignment(TimeStampedModel):
         """
         if not grader:
             grader = Grader.objects.get(user=grader_user, course=self.course)
-        submissions = Submission.objects.filter(
+        student_lookups = {"grader": grader} if limit_to_current_students else {}
+        return Submission.objects.of_active_students(**student_lookups).filter(
             graded_by=grader.user,
-            student__student__deleted=False,
             assignment=self,
-            submitted=True,
-            graded=True
-        )
-        if limit_to_current_students:
-            student_users = [s.user for s in grader.students.filter(deleted=False)]
-            submissions = submissions.filter(student__in=student_users)
-        return submissions.count()
+            status__gte=SubmissionStatus.graded
+        ).count()
 
     def not_graded_submissions_count(self):
         """
         Returns a count of submissions for this assignment that are submitted but not graded
         """
-        return self.submissions.filter(submitted=True, graded=False, student__student__deleted=False).count()
+        return self.submissions.of_active_students().filter(status=SubmissionStatus.submitted).count()
 
     def not_graded_submissions_count_by_grader(self, grader=None, grader_user=None):
         """
@@ -187,20 +309,45 @@ class Assignment(TimeStampedModel):
         """
         if not grader:
             grader = Grader.objects.get(user=grader_user, course=self.course)
-        student_users = [s.user for s in grader.students.filter(deleted=False)]
-        return Submission.objects.filter(
-            student__in=student_users,
+        return Submission.objects.of_active_students(grader=grader).filter(
             assignment=self,
-            submitted=True,
-            graded=False
+            status=SubmissionStatus.submitted
         ).count()
 
+    def not_graded_submissions_queue(self, grader=None):
+        """
+        Returns the submitted but not graded Submissions of active students for this assignment (limited
+        to the students assigned to grader if it is set), in a stable order for stepping through them
+        """
+        student_lookups = {"grader": grader} if grader else {}
+        return self.submissions.of_active_students(**student_lookups).filter(
+            status=SubmissionStatus.submitted
+        ).order_by("pk")
+
+    def get_adjacent_not_graded_submission(self, submission, grader=None, previous=False):
+        """
+        Returns the next (or previous) Submission after submission in not_graded_submissions_queue(),
+        wrapping around at the end of the queue. Returns None if there are no other Submissions in the queue.
+        """
+        queue = self.not_graded_submissions_queue(grader=grader)
+        if submission.pk is None:
+            # Placeholders aren't in the queue, so start from its ends
+            return queue.last() if previous else queue.first()
+        # Submissions after submission (before it, going back) come first, then the ones from the other end
+        # of the queue, so the adjacent Submission and the wrap-around take one query
+        if previous:
+            ahead, direction = Q(pk__lt=submission.pk), "-pk"
+        else:
+            ahead, direction = Q(pk__gt=submission.pk), "pk"
+        wrapped = Case(When(ahead, then=Value(0)), default=Value(1), output_field=models.IntegerField())
+        return queue.exclude(pk=submission.pk).order_by(wrapped, direction).first()
+
     def not_submitted_submissions_count(self):
         """
         Returns a count of submissions for this assignment that are not submitted
         """
         # Graders all have student objects
-        students_in_course = self.course.students.filter(student__deleted=False).count()
+        students_in_course = Student.objects.filter(course_id=self.course_id).count()
         return students_in_course - self.graded_submissions_count() - self.not_graded_submissions_count()
 
     def not_submitted_submissions_count_by_grader(self, grader=None, grader_user=None):
@@ -213,13 +360,100 @@ class Assignment(TimeStampedModel):
                 - self.graded_submissions_count_by_grader(grader_user=grader.user)
                 - self.not_graded_submissions_count_by_grader(grader=grader))
 
-    def is_past_due_date(self, now=datetime.utcnow().replace(tzinfo=pytz.UTC)):
+    def is_past_due_date(self, now=None):
         """
         Returns a boolean of whether or not the assignment is past its due date
         """
         if not self.due_date:
             return None
-        return now >= self.due_date
+        return get_now(now) >= self.due_date
+
+    def get_deadline(self):
+        """
+        Returns the end of the assignment's grace period, after which submissions are late
+        """
+        return get_deadline(self.due_date, self.grace_period)
+
+    def is_past_deadline(self, now=None):
+        """
+        Returns a boolean of whether or not the assignment is past the end of its grace period
+        """
+        if not self.due_date:
+            return None
+        return get_now(now) >= self.get_deadline()
+
+    def get_lateness_counts(self, grader=None, now=None):
+        """
+        Returns a dict of lateness to the number of active students (or a grader's students) whose
+        submission for this assignment has that lateness
+        """
+        students = Student.objects.filter(course_id=self.course_id)
+        if grader is not None:
+            students = students.filter(grader=grader)
+            students_count = grader.active_students_count
+        else:
+            students_count = students.count()
+        return count_lateness(
+            Submission.objects.filter(student__in=students.values_list("user_id", flat=True)),
+            students_count,
+            [self],
+            now=now
+        )
+
+
+class InvalidStatusTransition(Exception):
+    """ Exception class for submission status changes that aren't allowed """
+
+
+class SubmissionQuerySet(models.QuerySet):
+    """
+    QuerySet of submissions
+    """
+    def with_lateness(self, now=None):
+        """
+        Annotates each submission with its lateness (see sga.backend.lateness) as of now
+        """
+        return self.annotate(lateness=get_lateness_annotation(now))
+
+    def of_active_students(self, **student_lookups):
+        """
+        Filters to submissions by active students of the assignment's course. student_lookups are
+        lookups on their Student (e.g. grader=grader, or course=course when the course is known),
+        applied in the same filter() call so that they share its join.
+        """
+        lookups = dict({"course": F("assignment__course"), "deleted": False}, **student_lookups)
+        return self.filter(**{
+            "student__student__{lookup}".format(lookup=lookup): value for lookup, value in lookups.items()
+        })
+
+    def get_or_placeholder(self, student, assignment):
+        """
+        Returns the Submission of student (a User) for assignment, or an unsaved placeholder if there
+        isn't one. Placeholders are only saved once the student submits. Either way the submission
+        has student and assignment set, so saving it doesn't load the assignment again.
+        """
+        submission = self.filter(student=student, assignment=assignment).first()
+        if submission is None:
+            return self.model(student=student, assignment=assignment)
+        submission.student = student
+        submission.assignment = assignment
+        return submission
+
+    def placeholders(self):
+        """
+        Filters to submissions that hold nothing but LTI outcome fields (rows created for students who
+        opened an assignment without submitting it)
+        """
+        return self.filter(
+            Q(student_document__isnull=True) | Q(student_document=""),
+            Q(grader_document__isnull=True) | Q(grader_document=""),
+            Q(description__isnull=True) | Q(description=""),
+            Q(feedback__isnull=True) | Q(feedback=""),
+            status=SubmissionStatus.not_started,
+            submitted_at__isnull=True,
+            grade__isnull=True,
+            graded_by__isnull=True
+        )
 
 
 class Submission(TimeStampedModel):
@@ -230,31 +464,88 @@ class Submission(TimeStampedModel):
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="submitted_submissions")
     graded_by = models.ForeignKey(User, null=True, related_name="graded_submissions")
 
-    student_document = models.FileField(
-        upload_to=student_submission_file_path,
+    student_document = ContentAddressedFileField(
+        hash_field="student_document_sha256",
         null=True,
         max_length=512,
         validators=[validate_file_extension, validate_file_size]
     )
+    student_document_sha256 = models.CharField(max_length=64, null=True)  # hex digest of student_document
     description = models.TextField(null=True)
     submitted_at = models.DateTimeField(null=True)  # UTC
-    submitted = models.BooleanField(default=False)
 
-    grader_document = models.FileField(
-        upload_to=grader_submission_file_path,
+    grader_document = ContentAddressedFileField(
+        hash_field="grader_document_sha256",
         null=True,
         max_length=512,
         validators=[validate_file_extension, validate_file_size]
     )
+    grader_document_sha256 = models.CharField(max_length=64, null=True)  # hex digest of grader_document
     feedback = models.TextField(null=True)
     grade = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(100)], null=True)  # 0-100
     graded_at = models.DateTimeField(null=True)  # UTC
-    graded = models.BooleanField(default=False)
+    status = models.PositiveSmallIntegerField(
+        choices=SUBMISSION_STATUS_CHOICES,
+        default=SubmissionStatus.not_started,
+        db_index=True
+    )
 
     edx_url = models.CharField(max_length=256, null=True)  # lis_outcome_service_url
     result_id = models.CharField(max_length=256, null=True)  # lis_result_sourcedid
     consumer_key = models.CharField(max_length=256, null=True)  # oauth_consumer_key
 
+    objects = SubmissionQuerySet.as_manager()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Remember the loaded status so that save() can check the status change
+        self._saved_status = self.__dict__.get("status") if self.pk else None
+
+    def save(self, *args, **kwargs):  # pylint: disable=arguments-differ
+        """
+        Saves the submission, raising InvalidStatusTransition if its status changed in a way that
+        SUBMISSION_STATUS_TRANSITIONS doesn't allow
+        """
+        if self._saved_status is not None and self.status != self._saved_status and \
+                self.status not in SUBMISSION_STATUS_TRANSITIONS[self._saved_status]:
+            raise InvalidStatusTransition(
+                "Submission {pk} can't change from {old} to {new}".format(
+                    pk=self.pk,
+                    old=self._saved_status,
+                    new=self.status
+                )
+            )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # Saving a document also sets its hash field
+            kwargs["update_fields"] = set(update_fields) | {
+                self._meta.get_field(name).hash_field
+                for name in ("student_document", "grader_document") if name in update_fields
+            }
+        super().save(*args, **kwargs)
+        self._saved_status = self.status
+
+    def get_cache_course_id(self):
+        """
+        Returns the id of the course whose cached data depends on this object. This loads the
+        assignment unless it was set or selected (see get_or_placeholder), and only once per instance.
+        """
+        return self.assignment.course_id
+
+    @property
+    def submitted(self):
+        """
+        Returns a boolean of whether or not the submission is submitted (including graded ones)
+        """
+        return self.status >= SubmissionStatus.submitted
+
+    @property
+    def graded(self):
+        """
+        Returns a boolean of whether or not the submission is graded (including returned ones)
+        """
+        return self.status >= SubmissionStatus.graded
+
     def grade_display(self):
         """
         Human-readable display of this submission's grade
@@ -272,3 +563,24 @@ class Submission(TimeStampedModel):
 
     class Meta:
         unique_together = (("assignment", "student"),)
+        index_together = (
+            ("graded_by", "graded_at"),
+            ("assignment", "status", "id"),
+        )
+
+
+class LaunchOutcome(models.Model):
+    """
+    The LTI outcome service parameters of a student's latest launch of an assignment. A Submission gets
+    them when the student submits. Outcomes aren't shown on any page, so unlike TimeStampedModel,
+    saving one doesn't invalidate the course's cached data.
+    """
+    assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name="launch_outcomes")
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name="launch_outcomes")
+
+    edx_url = models.CharField(max_length=256, null=True)  # lis_outcome_service_url
+    result_id = models.CharField(max_length=256, null=True)  # lis_result_sourcedid
+    consumer_key = models.CharField(max_length=256, null=True)  # oauth_consumer_key
+
+    class Meta:
+        unique_together = (("assignment", "student"),)
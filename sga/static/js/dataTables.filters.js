@@ -22,3 +22,8 @@ function filterEqualToZero(table, column) {
     table.columns(column).search("^0+$", true).draw();
 }
 
+
+function filterEqualTo(table, column, value) {
+    filterReset(table);
+    table.columns(column).search("^" + value + "$", true, false).draw();
+}
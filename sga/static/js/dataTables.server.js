@@ -0,0 +1,38 @@
+function escapeHtml(text) {
+    return $("<div>").text(text === null || text === undefined ? "" : text).html();
+}
+
+function renderLink(urlKey, text) {
+    // Renders a cell as a link to the url in the row's urlKey field (or as text if the row has none)
+    return function (data, type, row) {
+        var label = text === undefined ? data : text;
+        if (!row[urlKey]) {
+            return escapeHtml(label);
+        }
+        return '<a href="' + escapeHtml(row[urlKey]) + '">' + escapeHtml(label) + "</a>";
+    };
+}
+
+function serverSideTable(selector, url, pageLength, columns, options) {
+    // Paging, ordering, searching and the filter buttons (see filterServer) are done by url
+    return $(selector).DataTable($.extend({
+        serverSide: true,
+        processing: true,
+        pageLength: pageLength,
+        ajax: {
+            url: url,
+            data: function (params) {
+                var filter = $(selector).data("filter");
+                if (filter) {
+                    params.filter = filter;
+                }
+            }
+        },
+        columns: columns
+    }, options));
+}
+
+function filterServer(table, filter) {
+    $(table.table().node()).data("filter", filter);
+    table.search("").draw();
+}
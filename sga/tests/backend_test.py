@@ -1,18 +1,55 @@
 """
 Test backend functions
 """
+import gzip
+import hashlib
+import json
+import logging
+import os
+import subprocess
 from io import BytesIO
-from zipfile import is_zipfile
+from tempfile import TemporaryDirectory
+from zipfile import is_zipfile, ZipFile
 
+from django.contrib.staticfiles.storage import staticfiles_storage
 from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import StopFutureHandlers
 from django.conf import settings
+from django.core.management import call_command
 from django.test import override_settings
 from mock import MagicMock, patch
 
+from sga.backend import metrics
+from sga.backend.analytics import get_grade_statistics, summarize_grades
 from sga.backend.authentication import get_role
-from sga.backend.constants import Roles
-from sga.backend.files import convert_illegal_S3_chars, submissions_zip_generator
-from sga.backend.send_grades import send_grade, SendGradeFailure
+from sga.backend.auto_assign import auto_assign_graders, plan_grader_assignments
+from sga.backend.cache import (
+    bump_course_version,
+    course_cache_key,
+    get_cache_stats,
+    get_course_version,
+    get_or_set_course_value,
+    reset_cache_stats
+)
+from sga.backend.constants import Roles, SubmissionStatus
+from sga.backend.db import check_connections, mark_connections_used
+from sga.backend.files import (
+    content_addressed_file_path,
+    convert_illegal_S3_chars,
+    HashingMemoryFileUploadHandler,
+    submissions_zip_generator
+)
+from sga.backend.gradebook import gradebook_rows
+from sga.backend.logs import (
+    clear_log_context,
+    JsonFormatter,
+    QueuedHandler,
+    SamplingFilter,
+    set_log_context
+)
+from sga.backend.grading import bulk_grade_submissions, parse_grades_csv
+from sga.backend.send_grades import send_grade, send_grades, SendGradeFailure
+from sga.backend.staticfiles import IMMUTABLE_CACHE_CONTROL, StaticFilesCling
 from sga.backend.validators import validate_file_extension, validate_file_size
 from sga.tests.common import SGATestCase
 
@@ -21,6 +58,7 @@ class TestBackend(SGATestCase):
     """
     Test that the backend functions work as expected
     """
+    # pylint: disable=too-many-public-methods
 
     def test_validate_file_extension(self):
         """
@@ -92,6 +130,190 @@ class TestBackend(SGATestCase):
         """
         self.assertRaises(SendGradeFailure, send_grade, "key", "url", "result_id", None)
 
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_send_grades(self):
+        """
+        Tests that send_grades() shares one client per consumer key and collects failures
+        """
+        submissions = [
+            MagicMock(consumer_key="key", result_id="result_id", edx_grade=MagicMock(return_value=grade))
+            for grade in (0.5, 0.9)
+        ] + [MagicMock(consumer_key="not_key")]
+        with patch(
+            "oauth2.Client.request",
+            MagicMock(return_value=("", "<imsx_codeMajor>success</imsx_codeMajor>"))
+        ), patch("oauth2.Client.__init__", MagicMock(return_value=None)) as client_init:
+            failures = send_grades(submissions)
+        self.assertEqual(client_init.call_count, 1)
+        self.assertEqual([submission for submission, _ in failures], submissions[2:])
+        self.assertIsInstance(failures[0][1], SendGradeFailure)
+
+    @override_settings(LTI_OAUTH_CREDENTIALS={"key": "secret"})
+    def test_send_grades_errors(self):
+        """
+        Tests that send_grades() records network errors as failures and keeps sending the other grades
+        """
+        submissions = [
+            MagicMock(consumer_key="key", result_id="result_id", edx_grade=MagicMock(return_value=grade))
+            for grade in (0.5, 0.9)
+        ]
+        request = MagicMock(side_effect=[
+            OSError("Connection refused"),
+            ("", "<imsx_codeMajor>success</imsx_codeMajor>")
+        ])
+        with patch("oauth2.Client.request", request), patch("sga.backend.send_grades.log") as log_mock:
+            failures = send_grades(submissions)
+        self.assertEqual(request.call_count, 2)
+        self.assertEqual(log_mock.exception.call_count, 1)
+        self.assertEqual([submission for submission, _ in failures], submissions[:1])
+        self.assertIsInstance(failures[0][1], SendGradeFailure)
+
+    def test_bulk_grade_submissions(self):
+        """
+        Tests that bulk_grade_submissions() saves every grade and invalidates cached course data
+        """
+        grader_user = self.get_test_grader_user()
+        submissions = [self.get_test_submission(student_username=name) for name in ("student1", "student2")]
+        for submission in submissions:
+            submission.update(status=SubmissionStatus.submitted)
+        version = get_course_version(self.default_course.id)
+        graded = bulk_grade_submissions(
+            {submissions[0]: (90, "good"), submissions[1]: (40, "")},
+            grader_user
+        )
+        self.assertEqual(len(graded), 2)
+        self.assertNotEqual(get_course_version(self.default_course.id), version)
+        for submission, grade, feedback in zip(submissions, (90, 40), ("good", "")):
+            submission.refresh_from_db()
+            self.assertEqual(submission.grade, grade)
+            self.assertEqual(submission.feedback, feedback)
+            self.assertTrue(submission.graded)
+            self.assertEqual(submission.graded_by, grader_user)
+            self.assertIsNotNone(submission.graded_at)
+
+    def test_parse_grades_csv(self):
+        """
+        Tests parse_grades_csv()
+        """
+        csv_file = BytesIO(b"Username,Grade,Feedback\nstudent1, 90 ,good\nstudent2,40\n")
+        self.assertEqual(parse_grades_csv(csv_file), [("student1", "90", "good"), ("student2", "40", "")])
+        self.assertRaises(ValueError, parse_grades_csv, BytesIO(b"name,score\nstudent1,90\n"))
+        self.assertRaises(ValueError, parse_grades_csv, BytesIO(b"\xff\xfe"))
+
+    def test_plan_grader_assignments(self):
+        """
+        Tests that plan_grader_assignments() fills the emptiest graders first without going over max_students
+        """
+        grader1 = self.get_test_grader(username="grader1")
+        grader1.update(max_students=3)
+        grader2 = self.get_test_grader(username="grader2")
+        grader2.update(max_students=3)
+        self.get_test_student(username="assigned").update(grader=grader1)
+        students = [self.get_test_student(username="student{index}".format(index=index)) for index in range(6)]
+        plan = plan_grader_assignments(self.default_course)
+        # grader1 has 2 slots left and grader2 has 3, so one student stays unassigned
+        self.assertEqual(len(plan[grader1.id]), 2)
+        self.assertEqual(len(plan[grader2.id]), 3)
+        self.assertEqual(plan[grader2.id][0], students[0].id)
+        # Nothing is written until the plan is applied
+        self.assertEqual(grader2.get_number_of_students(), 0)
+        auto_assign_graders(self.default_course)
+        self.assertEqual(grader1.get_number_of_students(), 3)
+        self.assertEqual(grader2.get_number_of_students(), 3)
+        self.assertEqual(plan_grader_assignments(self.default_course), {})
+
+    def test_plan_grader_assignments_balance_workload(self):
+        """
+        Tests that plan_grader_assignments() can balance graders by not graded submissions
+        """
+        grader1 = self.get_test_grader(username="grader1")
+        grader2 = self.get_test_grader(username="grader2")
+        busy_student = self.get_test_student(username="busy")
+        busy_student.update(grader=grader1)
+        for username in ("busy", "student1"):
+            submission = self.get_test_submission(student_username=username)
+            submission.update(status=SubmissionStatus.submitted)
+        self.get_test_student(username="student2")
+        plan = plan_grader_assignments(self.default_course, balance_workload=True)
+        # grader1 already has a not graded submission, so student1 (who has one too) goes to grader2
+        self.assertEqual(plan[grader2.id][0], self.get_test_student(username="student1").id)
+        self.assertEqual(plan[grader1.id], [self.get_test_student(username="student2").id])
+
+    def test_plan_grader_assignments_balance_workload_no_submissions(self):
+        """
+        Tests that plan_grader_assignments() spreads students without not graded submissions across
+        graders with the same workload
+        """
+        grader1 = self.get_test_grader(username="grader1")
+        grader2 = self.get_test_grader(username="grader2")
+        for index in range(4):
+            self.get_test_student(username="student{index}".format(index=index))
+        plan = plan_grader_assignments(self.default_course, balance_workload=True)
+        self.assertEqual(len(plan[grader1.id]), 2)
+        self.assertEqual(len(plan[grader2.id]), 2)
+
+    @patch("sga.backend.gradebook.GRADEBOOK_BATCH_SIZE", 2)
+    def test_gradebook_rows(self):
+        """
+        Tests that gradebook_rows() returns every student once when loading them in batches
+        """
+        self.get_test_assignment()
+        usernames = ["student{index}".format(index=index) for index in range(5)]
+        for username in usernames:
+            self.get_test_submission(student_username=username).update(status=SubmissionStatus.submitted)
+        rows = list(gradebook_rows(self.default_course))
+        self.assertEqual(len(rows[0]), 5)
+        self.assertEqual([row[0] for row in rows[1:]], usernames)
+        self.assertTrue(all(row[2] == "Submitted" for row in rows[1:]))
+
+    def test_summarize_grades(self):
+        """
+        Tests that summarize_grades() computes the statistics and the 10-bucket histogram of grades
+        """
+        summary = summarize_grades([100, 0, 50, 55, 90, 95])
+        self.assertEqual(summary["count"], 6)
+        self.assertAlmostEqual(summary["mean"], 65)
+        self.assertAlmostEqual(summary["stdev"], 34.8807492, places=5)
+        self.assertEqual((summary["min"], summary["max"]), (0, 100))
+        self.assertAlmostEqual(summary["p50"], 72.5)
+        self.assertAlmostEqual(summary["p25"], 51.25)
+        self.assertEqual(summary["histogram"], [1, 0, 0, 0, 0, 2, 0, 0, 0, 3])
+        empty = summarize_grades([])
+        self.assertEqual(empty["count"], 0)
+        self.assertIsNone(empty["mean"])
+        self.assertEqual(empty["histogram"], [0] * 10)
+
+    def test_get_grade_statistics(self):
+        """
+        Tests that get_grade_statistics() summarizes grades per assignment and per grader with one
+        query for all grades, and is cached until the course data changes
+        """
+        assignment = self.get_test_assignment()
+        other_assignment = self.get_test_assignment(edx_id="other_assignment")
+        grader_user = self.get_test_grader_user()
+        admin_user = self.get_test_admin_user()
+        for username, grade, graded_by in [("student_a", 60, grader_user), ("student_b", 80, admin_user)]:
+            submission = self.get_test_submission(student_username=username)
+            submission.update(status=SubmissionStatus.submitted)
+            submission.update(status=SubmissionStatus.graded, grade=grade, graded_by=graded_by)
+        self.get_test_student(username="student_c").update(deleted=True)
+        submission = self.get_test_submission(student_username="student_c")
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded, grade=0, graded_by=grader_user)
+        with self.assertNumQueries(3):
+            statistics = get_grade_statistics(self.default_course)
+        self.assertEqual(statistics["course"]["count"], 2)
+        by_id = {row["id"]: row for row in statistics["assignments"]}
+        self.assertAlmostEqual(by_id[assignment.id]["mean"], 70)
+        self.assertEqual(by_id[other_assignment.id]["count"], 0)
+        by_name = {row["name"]: row for row in statistics["graders"]}
+        self.assertAlmostEqual(by_name[grader_user.username]["deviation"], -10)
+        self.assertAlmostEqual(by_name[admin_user.username]["deviation"], 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_grade_statistics(self.default_course), statistics)
+        self.get_test_submission(student_username="student_a").update(grade=100)
+        self.assertAlmostEqual(get_grade_statistics(self.default_course)["course"]["mean"], 90)
+
     def test_submissions_zip_generator(self):
         """
         Tests submissions_zip_generator()
@@ -100,3 +322,267 @@ class TestBackend(SGATestCase):
         # Since we're getting a stream, unpack streamed response
         zipfile = bytearray("", encoding="utf8").join(submissions_zip_generator(submissions))
         self.assertTrue(is_zipfile(BytesIO(zipfile)))
+        # Every file's data and CRC should be intact, not just the central directory
+        self.assertEqual(len(ZipFile(BytesIO(zipfile)).namelist()), 10)
+        self.assertIsNone(ZipFile(BytesIO(zipfile)).testzip())
+
+    def test_hashing_upload_handler(self):
+        """
+        Tests that uploaded files are hashed as their chunks stream in
+        """
+        handler = HashingMemoryFileUploadHandler()
+        handler.handle_raw_input(None, {}, 13, "boundary")
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file("student_document", "file.pdf", "application/pdf", 13)
+        handler.receive_data_chunk(b"file ", 0)
+        handler.receive_data_chunk(b"contents", 5)
+        uploaded_file = handler.file_complete(13)
+        self.assertEqual(uploaded_file.sha256, hashlib.sha256(b"file contents").hexdigest())
+
+    def test_content_addressed_documents(self):
+        """
+        Tests that submission documents are stored once under their content hash, which is saved with them
+        """
+        first = self.get_test_submission()
+        second = self.get_test_submission(student_username="other_student")
+        first.update(student_document=self.get_test_file())
+        second.update(grader_document=self.get_test_file(filename="annotated.PDF"))
+        content_hash = hashlib.sha256(b"file contents").hexdigest()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.student_document_sha256, content_hash)
+        self.assertEqual(first.student_document.name, content_addressed_file_path(content_hash, "file.pdf"))
+        self.assertEqual(second.grader_document_sha256, content_hash)
+        self.assertEqual(second.grader_document.name, first.student_document.name)
+        self.assertEqual(os.listdir(os.path.dirname(first.student_document.path)), [content_hash + ".pdf"])
+        # Clearing a document clears its hash
+        first.update(student_document=None)
+        first.refresh_from_db()
+        self.assertIsNone(first.student_document_sha256)
+
+    def test_course_cache_versioning(self):
+        """
+        Tests that course cache keys are namespaced per course and change when the course version is bumped
+        """
+        course = self.get_test_course()
+        other_course_id = course.id + 1
+        key = course_cache_key(course.id, "name", "part")
+        self.assertNotEqual(key, course_cache_key(other_course_id, "name", "part"))
+        self.assertEqual(key, course_cache_key(course.id, "name", "part"))
+        version = get_course_version(course.id)
+        bump_course_version(course.id)
+        self.assertEqual(get_course_version(course.id), version + 1)
+        self.assertNotEqual(key, course_cache_key(course.id, "name", "part"))
+
+    def test_course_cache_invalidated_on_write(self):
+        """
+        Tests that writing course data through the models bumps the course version
+        """
+        course = self.get_test_course()
+        submission = self.get_test_submission()
+        for write in [course.update, submission.update, self.get_test_student().update, self.get_test_grader().save]:
+            version = get_course_version(course.id)
+            write()
+            self.assertGreater(get_course_version(course.id), version)
+        version = get_course_version(course.id)
+        submission.delete()
+        self.assertGreater(get_course_version(course.id), version)
+
+    def test_get_or_set_course_value(self):
+        """
+        Tests that get_or_set_course_value() caches values and records hits and misses
+        """
+        course = self.get_test_course()
+        compute = MagicMock(return_value=[1, 2, 3])
+        reset_cache_stats()
+        self.assertEqual(get_or_set_course_value(course.id, "test", compute), [1, 2, 3])
+        self.assertEqual(get_or_set_course_value(course.id, "test", compute), [1, 2, 3])
+        self.assertEqual(compute.call_count, 1)
+        bump_course_version(course.id)
+        get_or_set_course_value(course.id, "test", compute)
+        self.assertEqual(compute.call_count, 2)
+        stats = get_cache_stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["by_name"]["test"], {"hits": 1, "misses": 2})
+
+    def test_render_metrics(self):
+        """
+        Tests that counters and histograms are rendered in the Prometheus text format
+        """
+        metrics.reset_metrics()
+        metrics.inc("sga_lti_launches_total", outcome="student")
+        metrics.inc("sga_lti_launches_total", outcome="student")
+        metrics.observe("sga_view_seconds", 0.007, view="index")
+        metrics.observe("sga_view_seconds", 0.2, view="index")
+        metrics.observe("sga_view_seconds", 100, view="index")
+        lines = metrics.render_metrics().splitlines()
+        self.assertIn("# TYPE sga_lti_launches_total counter", lines)
+        self.assertIn('sga_lti_launches_total{outcome="student"} 2', lines)
+        self.assertIn("# TYPE sga_view_seconds histogram", lines)
+        self.assertIn('sga_view_seconds_bucket{view="index",le="0.005"} 0', lines)
+        self.assertIn('sga_view_seconds_bucket{view="index",le="0.01"} 1', lines)
+        self.assertIn('sga_view_seconds_bucket{view="index",le="0.25"} 2', lines)
+        self.assertIn('sga_view_seconds_bucket{view="index",le="+Inf"} 3', lines)
+        self.assertIn('sga_view_seconds_count{view="index"} 3', lines)
+        self.assertTrue(any(line.startswith('sga_view_seconds_sum{view="index"} 100.2') for line in lines))
+        metrics.reset_metrics()
+
+    def test_metrics_across_processes(self):
+        """
+        Tests that metrics written by other processes are added up
+        """
+        metrics.reset_metrics()
+        with TemporaryDirectory() as metrics_dir, override_settings(SGA_METRICS_DIR=metrics_dir):
+            # A process that has since exited
+            key = metrics.get_sample_key("sga_grade_passback_failures_total", {"reason": "rejected"})
+            with open(os.path.join(metrics_dir, "metrics-1.json"), "w") as metrics_file:
+                json.dump({key: 3}, metrics_file)
+            metrics.inc("sga_grade_passback_failures_total", reason="rejected")
+            self.assertIn(
+                'sga_grade_passback_failures_total{reason="rejected"} 4',
+                metrics.render_metrics().splitlines()
+            )
+            self.assertTrue(os.path.exists(os.path.join(metrics_dir, "metrics-{pid}.json".format(pid=os.getpid()))))
+        metrics.reset_metrics()
+
+    def test_metrics_of_exited_processes(self):
+        """
+        Tests that the metrics files of exited processes are merged into one file when metrics are collected
+        """
+        metrics.reset_metrics()
+        exited_process = subprocess.Popen(["true"])
+        exited_process.wait()
+        with TemporaryDirectory() as metrics_dir, override_settings(SGA_METRICS_DIR=metrics_dir):
+            key = metrics.get_sample_key("sga_grade_passback_failures_total", {"reason": "rejected"})
+            for pid in (exited_process.pid, "exited"):
+                with open(os.path.join(metrics_dir, "metrics-{pid}.json".format(pid=pid)), "w") as metrics_file:
+                    json.dump({key: 2}, metrics_file)
+            for _ in range(2):
+                self.assertEqual(metrics.collect()[key], 4)
+            self.assertEqual(
+                sorted(filename for filename in os.listdir(metrics_dir) if filename.startswith("metrics-")),
+                sorted(["metrics-exited.json", "metrics-{pid}.json".format(pid=os.getpid())])
+            )
+        metrics.reset_metrics()
+
+    def test_queued_json_logging(self):
+        """
+        Tests that QueuedHandler passes records with their context to its handler as JSON
+        """
+        records = []
+        target = logging.Handler()
+        target.setFormatter(JsonFormatter())
+        target.emit = lambda record: records.append(json.loads(target.format(record)))
+        handler = QueuedHandler(target)
+        logger = logging.getLogger("sga.tests.queued")
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        set_log_context(request_id="request-id", course_id="1", role=Roles.admin)
+        self.addCleanup(clear_log_context)
+        logger.warning("Graded %s submissions", 3, extra={"assignment_id": 7})
+        try:
+            raise ValueError("bad grade")
+        except ValueError:
+            logger.exception("Grading failed")
+        handler.flush()
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["message"], "Graded 3 submissions")
+        self.assertEqual(records[0]["level"], "WARNING")
+        self.assertEqual(records[0]["assignment_id"], 7)
+        self.assertEqual(
+            (records[0]["request_id"], records[0]["course_id"], records[0]["role"]),
+            ("request-id", "1", Roles.admin)
+        )
+        self.assertIn("ValueError: bad grade", records[1]["exc_info"])
+
+    def test_queued_handler_drops_when_full(self):
+        """
+        Tests that QueuedHandler drops records instead of blocking when its queue is full
+        """
+        handler = QueuedHandler(logging.NullHandler(), maxsize=1)
+        with patch("sga.backend.logs.QueueListener"):
+            for _ in range(3):
+                handler.handle(logging.LogRecord("sga", logging.INFO, __file__, 1, "message", (), None))
+        self.assertEqual(handler.dropped_count, 2)
+
+    def test_sampling_filter(self):
+        """
+        Tests that SamplingFilter samples records up to max_level and keeps the rest
+        """
+        sampling_filter = SamplingFilter(rate=0.25, max_level="DEBUG")
+        debug_record = logging.LogRecord("sga", logging.DEBUG, __file__, 1, "message", (), None)
+        info_record = logging.LogRecord("sga", logging.INFO, __file__, 1, "message", (), None)
+        with patch("sga.backend.logs.random.random", return_value=0.5):
+            self.assertFalse(sampling_filter.filter(debug_record))
+            self.assertTrue(sampling_filter.filter(info_record))
+        with patch("sga.backend.logs.random.random", return_value=0.1):
+            self.assertTrue(sampling_filter.filter(debug_record))
+
+    def test_check_connections(self):
+        """
+        Tests that check_connections closes idle reused connections that no longer work, and leaves
+        recently used ones unchecked
+        """
+        broken, working, recent, closed = (MagicMock(in_atomic_block=False) for _ in range(4))
+        broken.is_usable.return_value = False
+        working.is_usable.return_value = True
+        closed.connection = None
+        with patch("sga.backend.db.connections") as connections:
+            connections.all.return_value = [broken, working, recent, closed]
+            mark_connections_used()
+            for connection in (broken, working):
+                connection.sga_last_used -= settings.SGA_DB_HEALTH_CHECK_INTERVAL
+            check_connections()
+        self.assertEqual(broken.close.call_count, 1)
+        working.close.assert_not_called()
+        recent.is_usable.assert_not_called()
+        closed.is_usable.assert_not_called()
+
+    def test_compressed_manifest_storage(self):
+        """
+        Tests that collectstatic writes hashed names, a manifest and gzipped copies of text files, and that
+        uncollected files keep their names
+        """
+        with TemporaryDirectory() as directory, override_settings(STATIC_ROOT=directory):
+            self.assertEqual(staticfiles_storage.url("css/bootstrap.min.css"), "/static/css/bootstrap.min.css")
+            call_command("collectstatic", interactive=False, verbosity=0)
+            url = staticfiles_storage.url("css/bootstrap.min.css")
+            self.assertRegex(url, r"^/static/css/bootstrap\.min\.[0-9a-f]{12}\.css$")
+            path = os.path.join(directory, url[len("/static/"):])
+            with open(path, "rb") as css_file, gzip.open(path + ".gz") as gzip_file:
+                self.assertEqual(gzip_file.read(), css_file.read())
+            woff2_path = os.path.join(
+                directory,
+                staticfiles_storage.stored_name("fonts/glyphicons-halflings-regular.woff2")
+            )
+            self.assertTrue(os.path.exists(woff2_path))
+            self.assertFalse(os.path.exists(woff2_path + ".gz"))
+
+    def test_static_files_cling(self):
+        """
+        Tests that StaticFilesCling serves gzipped copies and immutable cache headers for hashed names
+        """
+        with TemporaryDirectory() as directory, override_settings(STATIC_ROOT=directory):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            application = StaticFilesCling(MagicMock())
+            for name, accept_encoding, hashed, compressed in [
+                    ("css/bootstrap.min.css", "gzip, deflate", True, True),
+                    ("css/bootstrap.min.css", "", True, False),
+                    ("css/bootstrap.min.css", "gzip", False, False),
+            ]:
+                path = staticfiles_storage.stored_name(name) if hashed else name
+                start_response = MagicMock()
+                body = b"".join(application({
+                    "REQUEST_METHOD": "GET",
+                    "PATH_INFO": "/static/" + path,
+                    "HTTP_ACCEPT_ENCODING": accept_encoding,
+                }, start_response))
+                status, headers = start_response.call_args[0][:2]
+                headers = dict(headers)
+                self.assertEqual(status, "200 OK")
+                self.assertEqual(headers["Content-Type"], "text/css")
+                self.assertEqual(headers.get("Cache-Control"), IMMUTABLE_CACHE_CONTROL if hashed else None)
+                self.assertEqual(headers.get("Content-Encoding"), "gzip" if compressed else None)
+                with open(os.path.join(directory, path), "rb") as css_file:
+                    self.assertEqual(gzip.decompress(body) if compressed else body, css_file.read())
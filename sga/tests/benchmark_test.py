@@ -0,0 +1,248 @@
+"""
+Query count and latency benchmarks for every view
+
+Each view is requested against small, medium and large course fixtures. A view fails its budget if it
+makes more than max_queries queries on the large fixture, or if its query count grows by more than
+max_growth between the small and large fixtures (which is what an N+1 query looks like). Wall time and
+response size are recorded and shown in the failure messages, but not checked, since they depend on the
+machine.
+"""
+from collections import namedtuple
+from time import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from sga.backend.constants import Roles, SubmissionStatus
+from sga.backend.roster import import_roster
+from sga.models import Assignment, Grader, Student, Submission
+from sga.tests.common import (
+    DEFAULT_ADMIN_USERNAME,
+    DEFAULT_GRADER_USERNAME,
+    DEFAULT_STUDENT_USERNAME,
+    DEFAULT_TEST_COURSE_ID,
+    SGATestCase
+)
+
+BENCHMARK_STATUS_TOKEN = "benchmark-status-token"
+
+FixtureSize = namedtuple("FixtureSize", ["name", "students", "graders", "assignments"])
+Benchmark = namedtuple(
+    "Benchmark",
+    ["url_name", "role", "get_kwargs", "method", "max_queries", "max_growth", "params"]
+)
+Benchmark.__new__.__defaults__ = ((),)
+Measurement = namedtuple("Measurement", ["queries", "duration", "size"])
+
+FIXTURE_SIZES = [
+    FixtureSize("small", students=4, graders=2, assignments=2),
+    FixtureSize("medium", students=16, graders=4, assignments=4),
+    FixtureSize("large", students=48, graders=6, assignments=8),
+]
+
+
+class BenchmarkFixture(object):
+    """
+    A course with graders, students (spread across the graders), assignments and submissions. The
+    default test student, grader and admin are part of the course.
+    """
+    def __init__(self, test_case, size):
+        records = [{"role": "admin", "course": DEFAULT_TEST_COURSE_ID, "username": DEFAULT_ADMIN_USERNAME}]
+        graders = [DEFAULT_GRADER_USERNAME] + [
+            "benchmark_grader{index}".format(index=index) for index in range(1, size.graders)
+        ]
+        students = [DEFAULT_STUDENT_USERNAME] + [
+            "benchmark_student{index}".format(index=index) for index in range(1, size.students)
+        ]
+        records.extend(
+            {"role": "grader", "course": DEFAULT_TEST_COURSE_ID, "username": grader, "max_students": size.students}
+            for grader in graders
+        )
+        records.extend(
+            {
+                "role": "student",
+                "course": DEFAULT_TEST_COURSE_ID,
+                "username": student,
+                "grader": graders[index % len(graders)]
+            }
+            for index, student in enumerate(students)
+        )
+        records.extend(
+            {
+                "role": "assignment",
+                "course": DEFAULT_TEST_COURSE_ID,
+                "edx_id": "benchmark_assignment{index}".format(index=index),
+                "name": "Benchmark Assignment {index}".format(index=index)
+            }
+            for index in range(size.assignments)
+        )
+        import_roster(records)
+        self.course = test_case.default_course
+        self.assignment = Assignment.objects.get(edx_id="benchmark_assignment0")
+        self.grader = Grader.objects.get(course=self.course, user__username=DEFAULT_GRADER_USERNAME)
+        self.student = Student.objects.get(course=self.course, user__username=DEFAULT_STUDENT_USERNAME)
+        # Every other student submits each assignment, and every other submission is graded
+        document = default_storage.save("benchmark/submission.pdf", ContentFile(b"benchmark submission"))
+        submissions = []
+        for assignment in self.course.assignments.all():
+            for index, student in enumerate(Student.objects.filter(course=self.course).select_related("grader")):
+                if index % 2 == 0:
+                    graded = index % 4 == 0
+                    submissions.append(Submission(
+                        assignment=assignment,
+                        student_id=student.user_id,
+                        student_document=document,
+                        status=SubmissionStatus.graded if graded else SubmissionStatus.submitted,
+                        grade=80 if graded else None,
+                        graded_by_id=student.grader.user_id if graded else None,
+                        graded_at=assignment.created_on if graded else None
+                    ))
+        Submission.objects.bulk_create(submissions)
+
+
+def course_kwargs(fixture):
+    """ URL kwargs for course views """
+    return {"course_id": fixture.course.id}
+
+
+def assignment_kwargs(fixture):
+    """ URL kwargs for assignment views """
+    return dict(course_kwargs(fixture), assignment_id=fixture.assignment.id)
+
+
+def student_kwargs(fixture):
+    """ URL kwargs for student views """
+    return dict(course_kwargs(fixture), student_user_id=fixture.student.user_id)
+
+
+def grader_kwargs(fixture):
+    """ URL kwargs for grader views """
+    return dict(course_kwargs(fixture), grader_user_id=fixture.grader.user_id)
+
+
+def submission_kwargs(fixture):
+    """ URL kwargs for submission views """
+    return dict(assignment_kwargs(fixture), student_user_id=fixture.student.user_id)
+
+
+def no_kwargs(fixture):  # pylint: disable=unused-argument
+    """ URL kwargs for views without parameters """
+    return {}
+
+
+BENCHMARKS = [
+    Benchmark("sga_index", Roles.none, no_kwargs, "get", 3, 0),
+    Benchmark("not_graded_block_error_page", Roles.none, no_kwargs, "get", 3, 0),
+    Benchmark("studio_message_page", Roles.none, no_kwargs, "get", 3, 0),
+    Benchmark("staff_index", Roles.admin, course_kwargs, "get", 4, 0),
+    Benchmark("view_student_list", Roles.admin, course_kwargs, "get", 6, 0),
+    Benchmark("view_student_list", Roles.grader, course_kwargs, "get", 6, 0),
+    Benchmark("view_grader_list", Roles.admin, course_kwargs, "get", 9, 0),
+    Benchmark("view_assignment_list", Roles.admin, course_kwargs, "get", 7, 0),
+    Benchmark("view_assignment_list", Roles.grader, course_kwargs, "get", 8, 0),
+    Benchmark("view_submission_as_student", Roles.student, assignment_kwargs, "get", 6, 0),
+    Benchmark("view_submission_as_staff", Roles.admin, submission_kwargs, "get", 12, 0),
+    Benchmark("view_submission_as_staff", Roles.grader, submission_kwargs, "get", 15, 0),
+    Benchmark("view_assignment", Roles.admin, assignment_kwargs, "get", 11, 0),
+    Benchmark("view_assignment", Roles.grader, assignment_kwargs, "get", 12, 0),
+    Benchmark("view_student", Roles.admin, student_kwargs, "get", 13, 0),
+    Benchmark("view_grader", Roles.admin, grader_kwargs, "get", 17, 0),
+    Benchmark("view_grader", Roles.grader, grader_kwargs, "get", 15, 0),
+    Benchmark("unsubmit_submission", Roles.admin, submission_kwargs, "post", 9, 0),
+    Benchmark("change_student_to_grader", Roles.admin, student_kwargs, "post", 10, 0),
+    Benchmark("unassign_grader", Roles.admin, student_kwargs, "post", 8, 0),
+    Benchmark("unassign_student", Roles.admin, lambda fixture: dict(
+        grader_kwargs(fixture),
+        student_user_id=fixture.student.user_id
+    ), "post", 8, 0),
+    Benchmark("change_grader_to_student", Roles.admin, grader_kwargs, "post", 13, 0),
+    Benchmark("download_all_submissions", Roles.admin, assignment_kwargs, "get", 6, 0),
+    Benchmark("download_not_graded_submissions", Roles.grader, assignment_kwargs, "get", 9, 0),
+    Benchmark("download_gradebook", Roles.admin, course_kwargs, "get", 8, 0),
+    Benchmark("view_grade_statistics", Roles.admin, course_kwargs, "get", 8, 0),
+    Benchmark("bulk_grade_assignment", Roles.admin, assignment_kwargs, "get", 7, 0),
+    Benchmark("assign_graders", Roles.admin, course_kwargs, "post", 10, 0),
+    Benchmark("student_list_data", Roles.admin, course_kwargs, "get", 5, 0),
+    Benchmark("grader_list_data", Roles.admin, course_kwargs, "get", 7, 0),
+    Benchmark("assignment_list_data", Roles.grader, course_kwargs, "get", 8, 0),
+    Benchmark("assignment_submissions_data", Roles.admin, assignment_kwargs, "get", 6, 0),
+    Benchmark("grade_statistics_data", Roles.admin, course_kwargs, "get", 6, 0),
+    Benchmark("metrics_data", Roles.none, no_kwargs, "get", 3, 0, (("token", BENCHMARK_STATUS_TOKEN),)),
+]
+
+
+@override_settings(STATUS_TOKEN=BENCHMARK_STATUS_TOKEN)
+class BenchmarkTest(SGATestCase):
+    """
+    Query count and latency benchmarks for every view
+    """
+    def measure(self, benchmark, fixture):
+        """
+        Requests a view (after logging in) and returns a Measurement of the request
+        """
+        self.log_in_as(benchmark.role)
+        url = reverse(benchmark.url_name, kwargs=benchmark.get_kwargs(fixture))
+        # Measure without cached data, which is the worst case
+        caches[settings.SGA_CACHE_ALIAS].clear()
+        with CaptureQueriesContext(connection) as captured:
+            start = time()
+            response = getattr(self.client, benchmark.method)(url, dict(benchmark.params))
+            content = b"".join(response.streaming_content) if response.streaming else response.content
+            duration = time() - start
+        self.assertIn(response.status_code, (200, 302), msg=url)
+        return Measurement(queries=len(captured), duration=duration, size=len(content))
+
+    def test_view_query_budgets(self):
+        """
+        Checks each view's query count against its budget on every fixture size
+        """
+        results = {benchmark: {} for benchmark in BENCHMARKS}
+        for size in FIXTURE_SIZES:
+            with transaction.atomic():
+                fixture = BenchmarkFixture(self, size)
+                for benchmark in BENCHMARKS:
+                    # Roll back any changes the view makes so that every view sees the same data
+                    with transaction.atomic():
+                        results[benchmark][size.name] = self.measure(benchmark, fixture)
+                        transaction.set_rollback(True)
+                transaction.set_rollback(True)
+        for benchmark in BENCHMARKS:
+            small = results[benchmark][FIXTURE_SIZES[0].name].queries
+            large = results[benchmark][FIXTURE_SIZES[-1].name].queries
+            name = "{} ({})".format(benchmark.url_name, benchmark.role)
+            # Failures show the view's measurements on every fixture size
+            measurements = ", ".join(
+                "{}: {} queries/{:.0f}ms/{} bytes".format(
+                    size.name,
+                    results[benchmark][size.name].queries,
+                    results[benchmark][size.name].duration * 1000,
+                    results[benchmark][size.name].size
+                )
+                for size in FIXTURE_SIZES
+            )
+            self.assertLessEqual(
+                large,
+                benchmark.max_queries,
+                msg="{} made {} queries ({})".format(name, large, measurements)
+            )
+            self.assertLessEqual(
+                large - small,
+                benchmark.max_growth,
+                msg="{} queries grew from {} to {} with the fixture size ({})".format(name, small, large, measurements)
+            )
+
+    def test_benchmarks_cover_every_view(self):
+        """
+        Checks that every url in sga/urls.py has a benchmark
+        """
+        from sga.urls import urlpatterns
+        self.assertEqual(
+            {pattern.name for pattern in urlpatterns},
+            {benchmark.url_name for benchmark in BENCHMARKS}
+        )
@@ -5,8 +5,9 @@ import os
 import shutil
 
 from django.conf import settings
+from django.core.cache import caches
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase, override_settings
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.test.client import Client
 from django.contrib.auth import get_user_model
 
@@ -33,25 +34,25 @@ DEFAULT_LTI_PARAMS = {
 TEST_FILE_LOCATION = os.path.join(settings.BASE_DIR, "temp_files")
 
 
-@override_settings(
-    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
-    MEDIA_ROOT=TEST_FILE_LOCATION
-)
-class SGATestCase(TestCase):
+class SGATestMixin(object):
     """
-    Parent test class for test cases
+    Setup and helper functions for test cases
     """
 
     def setUp(self):
         """
         Common test setup
         """
-        super(SGATestCase, self).setUp()
+        super(SGATestMixin, self).setUp()
+        caches[settings.SGA_CACHE_ALIAS].clear()
         self.client = Client()
         self.user_model = get_user_model()
         self.default_course = self.get_test_course()
 
-    def tearDown(self):
+    def tearDown(self):  # pylint: disable=no-self-use
+        """
+        Common test teardown
+        """
         shutil.rmtree(TEST_FILE_LOCATION, ignore_errors=True)
 
     ###
@@ -153,7 +154,7 @@ class SGATestCase(TestCase):
         """
         student_user, _ = self.user_model.objects.get_or_create(username=username)
         course = self.get_test_course()
-        student, _ = Student.objects.get_or_create(course=course, user=student_user)
+        student, _ = Student.all_objects.get_or_create(course=course, user=student_user)
         return student
 
     def get_test_student_user(self, username=DEFAULT_STUDENT_USERNAME):
@@ -248,3 +249,24 @@ class SGATestCase(TestCase):
             bytearray("file contents", encoding="utf8"),
             content_type=content_type
         )
+
+
+@override_settings(
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+    MEDIA_ROOT=TEST_FILE_LOCATION
+)
+class SGATestCase(SGATestMixin, TestCase):
+    """
+    Parent test class for test cases
+    """
+
+
+@override_settings(
+    DEFAULT_FILE_STORAGE="django.core.files.storage.FileSystemStorage",
+    MEDIA_ROOT=TEST_FILE_LOCATION
+)
+class SGATransactionTestCase(SGATestMixin, TransactionTestCase):
+    """
+    Parent test class for test cases that need data to be committed (e.g. to read it through another
+    database connection)
+    """
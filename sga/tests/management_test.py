@@ -1,12 +1,29 @@
 """
 Test management commands
 """
+import hashlib
+import json
+import os
 from io import StringIO
+from tempfile import TemporaryDirectory
 
-from sga.management.commands.createmockdata import CreateMockDataCommand
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from mock import MagicMock, patch
+
+from sga.backend.constants import SubmissionStatus
+from sga.backend.send_grades import SendGradeFailure
+from sga.management.commands.createmockdata import CreateMockDataCommand, get_course_edx_id
+from sga.models import Assignment, Grader, Student, Submission, User
 from sga.tests.common import SGATestCase
 
 
+MOCK_COURSE_EDX_ID = get_course_edx_id(0)
+
+
 class ManagementTest(SGATestCase):
     """
     Class for management tests
@@ -19,3 +36,221 @@ class ManagementTest(SGATestCase):
         command = CreateMockDataCommand()
         command.execute(stdout=out)
         self.assertIn("Successfully created mock data.", out.getvalue())
+
+    def test_create_mock_data_sizes(self):
+        """
+        Test create_mock_data command with size parameters creates the same data when run again
+        """
+        out = StringIO()
+        args = [
+            "--courses=2", "--students=10", "--graders=3", "--assignments=2", "--submission-ratio=0.5",
+            "--graded-ratio=0.5", "--with-files", "--seed=1", "--batch-size=3"
+        ]
+        call_command("createmockdata", *args, stdout=out)
+        self.assertEqual(Student.objects.filter(course__edx_id__startswith="course-v1:MITx+B").count(), 20)
+        self.assertEqual(Assignment.objects.filter(edx_id__contains="_assignment").count(), 4)
+        submissions = Submission.objects.filter(assignment__edx_id__contains="_assignment")
+        first_run = set(submissions.values_list("assignment_id", "student_id", "status", "grade"))
+        self.assertTrue(0 < len(first_run) < 40)
+        self.assertTrue(all(submission.student_document for submission in submissions))
+        grader = Grader.objects.filter(course__edx_id=MOCK_COURSE_EDX_ID).first()
+        self.assertEqual(grader.max_students, 4)
+        self.assertEqual(grader.active_students_count, grader.get_number_of_students())
+        # Running again with the same seed doesn't create anything new
+        call_command("createmockdata", *args, stdout=out)
+        self.assertIn("Created 0 submissions", out.getvalue())
+        self.assertEqual(set(submissions.values_list("assignment_id", "student_id", "status", "grade")), first_run)
+
+    def test_assign_graders(self):
+        """
+        Test assigngraders command
+        """
+        self.get_test_grader()
+        student = self.get_test_student()
+        out = StringIO()
+        call_command("assigngraders", self.default_course.edx_id, stdout=out)
+        self.assertIn("Assigned 1 students to 1 graders.", out.getvalue())
+        student.refresh_from_db()
+        self.assertIsNotNone(student.grader)
+        with self.assertRaises(CommandError):
+            call_command("assigngraders", "not_a_course", stdout=out)
+
+    def test_import_roster(self):
+        """
+        Test import_roster command with CSV and JSON rosters, and that importing twice changes nothing
+        """
+        course = self.default_course.edx_id
+        csv_roster = (
+            "role,course,username,email,grader,max_students,edx_id,name,due_date\n"
+            "student,{course},roster_student1,s1@example.com,roster_grader,,,,\n"
+            "grader,{course},roster_grader,g@example.com,,5,,,\n"
+            "admin,{course},roster_admin,,,,,,\n"
+            "assignment,{course},,,,,roster_assignment,Roster Assignment,2016-07-01T12:00:00Z\n"
+        ).format(course=course)
+        json_roster = [{"role": "student", "course": course, "username": "roster_student2", "grader": "roster_grader"}]
+        with TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "roster.csv")
+            json_path = os.path.join(directory, "roster.json")
+            with open(csv_path, "w") as roster_file:
+                roster_file.write(csv_roster)
+            with open(json_path, "w") as roster_file:
+                json.dump(json_roster, roster_file)
+            out = StringIO()
+            call_command("import_roster", csv_path, stdout=out)
+            self.assertIn("Imported 4 records", out.getvalue())
+            self.assertIn("3 users created", out.getvalue())
+            call_command("import_roster", json_path, stdout=out)
+            out = StringIO()
+            call_command("import_roster", csv_path, "--batch-size=1", stdout=out)
+            self.assertNotIn("created", out.getvalue())
+            self.assertNotIn("updated", out.getvalue())
+            with self.assertRaises(CommandError):
+                call_command("import_roster", os.path.join(directory, "roster.txt"), stdout=out)
+        grader = Grader.objects.get(user__username="roster_grader")
+        self.assertEqual(grader.max_students, 5)
+        self.assertEqual(grader.active_students_count, 2)
+        self.assertEqual(
+            set(Student.objects.filter(grader=grader).values_list("user__username", flat=True)),
+            {"roster_student1", "roster_student2"}
+        )
+        self.assertTrue(self.default_course.administrators.filter(username="roster_admin").exists())
+        self.assertEqual(Assignment.objects.get(edx_id="roster_assignment").course, self.default_course)
+
+    def test_import_roster_graders(self):
+        """
+        Test import_roster command deactivates the Students of graders, and skips student records for graders
+        """
+        course = self.default_course.edx_id
+        other_grader = self.get_test_grader(username="other_grader")
+        self.get_test_student(username="roster_grader1").update(grader=other_grader)
+        csv_roster = (
+            "role,course,username,email,grader,max_students,edx_id,name,due_date\n"
+            "grader,{course},roster_grader1,,,,,,\n"
+            "grader,{course},roster_grader2,,,,,,\n"
+            "student,{course},roster_grader2,,,,,,\n"
+        ).format(course=course)
+        with TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "roster.csv")
+            with open(csv_path, "w") as roster_file:
+                roster_file.write(csv_roster)
+            out = StringIO()
+            call_command("import_roster", csv_path, stdout=out)
+        self.assertIn("1 students deactivated", out.getvalue())
+        self.assertIn("1 student records skipped (graders)", out.getvalue())
+        for username in ("roster_grader1", "roster_grader2"):
+            student = Student.all_objects.get(course=self.default_course, user__username=username)
+            self.assertTrue(student.deleted)
+            self.assertIsNone(student.grader)
+        other_grader.refresh_from_db()
+        self.assertEqual(other_grader.active_students_count, 0)
+
+    def test_import_roster_invalid_values(self):
+        """
+        Test import_roster command reports the record with an invalid max_students or due_date
+        """
+        course = self.default_course.edx_id
+        rows = [
+            "grader,{course},roster_grader,,,many,,,",
+            "assignment,{course},,,,,roster_assignment,,next week",
+            "assignment,{course},,,,,roster_assignment,,2016-13-01T12:00:00Z",
+        ]
+        errors = [
+            "Record 2 has an invalid max_students 'many'",
+            "Record 2 has an invalid due_date 'next week'",
+            "Record 2 has an invalid due_date '2016-13-01T12:00:00Z'",
+        ]
+        with TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, "roster.csv")
+            for row, error in zip(rows, errors):
+                with open(csv_path, "w") as roster_file:
+                    roster_file.write((
+                        "role,course,username,email,grader,max_students,edx_id,name,due_date\n"
+                        "admin,{course},roster_admin,,,,,,\n" + row + "\n"
+                    ).format(course=course))
+                with self.assertRaisesRegex(CommandError, error):
+                    call_command("import_roster", csv_path, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username="roster_admin").exists())
+
+    def test_compact_submissions(self):
+        """
+        Test compactsubmissions command deletes old placeholder submissions only
+        """
+        placeholder = self.get_test_submission(student_username="placeholder_student")
+        placeholder.update(edx_url="http://example.com/outcome")
+        self.get_test_submission(student_username="submitted_student").update(status=SubmissionStatus.submitted)
+        self.get_test_submission(student_username="unsubmitted_student").update(description="draft")
+        out = StringIO()
+        call_command("compactsubmissions", stdout=out)
+        self.assertIn("Deleted 0 placeholder submissions.", out.getvalue())
+        call_command("compactsubmissions", "--min-age=0", "--dry-run", stdout=out)
+        self.assertIn("Would delete 1 placeholder submissions.", out.getvalue())
+        self.assertEqual(Submission.objects.count(), 3)
+        call_command("compactsubmissions", "--min-age=0", "--batch-size=1", stdout=out)
+        self.assertIn("Deleted 1 placeholder submissions.", out.getvalue())
+        self.assertFalse(Submission.objects.filter(pk=placeholder.pk).exists())
+        self.assertEqual(Submission.objects.count(), 2)
+
+    def test_resend_grades(self):
+        """
+        Test resendgrades command returns the grades it sends and lists the ones that fail
+        """
+        returned = self.get_test_submission(student_username="returned_student")
+        returned.update(status=SubmissionStatus.submitted)
+        returned.update(grade=80, status=SubmissionStatus.graded)
+        failed = self.get_test_submission(student_username="failed_student")
+        failed.update(status=SubmissionStatus.submitted)
+        failed.update(grade=60, status=SubmissionStatus.graded)
+        self.get_test_submission(student_username="submitted_student").update(status=SubmissionStatus.submitted)
+
+        def send_grades(submissions):
+            """ Fails to send the grade of failed """
+            return [(submission, SendGradeFailure("Send grades to edX returned 500")) for submission in submissions
+                    if submission.pk == failed.pk]
+        out = StringIO()
+        with patch("sga.backend.grading.send_grades", MagicMock(side_effect=send_grades)) as send_grades_mock:
+            with self.assertRaisesRegex(CommandError, r"failed_student \(.*\): Send grades to edX returned 500"):
+                call_command("resendgrades", self.default_course.edx_id, "--batch-size=1", stdout=out)
+        self.assertEqual(send_grades_mock.call_count, 2)
+        self.assertIn("Sent 1 grades to edX.", out.getvalue())
+        returned.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertEqual(returned.status, SubmissionStatus.returned)
+        self.assertEqual(failed.status, SubmissionStatus.graded)
+
+    def test_hash_documents(self):
+        """
+        Test hashdocuments command records missing hashes and checks documents against their hashes
+        """
+        self.get_test_submission().update(student_document=self.get_test_file())
+        legacy = self.get_test_submission(student_username="legacy_student")
+        legacy.update(student_document=default_storage.save("legacy/file.pdf", ContentFile(b"legacy contents")))
+        self.assertIsNone(Submission.objects.get(pk=legacy.pk).student_document_sha256)
+        out = StringIO()
+        call_command("hashdocuments", stdout=out)
+        self.assertIn("Hashed 1 documents.", out.getvalue())
+        self.assertEqual(
+            Submission.objects.get(pk=legacy.pk).student_document_sha256,
+            hashlib.sha256(b"legacy contents").hexdigest()
+        )
+        call_command("hashdocuments", "--verify", stdout=out)
+        self.assertIn("Checked 2 documents, which all match their hashes.", out.getvalue())
+        default_storage.delete("legacy/file.pdf")
+        default_storage.save("legacy/file.pdf", ContentFile(b"changed contents"))
+        with self.assertRaisesRegex(CommandError, "legacy/file.pdf doesn't match its hash"):
+            call_command("hashdocuments", "--verify", stdout=out)
+
+
+class BenchmarkDbConnectionsTest(TransactionTestCase):
+    """
+    Test benchmark_db_connections command, which closes connections and so can't run in a transaction
+    """
+    def test_benchmark_db_connections(self):
+        """
+        Test benchmark_db_connections command reports both modes and restores CONN_MAX_AGE
+        """
+        max_age = connection.settings_dict["CONN_MAX_AGE"]
+        out = StringIO()
+        call_command("benchmark_db_connections", "--requests=3", "--max-age=30", stdout=out)
+        self.assertIn("Without reuse (CONN_MAX_AGE=0): mean ", out.getvalue())
+        self.assertIn("With reuse (CONN_MAX_AGE=30): mean ", out.getvalue())
+        self.assertEqual(connection.settings_dict["CONN_MAX_AGE"], max_age)
@@ -1,13 +1,16 @@
 """
-Tests for the SGAMiddleware
+Tests for the custom middleware
 """
-from django.core.exceptions import ImproperlyConfigured, SuspiciousOperation
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, SuspiciousOperation
 from django.core.urlresolvers import reverse
+from django.test import override_settings
 from django_auth_lti.backends import LTIAuthBackend
-from mock import MagicMock
+from mock import MagicMock, patch
 
-from sga.backend.constants import STUDIO_USER_USERNAME
-from sga.middleware import SGAMiddleware
+from sga.backend.cache import get_course_version
+from sga.backend.constants import STUDIO_USER_USERNAME, Roles
+from sga.middleware import InstrumentationMiddleware, SGAMiddleware
+from sga.models import LaunchOutcome, Submission
 from sga.tests.common import SGATestCase, DEFAULT_LTI_PARAMS
 
 
@@ -55,6 +58,27 @@ class MiddlewareTest(SGATestCase):
         self.assertTrue(self.get_test_course().has_student(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_grader(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_admin(self.get_test_user()))
+        # The outcome fields wait in a LaunchOutcome until the student submits
+        self.assertFalse(Submission.objects.filter(student=self.get_test_user()).exists())
+        launch_outcome = LaunchOutcome.objects.get(student=self.get_test_user(), assignment=self.get_test_assignment())
+        self.assertEqual(launch_outcome.edx_url, DEFAULT_LTI_PARAMS["lis_outcome_service_url"])
+
+    def test_repeated_launch(self):
+        """
+        Test that a launch that changes nothing leaves the course's cached data valid, and that a
+        launch with a new assignment name updates the assignment
+        """
+        middleware = SGAMiddleware()
+        middleware.process_request(self.get_test_request())
+        course = self.get_test_course()
+        version = get_course_version(course.id)
+        middleware.process_request(self.get_test_request())
+        self.assertEqual(get_course_version(course.id), version)
+        request = self.get_test_request()
+        request.POST["custom_component_display_name"] = "Renamed Assignment"
+        middleware.process_request(request)
+        self.assertNotEqual(get_course_version(course.id), version)
+        self.assertEqual(self.get_test_assignment().name, "Renamed Assignment")
 
     def test_user_not_authenticated(self):
         """
@@ -149,3 +173,77 @@ class MiddlewareTest(SGATestCase):
         self.assertTrue(self.get_test_course().has_student(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_grader(self.get_test_user()))
         self.assertFalse(self.get_test_course().has_admin(self.get_test_user()))
+
+
+class InstrumentationMiddlewareTest(SGATestCase):
+    """
+    Tests for the InstrumentationMiddleware
+    """
+
+    def test_disabled_by_default(self):
+        """
+        Test that the middleware is not used when the sample rate is 0
+        """
+        with override_settings(SGA_INSTRUMENTATION_SAMPLE_RATE=0):
+            self.assertRaises(MiddlewareNotUsed, InstrumentationMiddleware)
+
+    @override_settings(SGA_INSTRUMENTATION_SAMPLE_RATE=1, SGA_INSTRUMENTATION_SLOW_QUERIES=2)
+    def test_profiled_request(self):
+        """
+        Test that a sampled request gets a Server-Timing header and a log record with its queries
+        """
+        self.log_in_as_admin()
+        with patch.object(InstrumentationMiddleware.log, "info") as log_info:
+            response = self.client.get(reverse("view_student_list", kwargs={"course_id": self.default_course.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        fields = log_info.call_args[1]["extra"]
+        self.assertEqual(fields["path"], reverse("view_student_list", kwargs={"course_id": self.default_course.id}))
+        self.assertGreater(fields["query_count"], 0)
+        self.assertGreater(fields["template_ms"], 0)
+        self.assertEqual(len(fields["slow_queries"]), 2)
+        self.assertTrue(all(query["sql"] for query in fields["slow_queries"]))
+        self.assertTrue(any(query["call_site"].startswith("sga/") for query in fields["slow_queries"]))
+
+    @override_settings(SGA_INSTRUMENTATION_SAMPLE_RATE=0.5)
+    def test_not_sampled_request(self):
+        """
+        Test that a request that isn't sampled is left alone
+        """
+        self.log_in_as_admin()
+        with patch("sga.middleware.random.random", return_value=0.9), \
+                patch.object(InstrumentationMiddleware.log, "info") as log_info:
+            response = self.client.get(reverse("view_student_list", kwargs={"course_id": self.default_course.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+        self.assertFalse(log_info.called)
+
+
+class LoggingContextMiddlewareTest(SGATestCase):
+    """
+    Tests for the LoggingContextMiddleware
+    """
+
+    def test_request_id(self):
+        """
+        Test that responses carry the request id, taken from the X-Request-ID header if there is one
+        """
+        response = self.client.get(reverse("sga_index"), HTTP_X_REQUEST_ID="upstream-id")
+        self.assertEqual(response["X-Request-ID"], "upstream-id")
+        first_id = self.client.get(reverse("sga_index"))["X-Request-ID"]
+        second_id = self.client.get(reverse("sga_index"))["X-Request-ID"]
+        self.assertTrue(first_id)
+        self.assertNotEqual(first_id, second_id)
+
+    def test_course_context(self):
+        """
+        Test that records logged by a course view carry the request id, course id and role
+        """
+        self.log_in_as_admin()
+        with patch("sga.middleware.clear_log_context"), patch("sga.middleware.set_log_context") as set_context:
+            self.client.get(
+                reverse("view_student_list", kwargs={"course_id": self.default_course.id}),
+                HTTP_X_REQUEST_ID="upstream-id"
+            )
+        set_context.assert_any_call(request_id="upstream-id")
+        set_context.assert_any_call(course_id=str(self.default_course.id), role=Roles.admin)
@@ -1,10 +1,13 @@
 """
 Test end to end django models.
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 from time import sleep
 
-from sga.models import Course, Submission
+import pytz
+
+from sga.backend.constants import Lateness, SubmissionStatus
+from sga.models import Assignment, Course, InvalidStatusTransition, Student, Submission
 from sga.tests.common import SGATestCase
 
 
@@ -12,6 +15,7 @@ class TestModels(SGATestCase):
     """
     Test that methods on models work as expected
     """
+    # pylint: disable=too-many-public-methods
 
     def test_timestampedmodel_update(self):
         """
@@ -31,7 +35,8 @@ class TestModels(SGATestCase):
         grader = self.get_test_grader()
         submission = self.get_test_submission()
         self.assertEqual(grader.graded_submissions_count(), 0)
-        submission.update(submitted=True, graded=True, graded_by=grader.user)
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded, graded_by=grader.user)
         self.assertEqual(grader.graded_submissions_count(), 1)
 
     def test_grader_not_graded_submissions_count(self):
@@ -44,11 +49,145 @@ class TestModels(SGATestCase):
         student.save()
         self.assertEqual(grader.not_graded_submissions_count(), 0)
         submission = self.get_test_submission()  # Uses get_test_student() to set student
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         self.assertEqual(grader.not_graded_submissions_count(), 1)
-        submission.update(graded=True, graded_by=grader.user)
+        submission.update(status=SubmissionStatus.graded, graded_by=grader.user)
         self.assertEqual(grader.not_graded_submissions_count(), 0)
 
+    def test_grader_graded_submissions_history(self):
+        """
+        Tests the .graded_submissions_history() method on Grader
+        """
+        grader = self.get_test_grader()
+        graded_at = datetime(2016, 6, 15, 12, 0, 0, tzinfo=pytz.UTC)
+        submissions = []
+        for index in range(5):
+            submission = self.get_test_submission(student_username="student_{index}".format(index=index))
+            # Two submissions share a graded_at to check that ties are paged by id
+            submission.update(status=SubmissionStatus.submitted)
+            submission.update(
+                status=SubmissionStatus.graded,
+                graded_by=grader.user,
+                graded_at=graded_at + timedelta(minutes=min(index, 3))
+            )
+            submissions.append(submission)
+        # Submissions graded in another course aren't included
+        other_assignment = Assignment.objects.create(
+            edx_id="other_assignment",
+            course=Course.objects.create(edx_id="other_course")
+        )
+        Submission.objects.create(
+            assignment=other_assignment,
+            student=submissions[0].student,
+            status=SubmissionStatus.graded,
+            graded_by=grader.user,
+            graded_at=graded_at
+        )
+        page, cursor = grader.graded_submissions_history(limit=2)
+        self.assertEqual(page, [submissions[4], submissions[3]])
+        page, cursor = grader.graded_submissions_history(cursor=cursor, limit=2)
+        self.assertEqual(page, [submissions[2], submissions[1]])
+        page, cursor = grader.graded_submissions_history(cursor=cursor, limit=2)
+        self.assertEqual(page, [submissions[0]])
+        self.assertIsNone(cursor)
+
+    def test_grader_active_students_count(self):
+        """
+        Test that Grader.active_students_count follows assignments, deletions and unassignments of students
+        """
+        grader = self.get_test_grader()
+        other_grader = self.get_test_grader(username="other_grader")
+        student = self.get_test_student()
+        another_student = self.get_test_student(username="another_student")
+        student.update(grader=grader)
+        another_student.update(grader=grader)
+        grader.refresh_from_db()
+        self.assertEqual(grader.active_students_count, 2)
+        self.assertEqual(grader.available_student_slots_count(), grader.max_students - 2)
+        # Deleted students don't count
+        another_student.update(deleted=True)
+        grader.refresh_from_db()
+        self.assertEqual(grader.active_students_count, 1)
+        self.assertEqual(grader.active_students_count, grader.get_number_of_students())
+        # Moving a student updates both graders
+        student.update(grader=other_grader)
+        grader.refresh_from_db()
+        other_grader.refresh_from_db()
+        self.assertEqual(grader.active_students_count, 0)
+        self.assertEqual(other_grader.active_students_count, 1)
+        student.delete()
+        other_grader.refresh_from_db()
+        self.assertEqual(other_grader.active_students_count, 0)
+
+    def test_grader_active_students_count_new_student(self):
+        """
+        Test that creating a Student with a grader counts it for that grader
+        """
+        grader = self.get_test_grader()
+        user = self.user_model.objects.create(username="new_student")
+        Student.objects.create(course=grader.course, user=user, grader=grader)
+        grader.refresh_from_db()
+        self.assertEqual(grader.active_students_count, 1)
+        # Creating a deleted Student doesn't count it
+        Student.all_objects.filter(user=user).delete()
+        Student.objects.create(course=grader.course, user=user, grader=grader, deleted=True)
+        grader.refresh_from_db()
+        self.assertEqual(grader.active_students_count, 0)
+
+    def test_student_managers(self):
+        """
+        Tests that Student.objects and grader.students only have active students, while
+        Student.all_objects has deleted ones too
+        """
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        deleted_student = self.get_test_student(username="deleted_student")
+        student.update(grader=grader)
+        deleted_student.update(grader=grader, deleted=True)
+        self.assertEqual(list(Student.objects.filter(course=self.default_course)), [student])
+        self.assertEqual(list(grader.students.all()), [student])
+        self.assertEqual(Student.all_objects.filter(course=self.default_course).count(), 2)
+        # Deleted students can still be saved
+        deleted_student.update(deleted=False)
+        self.assertEqual(Student.objects.filter(course=self.default_course).count(), 2)
+
+    def test_submission_of_active_students(self):
+        """
+        Tests that Submission.objects.of_active_students() only has submissions of active students of
+        the assignment's course, even for users who are students in several courses
+        """
+        grader = self.get_test_grader()
+        submission = self.get_test_submission()
+        student = self.get_test_student()
+        # The same user is a deleted student in another course, with this grader
+        Student.objects.create(
+            course=Course.objects.create(edx_id="other_course"),
+            user=student.user,
+            grader=grader,
+            deleted=True
+        )
+        self.assertEqual(list(Submission.objects.of_active_students()), [submission])
+        self.assertEqual(list(Submission.objects.of_active_students(grader=grader)), [])
+        student.update(grader=grader)
+        self.assertEqual(list(Submission.objects.of_active_students(grader=grader)), [submission])
+        student.update(deleted=True)
+        self.assertEqual(list(Submission.objects.of_active_students()), [])
+
+    def test_submission_save_queries(self):
+        """
+        Tests that saving a submission from get_or_placeholder() doesn't load its assignment to find the
+        course whose cached data it invalidates
+        """
+        submission = self.get_test_submission()
+        submission = Submission.objects.get_or_placeholder(submission.student, submission.assignment)
+        with self.assertNumQueries(1):
+            submission.save()
+        # Other instances load the assignment once
+        submission = Submission.objects.get(pk=submission.pk)
+        with self.assertNumQueries(3):
+            submission.save()
+            submission.save()
+
     def test_course_has_student(self):
         """
         Tests the .has_student() method on Course
@@ -82,12 +221,12 @@ class TestModels(SGATestCase):
         submission = self.get_test_submission(student_username=student.user.username)
         # No submission submitted yet, so count should be 0
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 0)
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         # One submission submitted, so count should be 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 1)
         student_2 = self.get_test_student(username="test_student_2")
         submission_b = self.get_test_submission(student_username=student_2.user.username)
-        submission_b.update(submitted=True)
+        submission_b.update(status=SubmissionStatus.submitted)
         # Submission was created for another student, so count should still be 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 1)
         # And count for student_2 should also be 1
@@ -99,13 +238,13 @@ class TestModels(SGATestCase):
         )
         # Another submission for student was created, but not submitted, so count should still be 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 1)
-        submission_2.update(submitted=True)
+        submission_2.update(status=SubmissionStatus.submitted)
         # This submission was submitted, so count should now be 2
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 2)
-        submission.update(graded=True)
+        submission.update(status=SubmissionStatus.graded)
         # First submission is graded, so count should be back at 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 1)
-        submission_2.update(graded=True)
+        submission_2.update(status=SubmissionStatus.graded)
         # Second submission is graded, so count should be back at 1
         self.assertEqual(course.not_graded_submissions_count_by_student(student), 0)
 
@@ -116,9 +255,9 @@ class TestModels(SGATestCase):
         assignment = self.get_test_assignment()
         submission = self.get_test_submission()  # Uses get_test_assignment() to set submission.assignment
         self.assertEqual(assignment.graded_submissions_count(), 0)
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         self.assertEqual(assignment.graded_submissions_count(), 0)
-        submission.update(graded=True)
+        submission.update(status=SubmissionStatus.graded)
         self.assertEqual(assignment.graded_submissions_count(), 1)
 
     def test_assignment_graded_submissions_count_by_grader(self):
@@ -135,7 +274,8 @@ class TestModels(SGATestCase):
         # Submission not yet graded, so count should be 0
         self.assertEqual(assignment.graded_submissions_count_by_grader(grader=grader), 0)
         self.assertEqual(assignment.graded_submissions_count_by_grader(grader_user=grader.user), 0)
-        submission.update(submitted=True, graded=True, graded_by=grader.user)
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded, graded_by=grader.user)
         # Submission graded, so count should be 1
         self.assertEqual(assignment.graded_submissions_count_by_grader(grader=grader), 1)
         self.assertEqual(assignment.graded_submissions_count_by_grader(grader_user=grader.user), 1)
@@ -149,9 +289,9 @@ class TestModels(SGATestCase):
         assignment = self.get_test_assignment()
         submission = self.get_test_submission()  # Uses get_test_assignment() to set submission.assignment
         self.assertEqual(assignment.not_graded_submissions_count(), 0)
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         self.assertEqual(assignment.not_graded_submissions_count(), 1)
-        submission.update(graded=True)
+        submission.update(status=SubmissionStatus.graded)
         self.assertEqual(assignment.not_graded_submissions_count(), 0)
 
     def test_assignment_not_graded_submissions_count_by_grader(self):
@@ -177,12 +317,12 @@ class TestModels(SGATestCase):
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader_user=grader.user), 0)
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader=grader_2), 0)
         submission = self.get_test_submission()  # Uses get_test_assignment() to set submission.assignment
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         # Submission submitted, so count should be 1 for grader, 0 for grader_2
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader=grader), 1)
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader_user=grader.user), 1)
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader=grader_2), 0)
-        submission.update(graded=True, graded_by=grader.user)
+        submission.update(status=SubmissionStatus.graded, graded_by=grader.user)
         # Submission graded by grader, so count should be back to 0
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader=grader), 0)
         self.assertEqual(assignment.not_graded_submissions_count_by_grader(grader_user=grader.user), 0)
@@ -202,7 +342,7 @@ class TestModels(SGATestCase):
         # Now there are two students, so count should be 2
         self.assertEqual(assignment.not_submitted_submissions_count(), 2)
         submission = self.get_test_submission()  # Uses get_test_assignment() and get_test_student()
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         self.assertEqual(assignment.not_submitted_submissions_count(), 1)
 
     def test_assignment_not_submitted_submissions_count_by_grader(self):
@@ -228,12 +368,43 @@ class TestModels(SGATestCase):
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader_user=grader.user), 1)
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader=grader_2), 0)
         submission = self.get_test_submission()  # Uses get_test_assignment() to set submission.assignment
-        submission.update(submitted=True)
+        submission.update(status=SubmissionStatus.submitted)
         # Submission submitted, so count should be back to 0 for both graders
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader=grader), 0)
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader_user=grader.user), 0)
         self.assertEqual(assignment.not_submitted_submissions_count_by_grader(grader=grader_2), 0)
 
+    def test_assignment_get_adjacent_not_graded_submission(self):
+        """
+        Tests the .get_adjacent_not_graded_submission() method on Assignment
+        """
+        assignment = self.get_test_assignment()
+        grader = self.get_test_grader()
+        submissions = []
+        for index in range(4):
+            submission = self.get_test_submission(student_username="student_{index}".format(index=index))
+            submission.update(status=SubmissionStatus.submitted)
+            submissions.append(submission)
+        # Graded submissions and deleted students are skipped
+        submissions[1].update(status=SubmissionStatus.graded)
+        self.get_test_student(username="student_2").update(deleted=True)
+        self.assertEqual(assignment.get_adjacent_not_graded_submission(submissions[0]), submissions[3])
+        self.assertEqual(assignment.get_adjacent_not_graded_submission(submissions[1]), submissions[3])
+        # Wraps around at either end
+        self.assertEqual(assignment.get_adjacent_not_graded_submission(submissions[3]), submissions[0])
+        self.assertEqual(
+            assignment.get_adjacent_not_graded_submission(submissions[0], previous=True),
+            submissions[3]
+        )
+        # Wrapping around takes the same single query
+        with self.assertNumQueries(1):
+            self.assertEqual(assignment.get_adjacent_not_graded_submission(submissions[3]), submissions[0])
+        # A grader only steps through their own students
+        self.assertIsNone(assignment.get_adjacent_not_graded_submission(submissions[0], grader=grader))
+        self.get_test_student(username="student_3").update(grader=grader)
+        self.assertEqual(assignment.get_adjacent_not_graded_submission(submissions[0], grader=grader), submissions[3])
+        self.assertIsNone(assignment.get_adjacent_not_graded_submission(submissions[3], grader=grader))
+
     def test_assignment_is_past_due_date(self):
         """
         Tests the .is_past_due_date() method on Assignment
@@ -246,6 +417,103 @@ class TestModels(SGATestCase):
         assignment.save()
         self.assertFalse(assignment.is_past_due_date(now=DATETIME_EARLIER))
         self.assertTrue(assignment.is_past_due_date(now=DATETIME_LATER))
+        # Without now, compares against the current time when called
+        assignment.due_date = datetime.utcnow().replace(tzinfo=pytz.UTC) + timedelta(seconds=1)
+        self.assertFalse(assignment.is_past_due_date())
+        sleep(1)
+        self.assertTrue(assignment.is_past_due_date())
+
+    def test_assignment_is_past_deadline(self):
+        """
+        Tests the .is_past_deadline() method on Assignment, which adds the grace period in hours
+        """
+        due_date = datetime(2016, 6, 15, 12, 0, 0, tzinfo=pytz.UTC)
+        assignment = self.get_test_assignment()
+        self.assertIsNone(assignment.is_past_deadline())
+        assignment.update(due_date=due_date, grace_period=2)
+        self.assertEqual(assignment.get_deadline(), due_date + timedelta(hours=2))
+        self.assertFalse(assignment.is_past_deadline(now=due_date + timedelta(hours=1)))
+        self.assertTrue(assignment.is_past_deadline(now=due_date + timedelta(hours=2)))
+
+    def test_submission_with_lateness(self):
+        """
+        Tests that .with_lateness() annotates submissions with their lateness against now
+        """
+        due_date = datetime(2016, 6, 15, 12, 0, 0, tzinfo=pytz.UTC)
+        self.get_test_assignment().update(due_date=due_date, grace_period=2)
+        submitted_at = {
+            "student_on_time": due_date,
+            "student_in_grace": due_date + timedelta(hours=2),
+            "student_late": due_date + timedelta(hours=2, seconds=1),
+        }
+        for username, time in submitted_at.items():
+            self.get_test_submission(student_username=username).update(
+                status=SubmissionStatus.submitted,
+                submitted_at=time
+            )
+        self.get_test_submission(student_username="student_missing")
+
+        def get_lateness(now):
+            """ Returns lateness by student username as of now """
+            return dict(Submission.objects.with_lateness(now=now).values_list("student__username", "lateness"))
+        self.assertEqual(get_lateness(due_date + timedelta(hours=1)), {
+            "student_on_time": Lateness.on_time,
+            "student_in_grace": Lateness.in_grace,
+            "student_late": Lateness.late,
+            "student_missing": None,
+        })
+        self.assertEqual(get_lateness(due_date + timedelta(hours=3))["student_missing"], Lateness.missing)
+        self.assertEqual(
+            Submission.objects.with_lateness(now=due_date).filter(lateness=Lateness.late).count(),
+            1
+        )
+
+    def test_get_lateness_counts(self):
+        """
+        Tests the lateness counts of Assignment, Student and Grader, which count students without a
+        submission as missing once the grace period is over
+        """
+        due_date = datetime(2016, 6, 15, 12, 0, 0, tzinfo=pytz.UTC)
+        assignment = self.get_test_assignment()
+        assignment.update(due_date=due_date, grace_period=1)
+        grader = self.get_test_grader()
+        self.get_test_submission(student_username="student_a").update(
+            status=SubmissionStatus.submitted,
+            submitted_at=due_date + timedelta(minutes=30)
+        )
+        self.get_test_submission(student_username="student_b").update(
+            status=SubmissionStatus.submitted,
+            submitted_at=due_date + timedelta(hours=2)
+        )
+        self.get_test_student(username="student_c").update(grader=grader)
+        self.get_test_student(username="student_d").update(deleted=True)
+        grader.refresh_from_db()
+        before_deadline = due_date + timedelta(minutes=59)
+        after_deadline = due_date + timedelta(hours=1)
+        self.assertEqual(assignment.get_lateness_counts(now=before_deadline), {
+            Lateness.on_time: 0,
+            Lateness.in_grace: 1,
+            Lateness.late: 1,
+            Lateness.missing: 0,
+        })
+        # Everyone who hasn't submitted is missing, with the same semantics as the not submitted count
+        self.assertEqual(
+            assignment.get_lateness_counts(now=after_deadline)[Lateness.missing],
+            assignment.not_submitted_submissions_count()
+        )
+        self.assertEqual(assignment.get_lateness_counts(grader=grader, now=after_deadline), {
+            Lateness.on_time: 0,
+            Lateness.in_grace: 0,
+            Lateness.late: 0,
+            Lateness.missing: 1,
+        })
+        self.assertEqual(grader.get_lateness_counts(now=after_deadline)[Lateness.missing], 1)
+        self.assertEqual(self.get_test_student(username="student_b").get_lateness_counts(now=after_deadline), {
+            Lateness.on_time: 0,
+            Lateness.in_grace: 0,
+            Lateness.late: 1,
+            Lateness.missing: 0,
+        })
 
     def test_submission_grade_display(self):
         """
@@ -255,3 +523,33 @@ class TestModels(SGATestCase):
         self.assertEqual(submission.grade_display(), "(Not Graded)")
         submission.update(grade=70)
         self.assertEqual(submission.grade_display(), "70/100 (70%)")
+
+    def test_submission_status_transitions(self):
+        """
+        Tests that Submission.save() allows the status changes of the submission lifecycle and
+        rejects the others
+        """
+        submission = self.get_test_submission()
+        self.assertFalse(submission.submitted)
+        with self.assertRaises(InvalidStatusTransition):
+            submission.update(status=SubmissionStatus.graded)
+        self.assertEqual(Submission.objects.get(pk=submission.pk).status, SubmissionStatus.not_started)
+        submission = self.get_test_submission()
+        for status in [
+                SubmissionStatus.submitted,
+                SubmissionStatus.graded,
+                SubmissionStatus.returned,
+                SubmissionStatus.graded,
+                SubmissionStatus.not_started,
+        ]:
+            submission.update(status=status)
+            self.assertEqual(Submission.objects.get(pk=submission.pk).status, status)
+        submission.update(status=SubmissionStatus.submitted)
+        self.assertTrue(submission.submitted)
+        self.assertFalse(submission.graded)
+        with self.assertRaises(InvalidStatusTransition):
+            submission.update(status=SubmissionStatus.returned)
+        # Loaded submissions check against the status they were loaded with
+        submission = Submission.objects.get(pk=submission.pk)
+        with self.assertRaises(InvalidStatusTransition):
+            submission.update(status=SubmissionStatus.returned)
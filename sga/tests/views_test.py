@@ -1,17 +1,32 @@
 """
 Test end to end django views.
 """
+# pylint: disable=too-many-lines
+import csv
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+import pytz
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.urlresolvers import reverse
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from mock import patch, MagicMock
 
-from sga.backend.constants import Roles
+from sga.backend.constants import Lateness, Roles, SubmissionStatus
+from sga.backend.outcomes import remember_outcome
+from sga.backend.send_grades import SendGradeFailure
 from sga.forms import (
     AssignGraderToStudentForm,
     GraderMaxStudentsForm,
     GraderAssignmentSubmissionForm,
     StudentAssignmentSubmissionForm,
     AssignStudentToGraderForm)
-from sga.tests.common import SGATestCase
+from sga.models import Submission
+from sga.tests.common import SGATestCase, SGATransactionTestCase
 
 
 class TestViews(SGATestCase):
@@ -80,7 +95,8 @@ class TestViews(SGATestCase):
         assignment = self.get_test_assignment()
         student_user = self.get_test_student_user()
         submission = self.get_test_submission()
-        submission.update(submitted=True, graded=True)
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded)
         kwargs = {
             "course_id": self.default_course.id,
             "student_user_id": student_user.id,
@@ -91,6 +107,17 @@ class TestViews(SGATestCase):
         submission = self.get_test_submission()
         self.assertFalse(submission.graded)
         self.assertFalse(submission.submitted)
+        # Students who never submitted have nothing to unsubmit
+        other_student_user = self.get_test_student_user(username="other_student")
+        kwargs["student_user_id"] = other_student_user.id
+        response = self.client.post(reverse("unsubmit_submission", kwargs=kwargs), follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Submission.objects.filter(student=other_student_user).exists())
+        # Deleted students can't be unsubmitted
+        self.get_test_student().update(deleted=True)
+        kwargs["student_user_id"] = student_user.id
+        response = self.client.post(reverse("unsubmit_submission", kwargs=kwargs))
+        self.assertEqual(response.status_code, 404)
 
     def test_unsubmit_submission_admin_only(self):
         """
@@ -99,7 +126,8 @@ class TestViews(SGATestCase):
         assignment = self.get_test_assignment()
         student_user = self.get_test_student_user()
         submission = self.get_test_submission()
-        submission.update(submitted=True, graded=True)
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded)
         kwargs = {
             "course_id": self.default_course.id,
             "student_user_id": student_user.id,
@@ -128,6 +156,53 @@ class TestViews(SGATestCase):
             template="sga/view_submission_as_student.html",
             context_keys=["submission_form", "submission", "assignment"]
         )
+        # Opening the assignment doesn't create a Submission row
+        self.assertFalse(Submission.objects.filter(assignment=assignment).exists())
+
+    def test_first_student_submission(self):
+        """
+        Verify a student's first submission creates the Submission row, with the outcome fields of
+        the student's launch of the assignment
+        """
+        assignment = self.get_test_assignment()
+        self.log_in_as_student()
+        remember_outcome(self.get_test_student_user(), assignment, {
+            "edx_url": "http://example.com/outcome",
+            "result_id": "result",
+            "consumer_key": "key"
+        })
+        kwargs = {
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        }
+        response = self.client.post(reverse("view_submission_as_student", kwargs=kwargs), data={
+            "description": "file description",
+            "student_document": self.get_test_file()
+        })
+        self.assertEqual(response.status_code, 200)
+        submission = Submission.objects.get(assignment=assignment, student=self.get_test_student_user())
+        self.assertEqual(submission.status, SubmissionStatus.submitted)
+        self.assertEqual(
+            (submission.edx_url, submission.result_id, submission.consumer_key),
+            ("http://example.com/outcome", "result", "key")
+        )
+
+    def test_student_submission_without_outcome(self):
+        """
+        Verify a student who has no launch outcome for the assignment is asked to launch it again
+        """
+        assignment = self.get_test_assignment()
+        self.log_in_as_student()
+        kwargs = {
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        }
+        response = self.client.post(reverse("view_submission_as_student", kwargs=kwargs), data={
+            "description": "file description",
+            "student_document": self.get_test_file()
+        })
+        self.assertContains(response, "Please open the assignment from edX again")
+        self.assertFalse(Submission.objects.filter(assignment=assignment).exists())
 
     def test_view_submission_as_student_student_only(self):
         """
@@ -151,6 +226,7 @@ class TestViews(SGATestCase):
         """
         self.log_in_as_student()
         submission = self.get_test_submission()
+        remember_outcome(submission.student, submission.assignment, {"edx_url": "http://example.com/outcome"})
         self.assertIsNone(submission.student_document.name)
         self.assertIsNone(submission.description)
         self.assertFalse(submission.submitted)
@@ -173,6 +249,7 @@ class TestViews(SGATestCase):
         # Submission should now be submitted
         self.assertEqual(response.status_code, 200)
         self.assertIsNotNone(submission.student_document.name)
+        self.assertEqual(submission.student_document_sha256, hashlib.sha256(b"file contents").hexdigest())
         self.assertIsNotNone(submission.description)
         self.assertTrue(submission.submitted)
 
@@ -184,9 +261,8 @@ class TestViews(SGATestCase):
         assignment = self.get_test_assignment()
         # Create another submission to for next_not_graded_submission link in view function
         another_submission = self.get_test_submission(student_username="test_student_2_id")
-        another_submission.submitted = True
-        another_submission.graded = True
-        another_submission.save()
+        another_submission.update(status=SubmissionStatus.submitted)
+        another_submission.update(status=SubmissionStatus.graded)
         kwargs = {
             "course_id": self.default_course.id,
             "assignment_id": assignment.id,
@@ -208,6 +284,29 @@ class TestViews(SGATestCase):
                 ]
             )
 
+    def test_view_submission_as_staff_next_not_graded(self):
+        """
+        Verify the next/previous not graded submission links step through the grader's own students
+        """
+        assignment = self.get_test_assignment()
+        grader = self.get_test_grader()
+        student_user = self.get_test_student_user()
+        own_submission = self.get_test_submission(student_username="own_student")
+        own_submission.update(status=SubmissionStatus.submitted)
+        self.get_test_student(username="own_student").update(grader=grader)
+        self.get_test_submission(student_username="other_student").update(status=SubmissionStatus.submitted)
+        kwargs = {
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id,
+            "student_user_id": student_user.id
+        }
+        own_url = reverse("view_submission_as_staff", kwargs=dict(kwargs, student_user_id=own_submission.student_id))
+        response = self.do_test_successful_view(reverse("view_submission_as_staff", kwargs=kwargs), Roles.grader)
+        self.assertEqual(response.context["next_not_graded_submission_url"], own_url)
+        self.assertEqual(response.context["previous_not_graded_submission_url"], own_url)
+        response = self.do_test_successful_view(reverse("view_submission_as_staff", kwargs=kwargs), Roles.admin)
+        self.assertNotEqual(response.context["previous_not_graded_submission_url"], own_url)
+
     @patch("sga.views.send_grade", MagicMock(return_value=None))
     def test_submit_grader_document(self):
         """
@@ -215,6 +314,7 @@ class TestViews(SGATestCase):
         """
         self.log_in_as_grader()
         submission = self.get_test_submission()
+        submission.update(status=SubmissionStatus.submitted)
         student_user = self.get_test_student_user()
         self.assertIsNone(submission.grader_document.name)
         self.assertIsNone(submission.feedback)
@@ -242,6 +342,25 @@ class TestViews(SGATestCase):
         self.assertIsNotNone(submission.grader_document.name)
         self.assertIsNotNone(submission.feedback)
         self.assertTrue(submission.graded)
+        # The grade was sent to edX
+        self.assertEqual(submission.status, SubmissionStatus.returned)
+
+    @patch("sga.views.send_grade")
+    def test_submit_grader_document_not_submitted(self, send_grade_mock):
+        """
+        Verify submissions that aren't submitted can't be graded
+        """
+        self.log_in_as_grader()
+        submission = self.get_test_submission()
+        kwargs = {
+            "course_id": submission.assignment.course_id,
+            "assignment_id": submission.assignment_id,
+            "student_user_id": submission.student_id
+        }
+        response = self.client.post(reverse("view_submission_as_staff", kwargs=kwargs), data={"grade": 75})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get_test_submission().status, SubmissionStatus.not_started)
+        self.assertFalse(send_grade_mock.called)
 
     def test_view_submission_as_staff_staff_only(self):
         """
@@ -276,7 +395,7 @@ class TestViews(SGATestCase):
                 url,
                 role,
                 template="sga/view_assignment.html",
-                context_keys=["student_users", "course", "assignment"]
+                context_keys=["course", "assignment", "lateness_filters"]
             )
 
     def test_view_assignment_staff_only(self):
@@ -291,6 +410,151 @@ class TestViews(SGATestCase):
         url = reverse("view_assignment", kwargs=kwargs)
         self.do_test_forbidden_view(url, Roles.student)
 
+    def get_bulk_grade_submissions(self):
+        """
+        Returns two submitted submissions (with student documents) for bulk grading tests
+        """
+        submissions = []
+        for username in ("student1", "student2"):
+            submission = self.get_test_submission(student_username=username)
+            submission.student_document = self.get_test_file()
+            submission.status = SubmissionStatus.submitted
+            submission.save()
+            submissions.append(submission)
+        return submissions
+
+    def test_bulk_grade_assignment(self):
+        """
+        Verify bulk grading saves every grade when all rows are valid, and none otherwise
+        """
+        submissions = self.get_bulk_grade_submissions()
+        url = reverse("bulk_grade_assignment", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": submissions[0].assignment_id
+        })
+        response = self.do_test_successful_view(
+            url,
+            Roles.admin,
+            template="sga/bulk_grade_assignment.html",
+            context_keys=["bulk_grade_form", "upload_form"]
+        )
+        self.assertEqual(len(response.context["bulk_grade_form"].submissions), 2)
+        # One invalid row means nothing is saved
+        response = self.client.post(url, data={
+            "grade_{pk}".format(pk=submissions[0].pk): 90,
+            "grade_{pk}".format(pk=submissions[1].pk): 150
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["bulk_grade_form"].errors)
+        submissions[0].refresh_from_db()
+        self.assertFalse(submissions[0].graded)
+        passback_failures = [(submissions[1], SendGradeFailure("Send grades to edX returned 500"))]
+        with patch("sga.backend.grading.send_grades", MagicMock(return_value=passback_failures)) as send_grades_mock:
+            response = self.client.post(url, data={
+                "grade_{pk}".format(pk=submissions[0].pk): 90,
+                "feedback_{pk}".format(pk=submissions[0].pk): "good",
+                "grade_{pk}".format(pk=submissions[1].pk): 40
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["graded_submissions"]), 2)
+        self.assertEqual(send_grades_mock.call_count, 1)
+        # Only grades that reached edX are returned
+        statuses = (SubmissionStatus.returned, SubmissionStatus.graded)
+        for submission, grade, status in zip(submissions, (90, 40), statuses):
+            submission.refresh_from_db()
+            self.assertTrue(submission.graded)
+            self.assertEqual(submission.grade, grade)
+            self.assertEqual(submission.status, status)
+
+    def test_bulk_grade_assignment_resend(self):
+        """
+        Verify grades that weren't sent to edX can be sent again, and the ones that fail again are listed
+        """
+        submissions = self.get_bulk_grade_submissions()
+        for submission in submissions:
+            submission.update(grade=80, status=SubmissionStatus.graded)
+        url = reverse("bulk_grade_assignment", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": submissions[0].assignment_id
+        })
+        response = self.do_test_successful_view(url, Roles.admin)
+        self.assertEqual(response.context["not_returned_count"], 2)
+        self.assertContains(response, "Resend Grades")
+        passback_failures = [(submissions[1], SendGradeFailure("Send grades to edX returned 500"))]
+        with patch("sga.backend.grading.send_grades", MagicMock(return_value=passback_failures)) as send_grades_mock:
+            response = self.client.post(url, data={"resend_submit": ""})
+        self.assertEqual(set(send_grades_mock.call_args[0][0]), set(submissions))
+        self.assertContains(response, "Sent 1 grade to edX.")
+        self.assertContains(response, "student2: Send grades to edX returned 500")
+        self.assertEqual(response.context["not_returned_count"], 1)
+        for submission, status in zip(submissions, (SubmissionStatus.returned, SubmissionStatus.graded)):
+            submission.refresh_from_db()
+            self.assertEqual(submission.status, status)
+
+    @override_settings(SGA_BULK_GRADE_MAX_SUBMISSIONS=1)
+    @patch("sga.backend.grading.send_grades", MagicMock(return_value=[]))
+    def test_bulk_grade_assignment_max_submissions(self):
+        """
+        Verify bulk grading rejects more grades than SGA_BULK_GRADE_MAX_SUBMISSIONS at once
+        """
+        submissions = self.get_bulk_grade_submissions()
+        url = reverse("bulk_grade_assignment", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": submissions[0].assignment_id
+        })
+        self.log_in_as_admin()
+        response = self.client.post(url, data={
+            "grade_{pk}".format(pk=submission.pk): 90 for submission in submissions
+        })
+        self.assertContains(response, "At most 1 submissions can be graded at once.")
+        submissions[0].refresh_from_db()
+        self.assertFalse(submissions[0].graded)
+        response = self.client.post(url, data={"grade_{pk}".format(pk=submissions[0].pk): 90})
+        self.assertEqual(len(response.context["graded_submissions"]), 1)
+
+    @patch("sga.backend.grading.send_grades", MagicMock(return_value=[]))
+    def test_bulk_grade_assignment_upload(self):
+        """
+        Verify grades can be uploaded as a CSV file, and are rejected for unknown students
+        """
+        submissions = self.get_bulk_grade_submissions()
+        url = reverse("bulk_grade_assignment", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": submissions[0].assignment_id
+        })
+        self.log_in_as_admin()
+        response = self.client.post(url, data={
+            "upload_submit": "",
+            "grades_file": self.get_test_file("grades.csv", "text/csv")
+        })
+        self.assertTrue(response.context["upload_form"].errors)
+        grades_file = SimpleUploadedFile(
+            "grades.csv",
+            b"username,grade,feedback\nstudent1,85,nice\nunknown,50,\n",
+            content_type="text/csv"
+        )
+        response = self.client.post(url, data={"upload_submit": "", "grades_file": grades_file})
+        self.assertIn("unknown", str(response.context["upload_form"].errors))
+        grades_file = SimpleUploadedFile("grades.csv", b"username,grade,feedback\nstudent1,85,nice\n")
+        response = self.client.post(url, data={"upload_submit": "", "grades_file": grades_file})
+        self.assertEqual(len(response.context["graded_submissions"]), 1)
+        submissions[0].refresh_from_db()
+        self.assertEqual(submissions[0].grade, 85)
+        self.assertEqual(submissions[0].feedback, "nice")
+        submissions[1].refresh_from_db()
+        self.assertFalse(submissions[1].graded)
+
+    def test_bulk_grade_assignment_staff_only(self):
+        """
+        Verify the bulk grading page is only accessible for staff
+        """
+        assignment = self.get_test_assignment()
+        url = reverse("bulk_grade_assignment", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": assignment.id
+        })
+        self.do_test_forbidden_view(url, Roles.student)
+
     def test_view_student_list(self):
         """
         Verify view student list page is as expected
@@ -299,12 +563,97 @@ class TestViews(SGATestCase):
         self.get_test_student()  # Create a student for testing view
         url = reverse("view_student_list", kwargs={"course_id": course.id})
         for role in [Roles.grader, Roles.admin]:
-            self.do_test_successful_view(
+            response = self.do_test_successful_view(
                 url,
                 role,
                 template="sga/view_student_list.html",
-                context_keys=["course", "students", "grader_user"]
+                context_keys=["course", "grader_user"]
             )
+            # The rows are loaded a page at a time from the data endpoint
+            self.assertContains(response, reverse("student_list_data", kwargs={"course_id": course.id}))
+            self.assertNotContains(response, "/view-student/")
+
+    def test_view_student_list_conditional_get(self):
+        """
+        Verify staff pages answer 304 while the course data, role and user are unchanged
+        """
+        course = self.get_test_course()
+        student = self.get_test_student()
+        url = reverse("view_student_list", kwargs={"course_id": course.id})
+        self.log_in_as_admin()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotIn("sga/view_student_list.html", [template.name for template in response.templates])
+        # Writes to course data change the ETag
+        student.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        # So does the user
+        self.log_in_as_grader()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_pages_not_gzipped(self):
+        """
+        Verify pages (which include the CSRF token) aren't gzipped, to avoid BREACH
+        """
+        url = reverse("view_student_list", kwargs={"course_id": self.default_course.id})
+        self.log_in_as_admin()
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_view_grader_row_caching(self):
+        """
+        Verify cached grader page rows are re-rendered when the data they show changes
+        """
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        student.update(grader=grader)
+        student.user.email = "old@example.com"
+        student.user.save()
+        url = reverse("view_grader", kwargs={"course_id": self.default_course.id, "grader_user_id": grader.user_id})
+        response = self.do_test_successful_view(url, Roles.admin)
+        self.assertContains(response, "old@example.com")
+        # Changing the user doesn't touch the Student row, but the row shows the user's new email
+        student.user.email = "new@example.com"
+        student.user.save()
+        response = self.client.get(url)
+        self.assertContains(response, "new@example.com")
+        self.assertNotContains(response, "old@example.com")
+
+    def test_view_grader_rows_stay_cached(self):
+        """
+        Verify saving unrelated objects in the course doesn't re-render cached grader page rows
+        """
+        grader = self.get_test_grader()
+        self.get_test_student(username="student1").update(grader=grader)
+        other_student = self.get_test_student(username="student2")
+        other_student.update(grader=grader)
+        url = reverse("view_grader", kwargs={"course_id": self.default_course.id, "grader_user_id": grader.user_id})
+        self.do_test_successful_view(url, Roles.admin)
+        cache_class = type(caches["default"])
+        with patch.object(cache_class, "set", autospec=True, side_effect=cache_class.set) as cache_set:
+            self.get_test_assignment().save()
+            self.client.get(url)
+            self.assertEqual(self._get_row_cache_keys(cache_set, "grader_student_row"), [])
+            other_student.user.email = "other@example.com"
+            other_student.user.save()
+            self.client.get(url)
+            self.assertEqual(len(self._get_row_cache_keys(cache_set, "grader_student_row")), 1)
+
+    @staticmethod
+    def _get_row_cache_keys(cache_set, fragment_name):
+        """
+        Returns the keys of the template fragments with the given name that were (re-)rendered
+        """
+        prefix = "template.cache.{name}.".format(name=fragment_name)
+        return [args[1] for args, _ in cache_set.call_args_list if args[1].startswith(prefix)]
 
     def test_view_student_list_staff_only(self):
         """
@@ -326,7 +675,7 @@ class TestViews(SGATestCase):
                 url,
                 role,
                 template="sga/view_assignment_list.html",
-                context_keys=["course", "assignments", "grader_user"]
+                context_keys=["course", "grader_user"]
             )
 
     def test_view_assignment_list_staff_only(self):
@@ -347,7 +696,7 @@ class TestViews(SGATestCase):
             url,
             Roles.admin,
             template="sga/view_grader_list.html",
-            context_keys=["course", "graders"]
+            context_keys=["course"]
         )
 
     def test_view_grader_list_admin_only(self):
@@ -385,6 +734,23 @@ class TestViews(SGATestCase):
             ]
         )
 
+    def test_view_deleted_student(self):
+        """
+        Verify staff can read a deleted student's page, which can't be changed
+        """
+        student = self.get_test_student()
+        submission = self.get_test_submission()
+        submission.update(status=SubmissionStatus.submitted)
+        student.update(deleted=True)
+        url = reverse("view_student", kwargs={"course_id": self.default_course.id, "student_user_id": student.user_id})
+        for role in [Roles.grader, Roles.admin]:
+            response = self.do_test_successful_view(url, role, template="sga/view_student.html")
+            self.assertContains(response, "(Deleted)")
+            self.assertNotContains(response, "Change Student to Grader")
+        response = self.client.post(url, data={"grader": self.get_test_grader().id})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.get_test_student().grader)
+
     def test_assign_grader(self):
         """
         Verify that AssignGraderToStudentForm correctly assigns a grader to a student
@@ -411,6 +777,25 @@ class TestViews(SGATestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(student.grader, grader)
 
+    def test_assign_grader_form_capacity(self):
+        """
+        Verify that AssignGraderToStudentForm only offers graders with room, ignoring deleted students
+        """
+        grader = self.get_test_grader()
+        grader.update(max_students=1)
+        student = self.get_test_student()
+        deleted_student = self.get_test_student(username="deleted_student")
+        deleted_student.update(grader=grader, deleted=True)
+        form = AssignGraderToStudentForm(instance=student)
+        self.assertIn(grader, form.fields["grader"].queryset)
+        self.get_test_student(username="another_student").update(grader=grader)
+        form = AssignGraderToStudentForm(instance=student)
+        self.assertNotIn(grader, form.fields["grader"].queryset)
+        # The grader is full, so it can't be given another student either
+        grader.refresh_from_db()
+        form = AssignStudentToGraderForm(data={"students": student.id}, instance=grader)
+        self.assertFalse(form.is_valid())
+
     def test_assign_grader_admin_only(self):
         """
         Verify assigning grader via view_student is only allowed for admins
@@ -614,6 +999,34 @@ class TestViews(SGATestCase):
         student = self.get_test_student()
         self.assertNotEqual(student.grader, grader)
 
+    def test_assign_graders(self):
+        """
+        Verify unassigned students are assigned to graders with room for them
+        """
+        self.log_in_as_admin()
+        grader = self.get_test_grader()
+        grader.update(max_students=1)
+        students = [self.get_test_student(username=username) for username in ("student1", "student2")]
+        response = self.client.post(
+            reverse("assign_graders", kwargs={"course_id": self.default_course.id}),
+            follow=True
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, "sga/view_grader_list.html")
+        self.assertContains(response, "Assigned 1 students to 1 graders.")
+        # The grader is full, so only the first student (by username) is assigned
+        students = [self.get_test_student(username=student.user.username) for student in students]
+        self.assertEqual(students[0].grader, grader)
+        self.assertIsNone(students[1].grader)
+
+    def test_assign_graders_admin_only(self):
+        """
+        Verify assign_graders view is only accessible for admins
+        """
+        url = reverse("assign_graders", kwargs={"course_id": self.default_course.id})
+        for role in [Roles.grader, Roles.student]:
+            self.do_test_forbidden_view(url, role, method="post")
+
     def test_unassign_grader(self):
         """
         Verify unassignment of grader from student
@@ -764,6 +1177,77 @@ class TestViews(SGATestCase):
             self.assertEqual(response.status_code, 200)
             self.assertTrue(response.get("Content-Disposition").startswith("attachment; filename="))
 
+    def test_download_all_submissions_etag(self):
+        """
+        Verify download_all_submissions answers conditional GETs with 304 until a document changes
+        """
+        submission = self.get_test_submission()
+        submission.update(status=SubmissionStatus.submitted, student_document=self.get_test_file())
+        url = reverse("download_all_submissions", kwargs={
+            "course_id": self.default_course.id,
+            "assignment_id": submission.assignment_id
+        })
+        self.log_in_as_admin()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        submission.update(student_document=self.get_test_file(filename="other.pdf"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        submission.update(student_document=SimpleUploadedFile("file.pdf", b"new contents"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Documents uploaded before hashes were recorded get no ETag
+        submission.update(student_document_sha256=None)
+        self.assertFalse(self.client.get(url).has_header("ETag"))
+
+    def test_download_gradebook(self):
+        """
+        Verify download_gradebook returns a CSV file of grades, scoped to the grader's students for graders
+        """
+        assignment = self.get_test_assignment()
+        submission = self.get_test_submission()
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded, grade=80)
+        self.get_test_student(username="other_student").update(grader=self.get_test_grader())
+        url = reverse("download_gradebook", kwargs={"course_id": self.default_course.id})
+        self.log_in_as_admin()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get("Content-Disposition").startswith("attachment; filename="))
+        rows = list(csv.reader(b"".join(response.streaming_content).decode("utf8").splitlines()))
+        self.assertEqual(rows[0][:3], ["Student", "Email", "{name} Status".format(name=assignment.name)])
+        self.assertEqual(rows[1][2:4], ["Not Submitted", ""])
+        self.assertEqual(rows[2][:4], [submission.student.username, "", "Graded", "80"])
+        self.log_in_as_grader()
+        response = self.client.get(url)
+        rows = list(csv.reader(b"".join(response.streaming_content).decode("utf8").splitlines()))
+        self.assertEqual([row[0] for row in rows[1:]], ["other_student"])
+
+    def test_download_gradebook_staff_only(self):
+        """
+        Verify download_gradebook is not accessible for students
+        """
+        url = reverse("download_gradebook", kwargs={"course_id": self.default_course.id})
+        self.do_test_forbidden_view(url, Roles.student)
+
+    @override_settings(STATUS_TOKEN="status-token")
+    def test_metrics_data(self):
+        """
+        Verify metrics_data serves metrics only with the status token
+        """
+        url = reverse("metrics_data")
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {"token": "wrong"}).status_code, 404)
+        self.client.get(reverse("sga_index"))
+        response = self.client.get(url, {"token": "status-token"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn('sga_view_seconds_count{view="sga_index"}', response.content.decode("utf8"))
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer status-token")
+        self.assertEqual(response.status_code, 200)
+        with override_settings(STATUS_TOKEN=""):
+            self.assertEqual(self.client.get(url, {"token": ""}).status_code, 404)
+
     def test_download_all_submissions_staff_only(self):
         """
         Verify download_all_submissions is not accessible for students
@@ -804,3 +1288,248 @@ class TestViews(SGATestCase):
         }
         url = reverse("download_all_submissions", kwargs=kwargs)
         self.do_test_forbidden_view(url, Roles.student)
+
+    def test_student_list_data(self):
+        """
+        Verify the student list data endpoint pages, orders and searches in the DataTables format
+        """
+        course = self.get_test_course()
+        for username in ["student_c", "student_a", "student_b"]:
+            submission = self.get_test_submission(student_username=username)
+            submission.update(status=SubmissionStatus.submitted)
+        self.log_in_as_admin()
+        url = reverse("student_list_data", kwargs={"course_id": course.id})
+        response = self.client.get(url, {"draw": 3, "start": 0, "length": 2, "order[0][column]": 0})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content.decode("utf8"))
+        self.assertEqual(data["draw"], 3)
+        self.assertEqual(data["recordsTotal"], 3)
+        self.assertEqual(data["recordsFiltered"], 3)
+        self.assertEqual([row["name"] for row in data["data"]], ["student_a", "student_b"])
+        self.assertEqual(data["data"][0]["not_graded_submissions_count"], 1)
+        response = self.client.get(url, {"search[value]": "_c"})
+        data = json.loads(response.content.decode("utf8"))
+        self.assertEqual(data["recordsFiltered"], 1)
+        self.assertEqual(data["data"][0]["name"], "student_c")
+
+    def test_assignment_list_data(self):
+        """
+        Verify the assignment list data endpoint counts match the Assignment count methods
+        """
+        course = self.get_test_course()
+        assignment = self.get_test_assignment()
+        self.get_test_submission(student_username="student_a").update(status=SubmissionStatus.submitted)
+        submission = self.get_test_submission(student_username="student_b")
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded)
+        self.get_test_student(username="student_c")
+        self.log_in_as_admin()
+        response = self.client.get(reverse("assignment_list_data", kwargs={"course_id": course.id}))
+        row = json.loads(response.content.decode("utf8"))["data"][0]
+        self.assertEqual(row["graded_count"], assignment.graded_submissions_count())
+        self.assertEqual(row["not_graded_count"], assignment.not_graded_submissions_count())
+        self.assertEqual(row["not_submitted_count"], assignment.not_submitted_submissions_count())
+        # Counts for a grader are scoped to the grader's students
+        grader = self.get_test_grader()
+        self.get_test_student(username="student_a").update(grader=grader)
+        self.log_in_as_grader()
+        response = self.client.get(reverse("assignment_list_data", kwargs={"course_id": course.id}))
+        row = json.loads(response.content.decode("utf8"))["data"][0]
+        self.assertEqual(row["graded_count"], 0)
+        self.assertEqual(row["not_graded_count"], assignment.not_graded_submissions_count_by_grader(grader=grader))
+        self.assertEqual(
+            row["not_submitted_count"],
+            assignment.not_submitted_submissions_count_by_grader(grader=grader)
+        )
+
+    def test_grader_list_data(self):
+        """
+        Verify the grader list data endpoint is as expected
+        """
+        course = self.get_test_course()
+        grader = self.get_test_grader()
+        student = self.get_test_student()
+        student.update(grader=grader)
+        self.get_test_submission().update(status=SubmissionStatus.submitted)
+        self.log_in_as_admin()
+        url = reverse("grader_list_data", kwargs={"course_id": course.id})
+        data = json.loads(self.client.get(url).content.decode("utf8"))
+        self.assertEqual(data["data"][0]["students_count"], 1)
+        self.assertEqual(data["data"][0]["not_graded_count"], 1)
+        self.assertEqual(data["data"][0]["available_slots_count"], grader.max_students - 1)
+        data = json.loads(self.client.get(url, {"filter": "has_no_students"}).content.decode("utf8"))
+        self.assertEqual(data["recordsFiltered"], 0)
+
+    def test_assignment_submissions_data(self):
+        """
+        Verify the assignment submissions data endpoint includes students without a submission
+        """
+        assignment = self.get_test_assignment()
+        self.get_test_submission(student_username="student_a").update(status=SubmissionStatus.submitted)
+        self.get_test_student(username="student_b")
+        kwargs = {"course_id": self.default_course.id, "assignment_id": assignment.id}
+        self.log_in_as_admin()
+        url = reverse("assignment_submissions_data", kwargs=kwargs)
+        data = json.loads(self.client.get(url, {"order[0][column]": 0}).content.decode("utf8"))
+        self.assertEqual([(row["student"], row["submitted"]) for row in data["data"]], [
+            ("student_a", "Yes"),
+            ("student_b", "No")
+        ])
+        data = json.loads(self.client.get(url, {"filter": "not_submitted"}).content.decode("utf8"))
+        self.assertEqual(data["recordsFiltered"], 1)
+
+    def test_assignment_submissions_data_lateness(self):
+        """
+        Verify the assignment submissions data endpoint shows and filters by lateness, with students
+        who haven't submitted missing once the grace period is over
+        """
+        due_date = datetime.utcnow().replace(tzinfo=pytz.UTC) - timedelta(hours=3)
+        assignment = self.get_test_assignment()
+        assignment.update(due_date=due_date, grace_period=2)
+        self.get_test_submission(student_username="student_a").update(
+            status=SubmissionStatus.submitted,
+            submitted_at=due_date
+        )
+        self.get_test_submission(student_username="student_b").update(
+            status=SubmissionStatus.submitted,
+            submitted_at=due_date + timedelta(hours=1)
+        )
+        self.get_test_student(username="student_c")
+        kwargs = {"course_id": self.default_course.id, "assignment_id": assignment.id}
+        self.log_in_as_admin()
+        url = reverse("assignment_submissions_data", kwargs=kwargs)
+        data = json.loads(self.client.get(url, {"order[0][column]": 0}).content.decode("utf8"))
+        self.assertEqual([row["lateness"] for row in data["data"]], ["On Time", "In Grace", "Missing"])
+        for lateness in [Lateness.on_time, Lateness.in_grace, Lateness.missing]:
+            data = json.loads(self.client.get(url, {"filter": lateness}).content.decode("utf8"))
+            self.assertEqual(data["recordsFiltered"], 1)
+        data = json.loads(self.client.get(url, {"filter": Lateness.late}).content.decode("utf8"))
+        self.assertEqual(data["recordsFiltered"], 0)
+        # Nobody is missing before the grace period is over
+        assignment.update(grace_period=4)
+        data = json.loads(self.client.get(url, {"filter": Lateness.missing}).content.decode("utf8"))
+        self.assertEqual(data["recordsFiltered"], 0)
+        response = self.client.get(reverse("view_assignment", kwargs=kwargs))
+        self.assertEqual(response.context["lateness_counts"], [
+            ("On Time", 1),
+            ("In Grace", 1),
+            ("Late", 0),
+            ("Missing", 0),
+        ])
+
+    def test_view_grade_statistics(self):
+        """
+        Verify the grade statistics page and data endpoint are only for admins
+        """
+        submission = self.get_test_submission()
+        submission.update(status=SubmissionStatus.submitted)
+        submission.update(status=SubmissionStatus.graded, grade=90, graded_by=self.get_test_grader_user())
+        course_kwargs = {"course_id": self.default_course.id}
+        self.do_test_successful_view(
+            reverse("view_grade_statistics", kwargs=course_kwargs),
+            Roles.admin,
+            template="sga/view_grade_statistics.html",
+            context_keys=["statistics", "histogram_labels"]
+        )
+        response = self.client.get(reverse("grade_statistics_data", kwargs=course_kwargs))
+        data = json.loads(response.content.decode("utf8"))
+        self.assertEqual(data["assignments"][0]["histogram"], [0] * 9 + [1])
+        self.assertEqual(data["graders"][0]["name"], self.get_test_grader_user().username)
+        for url_name in ["view_grade_statistics", "grade_statistics_data"]:
+            for role in [Roles.grader, Roles.student]:
+                self.do_test_forbidden_view(reverse(url_name, kwargs=course_kwargs), role)
+
+    def test_table_data_staff_only(self):
+        """
+        Verify the table data endpoints are not accessible for students
+        """
+        assignment = self.get_test_assignment()
+        course_kwargs = {"course_id": self.default_course.id}
+        for url in [
+                reverse("student_list_data", kwargs=course_kwargs),
+                reverse("grader_list_data", kwargs=course_kwargs),
+                reverse("assignment_list_data", kwargs=course_kwargs),
+                reverse("assignment_submissions_data", kwargs=dict(course_kwargs, assignment_id=assignment.id))
+        ]:
+            self.do_test_forbidden_view(url, Roles.student)
+
+
+REPLICA_ALIAS = "replica"
+
+
+@override_settings(SGA_DB_REPLICA_ALIAS=REPLICA_ALIAS)
+class TestReplicaRouting(SGATransactionTestCase):
+    """
+    Test that read-only staff views read from the replica (here a second connection to the test
+    database), except for sessions that have just written
+    """
+    def setUp(self):
+        super(TestReplicaRouting, self).setUp()
+        connections.databases[REPLICA_ALIAS] = dict(connections.databases[DEFAULT_DB_ALIAS])
+        self.addCleanup(self.remove_replica)
+        self.get_test_submission()
+        self.log_in_as(Roles.admin)
+
+    @staticmethod
+    def remove_replica():
+        """
+        Removes the replica connection
+        """
+        connections[REPLICA_ALIAS].close()
+        del connections[REPLICA_ALIAS]
+        del connections.databases[REPLICA_ALIAS]
+
+    def count_replica_queries(self, url, method="get"):
+        """
+        Requests a url (reading the whole response) and returns the number of replica queries it made
+        """
+        with CaptureQueriesContext(connections[REPLICA_ALIAS]) as captured:
+            response = getattr(self.client, method)(url)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            response.close()
+        self.assertIn(response.status_code, (200, 302))
+        return len(captured)
+
+    def test_read_only_views_use_replica(self):
+        """
+        Verify the staff lists and exports read from the replica, and other views from the primary
+        """
+        course_id = self.default_course.id
+        assignment_id = self.get_test_assignment().id
+        for url in [
+                reverse("view_student_list", kwargs={"course_id": course_id}),
+                reverse("student_list_data", kwargs={"course_id": course_id}),
+                reverse("download_gradebook", kwargs={"course_id": course_id}),
+                reverse("download_all_submissions", kwargs={"course_id": course_id, "assignment_id": assignment_id}),
+        ]:
+            self.assertGreater(self.count_replica_queries(url), 0, msg=url)
+        self.assertEqual(
+            self.count_replica_queries(
+                reverse("view_assignment", kwargs={"course_id": course_id, "assignment_id": assignment_id})
+            ),
+            0
+        )
+
+    def test_session_pinned_to_primary_after_write(self):
+        """
+        Verify a session reads from the primary after a POST, until the pin expires
+        """
+        course_id = self.default_course.id
+        list_url = reverse("view_student_list", kwargs={"course_id": course_id})
+        write_url = reverse("assign_graders", kwargs={"course_id": course_id})
+        self.assertEqual(self.count_replica_queries(write_url, "post"), 0)
+        self.assertEqual(self.count_replica_queries(list_url), 0)
+        with override_settings(SGA_DB_REPLICA_PIN_SECONDS=-1):
+            self.count_replica_queries(write_url, "post")
+        self.assertGreater(self.count_replica_queries(list_url), 0)
+
+    def test_no_replica(self):
+        """
+        Verify everything reads from the primary when no replica is configured
+        """
+        with override_settings(SGA_DB_REPLICA_ALIAS=None):
+            self.assertEqual(
+                self.count_replica_queries(reverse("view_student_list", kwargs={"course_id": self.default_course.id})),
+                0
+            )
@@ -18,11 +18,21 @@ from sga.views import (
     change_grader_to_student,
     download_all_submissions,
     download_not_graded_submissions,
+    download_gradebook,
+    bulk_grade_assignment,
     unassign_grader,
+    assign_graders,
     unassign_student,
     staff_index,
     not_graded_block_error_page,
-    studio_message_page
+    studio_message_page,
+    student_list_data,
+    grader_list_data,
+    assignment_list_data,
+    assignment_submissions_data,
+    view_grade_statistics,
+    grade_statistics_data,
+    metrics_data
 )
 
 
@@ -45,6 +55,7 @@ urlpatterns = [
         unsubmit_submission, name="unsubmit_submission"),
     url(r"^change-student-to-grader/(?P<course_id>\d+)/(?P<student_user_id>\d+)$", change_student_to_grader,
         name="change_student_to_grader"),
+    url(r"^assign-graders/(?P<course_id>\d+)$", assign_graders, name="assign_graders"),
     url(r"^unassign-grader/(?P<course_id>\d+)/(?P<student_user_id>\d+)$", unassign_grader, name="unassign_grader"),
     url(r"^unassign-student/(?P<course_id>\d+)/(?P<grader_user_id>\d+)/(?P<student_user_id>\d+)$",
         unassign_student, name="unassign_student"),
@@ -54,4 +65,15 @@ urlpatterns = [
         name="download_all_submissions"),
     url(r"^download-not-graded-submissions/(?P<course_id>\d+)/(?P<assignment_id>\d+)$",
         download_not_graded_submissions, name="download_not_graded_submissions"),
+    url(r"^download-gradebook/(?P<course_id>\d+)$", download_gradebook, name="download_gradebook"),
+    url(r"^bulk-grade-assignment/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", bulk_grade_assignment,
+        name="bulk_grade_assignment"),
+    url(r"^view-grade-statistics/(?P<course_id>\d+)$", view_grade_statistics, name="view_grade_statistics"),
+    url(r"^api/students/(?P<course_id>\d+)$", student_list_data, name="student_list_data"),
+    url(r"^api/graders/(?P<course_id>\d+)$", grader_list_data, name="grader_list_data"),
+    url(r"^api/assignments/(?P<course_id>\d+)$", assignment_list_data, name="assignment_list_data"),
+    url(r"^api/assignment-submissions/(?P<course_id>\d+)/(?P<assignment_id>\d+)$", assignment_submissions_data,
+        name="assignment_submissions_data"),
+    url(r"^api/grade-statistics/(?P<course_id>\d+)$", grade_statistics_data, name="grade_statistics_data"),
+    url(r"^metrics$", metrics_data, name="metrics_data"),
 ]
@@ -3,25 +3,45 @@ View definitions
 """
 
 from datetime import datetime
+from django.conf import settings
+from django.contrib import messages
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseForbidden
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_http_methods
 
+from sga.backend.analytics import get_grade_statistics, get_histogram_labels
 from sga.backend.authentication import allowed_roles
+from sga.backend.auto_assign import auto_assign_graders
+from sga.backend.cache import conditional_course_page
+from sga.backend import datatables, metrics
 from sga.backend.constants import (
+    Lateness,
     Roles,
+    SubmissionStatus,
+    LATENESS_LABELS,
+    ASSIGN_GRADERS_CONFIRM,
     GRADER_TO_STUDENT_CONFIRM,
     STUDENT_TO_GRADER_CONFIRM,
     UNASSIGN_GRADER_CONFIRM,
     UNASSIGN_STUDENT_CONFIRM,
-    UNSUBMIT_CONFIRM)
-from sga.backend.files import serve_zip_file, get_submitted_submissions
+    UNSUBMIT_CONFIRM,
+    RELAUNCH_TO_SUBMIT_MESSAGE)
+from sga.backend.files import serve_zip_file, get_submissions_zip_etag, get_submitted_submissions
+from sga.backend.gradebook import serve_gradebook
+from sga.backend.grading import bulk_grade_submissions, return_grades
+from sga.backend.lateness import get_now
+from sga.backend.outcomes import apply_outcome
+from sga.backend.routers import read_from_replica
 from sga.backend.send_grades import send_grade
 from sga.forms import (
     StudentAssignmentSubmissionForm,
     GraderAssignmentSubmissionForm,
+    BulkGradeForm,
+    BulkGradeUploadForm,
     GraderMaxStudentsForm,
     AssignGraderToStudentForm,
     AssignStudentToGraderForm
@@ -51,6 +71,21 @@ def studio_message_page(request):
     return render(request, "sga/studio_message_page.html")
 
 
+@require_http_methods(["GET"])
+def metrics_data(request):
+    """
+    Application metrics in the Prometheus text format, for requests with the STATUS_TOKEN (as a token
+    parameter or a bearer token)
+    """
+    token = request.GET.get("token", "")
+    authorization = request.META.get("HTTP_AUTHORIZATION", "")
+    if authorization.startswith("Bearer "):
+        token = authorization[len("Bearer "):]
+    if not settings.STATUS_TOKEN or not constant_time_compare(token, settings.STATUS_TOKEN):
+        raise Http404()
+    return HttpResponse(metrics.render_metrics(), content_type=metrics.CONTENT_TYPE)
+
+
 @allowed_roles([Roles.admin, Roles.grader])
 def staff_index(request, course_id):  # pylint: disable=unused-argument
     """
@@ -60,21 +95,36 @@ def staff_index(request, course_id):  # pylint: disable=unused-argument
     return render(request, "sga/staff_index.html")
 
 
+def record_upload_sizes(request, kind):
+    """
+    Records the sizes of the files uploaded with a request (see sga.backend.metrics)
+    """
+    for uploaded_file in request.FILES.values():
+        metrics.observe("sga_upload_bytes", uploaded_file.size, kind=kind)
+
+
 @allowed_roles([Roles.student])
 def view_submission_as_student(request, course_id, assignment_id):
     """
     View submission (for student)
     """
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
-    submission, _ = Submission.objects.get_or_create(student=request.user, assignment=assignment)
-    if request.method == "POST":
+    submission = Submission.objects.get_or_placeholder(request.user, assignment)
+    # Graded submissions can't be changed by the student
+    if request.method == "POST" and not submission.graded:
         submission_form = StudentAssignmentSubmissionForm(request.POST, request.FILES, instance=submission)
         if submission_form.is_valid():
-            submission_form.save()
-            submission.submitted = True
-            submission.submitted_at = datetime.utcnow()
-            submission.save()
-            redirect("view_submission_as_student", course_id=course_id, assignment_id=assignment_id)
+            record_upload_sizes(request, "student")
+            # The Submission row is created here if the student hadn't submitted before
+            submission = submission_form.save(commit=False)
+            if apply_outcome(submission):
+                submission.status = SubmissionStatus.submitted
+                submission.submitted_at = datetime.utcnow()
+                submission.save()
+                redirect("view_submission_as_student", course_id=course_id, assignment_id=assignment_id)
+            else:
+                # Without the outcome fields, the grade couldn't be sent to edX
+                submission_form.add_error(None, RELAUNCH_TO_SUBMIT_MESSAGE)
     else:
         submission_form = StudentAssignmentSubmissionForm(instance=submission)
     return render(request, "sga/view_submission_as_student.html", context={
@@ -85,42 +135,68 @@ def view_submission_as_student(request, course_id, assignment_id):
     })
 
 
+def get_lateness_counts_display(lateness_counts):
+    """
+    Returns (label, count) pairs for a dict of lateness counts, in the order of LATENESS_LABELS
+    """
+    return [(label, lateness_counts[lateness]) for lateness, label in LATENESS_LABELS.items()]
+
+
+def get_submission_as_staff_url(course_id, submission):
+    """
+    Returns the url of the staff view of a submission, or None if submission is None
+    """
+    if submission is None:
+        return None
+    return reverse("view_submission_as_staff", kwargs={
+        "course_id": course_id,
+        "assignment_id": submission.assignment_id,
+        "student_user_id": submission.student_id
+    })
+
+
 @allowed_roles([Roles.grader, Roles.admin])
+@conditional_course_page
 def view_submission_as_staff(request, course_id, assignment_id, student_user_id):
     """
     View submission (for staff)
     """
-    student = get_object_or_404(Student, course_id=course_id, user_id=student_user_id, deleted=False)
+    student = get_object_or_404(Student, course_id=course_id, user_id=student_user_id)
     # Disallow if current user is not admin or this grader
     if request.role == Roles.grader and student.grader is not None and student.grader.user != request.user:
         return HttpResponseForbidden()
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
-    submission, _ = Submission.objects.get_or_create(student=student.user, assignment=assignment)
-    next_not_graded_submission = Submission.objects.filter(
-        assignment=assignment,
-        submitted=True,
-        graded_at=None
-    ).exclude(pk=submission.pk).first()
-    if next_not_graded_submission:
-        kwargs = {
-            "course_id": course_id,
-            "assignment_id": assignment_id,
-            "student_user_id": next_not_graded_submission.student.id
-        }
-        next_not_graded_submission_url = reverse("view_submission_as_staff", kwargs=kwargs)
+    submission = Submission.objects.get_or_placeholder(student.user, assignment)
+    # Graders step through their own students' submissions; admins step through everyone's
+    grader = Grader.objects.get(user=request.user, course_id=course_id) if request.role == Roles.grader else None
+    next_not_graded_submission = assignment.get_adjacent_not_graded_submission(submission, grader=grader)
+    previous_not_graded_submission = assignment.get_adjacent_not_graded_submission(
+        submission,
+        grader=grader,
+        previous=True
+    )
+    next_not_graded_submission_url = get_submission_as_staff_url(course_id, next_not_graded_submission)
+    previous_not_graded_submission_url = get_submission_as_staff_url(course_id, previous_not_graded_submission)
+    if next_not_graded_submission and next_not_graded_submission.student_document and \
+            settings.SGA_PREFETCH_NEXT_SUBMISSION:
+        next_not_graded_document_url = next_not_graded_submission.student_document.url
     else:
-        next_not_graded_submission_url = None
-    if request.method == "POST":
+        next_not_graded_document_url = None
+    # Only submitted submissions can be graded
+    if request.method == "POST" and submission.submitted:
         submission_form = GraderAssignmentSubmissionForm(request.POST, request.FILES, instance=submission)
         if submission_form.is_valid():
+            record_upload_sizes(request, "grader")
             # Update database object
             submission_form.save()
             submission.graded_at = datetime.utcnow()
             submission.graded_by = request.user
-            submission.graded = True
+            submission.status = SubmissionStatus.graded
             submission.save()
             # Send grade back to edX
             send_grade(submission.consumer_key, submission.edx_url, submission.result_id, submission.edx_grade())
+            submission.status = SubmissionStatus.returned
+            submission.save()
             redirect(
                 "view_submission_as_staff",
                 course_id=course_id,
@@ -135,6 +211,8 @@ def view_submission_as_staff(request, course_id, assignment_id, student_user_id)
     return render(request, "sga/view_submission_as_staff.html", context={
         "submission_form": submission_form,
         "next_not_graded_submission_url": next_not_graded_submission_url,
+        "previous_not_graded_submission_url": previous_not_graded_submission_url,
+        "next_not_graded_document_url": next_not_graded_document_url,
         "submission": submission,
         "assignment": assignment,
         "student_user": student.user,
@@ -143,93 +221,93 @@ def view_submission_as_staff(request, course_id, assignment_id, student_user_id)
 
 
 @allowed_roles([Roles.admin])
+@conditional_course_page
+@read_from_replica
 def view_grader_list(request, course_id):
     """
     View grader list
     """
     course = get_object_or_404(Course, id=course_id)
-    graders = course.grader_set.all()
-    # for grader_user in grader_users:
-    #     grader_user.not_graded_submissions = course.not_graded_submissions_by_user(grader_user)
+    # The table's rows come from grader_list_data
     return render(request, "sga/view_grader_list.html", context={
         "course": course,
-        "graders": graders
+        "ASSIGN_GRADERS_CONFIRM": ASSIGN_GRADERS_CONFIRM
     })
 
 
 @allowed_roles([Roles.grader, Roles.admin])
+@conditional_course_page
+@read_from_replica
 def view_student_list(request, course_id):
     """
     View student list
     """
     course = get_object_or_404(Course, id=course_id)
-    if request.role == Roles.admin:
-        students = Student.objects.filter(course=course, deleted=False)
-        grader_user = None
-    else:
-        students = Student.objects.filter(course=course, grader__user=request.user, deleted=False)
-        grader_user = request.user
-    for student in students:
-        student.not_graded_submissions_count = course.not_graded_submissions_count_by_student(student)
+    grader_user = request.user if request.role == Roles.grader else None
+    # The table's rows come from student_list_data
     return render(request, "sga/view_student_list.html", context={
         "course": course,
-        "students": students,
         "grader_user": grader_user
     })
 
 
 @allowed_roles([Roles.grader, Roles.admin])
+@conditional_course_page
+@read_from_replica
 def view_assignment_list(request, course_id):
     """
     View assignment list
     """
     course = get_object_or_404(Course, id=course_id)
-    if request.role == Roles.grader:
-        grader_user = request.user
-    else:
-        grader_user = None
-    assignments = course.assignments.all()
-    for assgnmnt in assignments:
-        if grader_user:
-            assgnmnt.not_submitted_count = assgnmnt.not_submitted_submissions_count_by_grader(grader_user=grader_user)
-            assgnmnt.not_graded_count = assgnmnt.not_graded_submissions_count_by_grader(grader_user=grader_user)
-            # For graded count, we want to include all of the ones the Grader graded, even if the Student is no longer
-            # assigned to this Grader
-            assgnmnt.graded_count = assgnmnt.graded_submissions_count_by_grader(
-                grader_user=grader_user,
-                limit_to_current_students=False
-            )
-        else:
-            assgnmnt.not_submitted_count = assgnmnt.not_submitted_submissions_count()
-            assgnmnt.not_graded_count = assgnmnt.not_graded_submissions_count()
-            assgnmnt.graded_count = assgnmnt.graded_submissions_count()
+    grader_user = request.user if request.role == Roles.grader else None
+    # The table's rows come from assignment_list_data
     return render(request, "sga/view_assignment_list.html", context={
         "course": course,
-        "assignments": assignments,
         "grader_user": grader_user
     })
 
 
 @allowed_roles([Roles.student, Roles.grader, Roles.admin])
+@conditional_course_page
 def view_student(request, course_id, student_user_id):
     """
     View student
     """
     course = get_object_or_404(Course, id=course_id)
-    student = get_object_or_404(Student, course_id=course_id, user_id=student_user_id, deleted=False)
-    if request.method == "POST" and request.role == Roles.admin:
+    # Staff can still read the submission history of deleted students (who can't be changed)
+    students = Student.objects if request.role == Roles.student else Student.all_objects
+    student = get_object_or_404(students, course_id=course_id, user_id=student_user_id)
+    if request.method == "POST" and request.role == Roles.admin and not student.deleted:
         assign_grader_form = AssignGraderToStudentForm(request.POST, instance=student)
         if assign_grader_form.is_valid():
             assign_grader_form.save()
     else:
         assign_grader_form = AssignGraderToStudentForm(instance=student)
-    assignments = course.assignments.all()
+    now = get_now()
+    submissions = {
+        submission.assignment_id: submission
+        for submission in Submission.objects.filter(
+            student=student.user,
+            assignment__course=course
+        ).with_lateness(now=now)
+    }
+    assignments = list(course.assignments.all())
     for assignment in assignments:
-        assignment.submission, _ = assignment.submissions.get_or_create(student=student.user)
+        # Assignments the student hasn't submitted may have no Submission row
+        assignment.submission = submissions.get(assignment.id) or Submission(
+            student=student.user,
+            assignment=assignment
+        )
+        if assignment.id in submissions:
+            lateness = assignment.submission.lateness
+        else:
+            lateness = Lateness.missing if assignment.is_past_deadline(now) else None
+        assignment.lateness = LATENESS_LABELS.get(lateness, "")
     return render(request, "sga/view_student.html", context={
         "course": course,
         "student": student,
         "assignments": assignments,
+        "lateness_counts": get_lateness_counts_display(student.get_lateness_counts(assignments=assignments, now=now)),
         "STUDENT_TO_GRADER_CONFIRM": STUDENT_TO_GRADER_CONFIRM,
         "UNASSIGN_GRADER_CONFIRM": UNASSIGN_GRADER_CONFIRM,
         "assign_grader_form": assign_grader_form
@@ -237,6 +315,7 @@ def view_student(request, course_id, student_user_id):
 
 
 @allowed_roles([Roles.grader, Roles.admin])
+@conditional_course_page
 def view_grader(request, course_id, grader_user_id):
     """
     View grader
@@ -259,62 +338,146 @@ def view_grader(request, course_id, grader_user_id):
             if assign_student_form.is_valid():
                 assign_student_form.save(grader)
     # Get other data for page
-    graded_submissions = grader.user.graded_submissions.all()
-    students = grader.students.filter(deleted=False)
-    for student in students:
-        student.not_graded_submissions_count = course.not_graded_submissions_count_by_student(student)
+    graded_submissions_cursor = request.GET.get("graded_before")
+    graded_submissions, graded_submissions_next_cursor = grader.graded_submissions_history(
+        cursor=graded_submissions_cursor
+    )
+    students = datatables.get_student_table_queryset(course, grader_user=grader.user)
     # Render page
     return render(request, "sga/view_grader.html", context={
         "course": course,
         "grader": grader,
         "graded_submissions": graded_submissions,
+        "graded_submissions_cursor": graded_submissions_cursor,
+        "graded_submissions_next_cursor": graded_submissions_next_cursor,
         "max_students_form": max_students_form,
         "assign_student_form": assign_student_form,
         "students": students,
+        "lateness_counts": get_lateness_counts_display(grader.get_lateness_counts()),
         "GRADER_TO_STUDENT_CONFIRM": GRADER_TO_STUDENT_CONFIRM,
         "UNASSIGN_STUDENT_CONFIRM": UNASSIGN_STUDENT_CONFIRM
     })
 
 
 @allowed_roles([Roles.grader, Roles.admin])
+@conditional_course_page
 def view_assignment(request, course_id, assignment_id):
     """
     View assignment
     """
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
     submitted_submissions = get_submitted_submissions(request, assignment)
-    not_graded_submissions = submitted_submissions.exclude(graded=True)
-    if request.role == Roles.admin:
-        student_users = assignment.course.students.filter(student__deleted=False)
-    else:
-        grader = Grader.objects.get(user=request.user, course_id=course_id)
-        student_users = [student.user for student in grader.students.filter(deleted=False)]
-    for student_user in student_users:
-        submission, _ = Submission.objects.get_or_create(student=student_user, assignment=assignment)
-        student_user.submitted = "Yes" if submission.submitted else "No"
-        student_user.graded = "Yes" if submission.graded else "No"
+    not_graded_submissions = submitted_submissions.filter(status=SubmissionStatus.submitted)
+    grader_user = request.user if request.role == Roles.grader else None
+    now = get_now()
+    grader = Grader.objects.get(user=grader_user, course_id=course_id) if grader_user is not None else None
+    # The submissions table's rows come from assignment_submissions_data
     return render(request, "sga/view_assignment.html", context={
-        "student_users": student_users,
         "course": assignment.course,
         "assignment": assignment,
+        "lateness_counts": get_lateness_counts_display(assignment.get_lateness_counts(grader=grader, now=now)),
+        "lateness_filters": LATENESS_LABELS.items(),
         "has_not_graded_submissions": bool(not_graded_submissions.count()),
         "has_submitted_submissions": bool(submitted_submissions.count())
     })
 
 
 @allowed_roles([Roles.grader, Roles.admin])
-def download_all_submissions(request, course_id, assignment_id, not_graded_only=False, zipname="All Submissions"):
+def bulk_grade_assignment(request, course_id, assignment_id):
     """
-    Generate and serve zip file with submission files
+    Grade many submissions for an assignment at once, on the page or from an uploaded CSV file. Grades
+    that were saved but couldn't be sent to edX can be sent again from here.
     """
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
+    # Like the submission page, graders can only grade not graded submissions while admins can regrade
+    submissions = get_submitted_submissions(
+        request,
+        assignment,
+        not_graded_only=request.role == Roles.grader
+    ).select_related("student", "assignment").order_by("student__username")
+    not_returned_submissions = get_submitted_submissions(request, assignment).filter(
+        status=SubmissionStatus.graded
+    ).select_related("student", "assignment").order_by("student__username")
+    bulk_grade_form = BulkGradeForm(submissions)
+    upload_form = BulkGradeUploadForm(submissions)
+    graded_submissions = []
+    resent = False
+    returned_count = 0
+    passback_failures = []
+    if request.method == "POST" and "resend_submit" in request.POST:
+        # Capped like bulk grading, since grades are sent during the request
+        resent_submissions = list(not_returned_submissions[:settings.SGA_BULK_GRADE_MAX_SUBMISSIONS])
+        passback_failures = return_grades(resent_submissions)
+        resent = True
+        returned_count = len(resent_submissions) - len(passback_failures)
+    elif request.method == "POST":
+        if "upload_submit" in request.POST:
+            upload_form = BulkGradeUploadForm(submissions, request.POST, request.FILES)
+            if upload_form.is_valid():
+                bulk_grade_form = upload_form.get_bulk_grade_form()
+        else:
+            bulk_grade_form = BulkGradeForm(submissions, request.POST)
+        # Nothing is saved unless every row is valid
+        if bulk_grade_form.is_bound and bulk_grade_form.is_valid():
+            graded_submissions = bulk_grade_submissions(bulk_grade_form.get_grades(), request.user)
+            # Send grades back to edX once they have all been saved
+            passback_failures = return_grades(graded_submissions)
+            # Reload the rows (graders' graded submissions drop off the page)
+            bulk_grade_form = BulkGradeForm(submissions.all())
+    return render(request, "sga/bulk_grade_assignment.html", context={
+        "course": assignment.course,
+        "assignment": assignment,
+        "bulk_grade_form": bulk_grade_form,
+        "upload_form": upload_form,
+        "graded_submissions": graded_submissions,
+        "resent": resent,
+        "returned_count": returned_count,
+        "passback_failures": passback_failures,
+        "not_returned_count": not_returned_submissions.count()
+    })
+
+
+@allowed_roles([Roles.admin])
+@conditional_course_page
+def view_grade_statistics(request, course_id):
+    """
+    View grade statistics per assignment and per grader
+    """
+    course = get_object_or_404(Course, id=course_id)
+    return render(request, "sga/view_grade_statistics.html", context={
+        "course": course,
+        "statistics": get_grade_statistics(course),
+        "histogram_labels": get_histogram_labels()
+    })
+
+
+@allowed_roles([Roles.admin])
+def grade_statistics_data(request, course_id):  # pylint: disable=unused-argument
+    """
+    Grade statistics per assignment and per grader as JSON
+    """
+    return JsonResponse(get_grade_statistics(request.course))
+
+
+@allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
+@condition(etag_func=get_submissions_zip_etag)
+def download_all_submissions(request, course_id, assignment_id, not_graded_only=False, zipname="All Submissions"):
+    """
+    Generate and serve zip file with submission files. Conditional GETs get 304 Not Modified while
+    the submitted documents are unchanged.
+    """
+    assignment = get_object_or_404(Assignment.objects.select_related("course"), course_id=course_id, id=assignment_id)
     submissions = get_submitted_submissions(request, assignment, not_graded_only=not_graded_only)
-    course = Course.objects.get(id=course_id)
-    full_zipname = "{course_edx_id} - {zipname}".format(course_edx_id=course.edx_id, zipname=zipname)
-    return serve_zip_file(submissions, full_zipname)
+    full_zipname = "{course_edx_id} - {zipname}".format(course_edx_id=assignment.course.edx_id, zipname=zipname)
+    response = serve_zip_file(submissions.select_related("student", "assignment__course").order_by("id"), full_zipname)
+    # Clients revalidate a cached ZIP with its ETag before using it
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
 def download_not_graded_submissions(request, course_id, assignment_id):
     """
     Generate and serve zip file with not graded submission files
@@ -328,6 +491,17 @@ def download_not_graded_submissions(request, course_id, assignment_id):
     )
 
 
+@allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
+def download_gradebook(request, course_id):
+    """
+    Serve a CSV file with the grades of every student (or every student of this grader) in the course
+    """
+    course = get_object_or_404(Course, id=course_id)
+    grader = Grader.objects.get(user=request.user, course=course) if request.role == Roles.grader else None
+    return serve_gradebook(course, grader=grader)
+
+
 @allowed_roles([Roles.admin])
 @require_http_methods(["POST"])
 def change_grader_to_student(request, course_id, grader_user_id):  # pylint: disable=unused-argument
@@ -335,7 +509,7 @@ def change_grader_to_student(request, course_id, grader_user_id):  # pylint: dis
     Change grader to student
     """
     grader = get_object_or_404(Grader, course_id=course_id, user_id=grader_user_id)
-    student, _ = Student.objects.update_or_create(
+    student, _ = Student.all_objects.update_or_create(
         course_id=course_id,
         user_id=grader_user_id,
         defaults={"deleted": False}
@@ -367,10 +541,11 @@ def unsubmit_submission(request, course_id, assignment_id, student_user_id):  #
     """
     assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
     student = get_object_or_404(Student, course_id=course_id, user_id=student_user_id)
-    submission, _ = Submission.objects.get_or_create(student=student.user, assignment=assignment)
-    submission.submitted = False
-    submission.graded = False
-    submission.save()
+    submission = Submission.objects.get_or_placeholder(student.user, assignment)
+    # Students without a Submission row have nothing to unsubmit
+    if submission.pk is not None:
+        submission.status = SubmissionStatus.not_started
+        submission.save()
     return redirect(
         "view_submission_as_staff",
         course_id=course_id,
@@ -379,6 +554,22 @@ def unsubmit_submission(request, course_id, assignment_id, student_user_id):  #
     )
 
 
+@allowed_roles([Roles.admin])
+@require_http_methods(["POST"])
+def assign_graders(request, course_id):
+    """
+    Assigns all unassigned students to graders that have room for them
+    """
+    course = get_object_or_404(Course, id=course_id)
+    plan = auto_assign_graders(course, balance_workload="balance_workload" in request.POST)
+    assigned_count = sum(len(student_ids) for student_ids in plan.values())
+    messages.success(request, "Assigned {students} students to {graders} graders.".format(
+        students=assigned_count,
+        graders=len(plan)
+    ))
+    return redirect("view_grader_list", course_id=course_id)
+
+
 @allowed_roles([Roles.admin])
 @require_http_methods(["POST"])
 def unassign_grader(request, course_id, student_user_id):  # pylint: disable=unused-argument
@@ -400,3 +591,66 @@ def unassign_student(request, course_id, grader_user_id, student_user_id):  # py
     student = get_object_or_404(Student, user_id=student_user_id, grader=grader)
     student.update(grader=None)
     return redirect("view_grader", course_id=course_id, grader_user_id=grader_user_id)
+
+
+@allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
+def student_list_data(request, course_id):  # pylint: disable=unused-argument
+    """
+    DataTables server-side data for the student list
+    """
+    grader_user = request.user if request.role == Roles.grader else None
+    return datatables.queryset_table_response(
+        request,
+        datatables.get_student_table_queryset(request.course, grader_user=grader_user),
+        datatables.STUDENT_COLUMNS,
+        datatables.get_student_row,
+        filters=datatables.STUDENT_FILTERS
+    )
+
+
+@allowed_roles([Roles.admin])
+@read_from_replica
+def grader_list_data(request, course_id):  # pylint: disable=unused-argument
+    """
+    DataTables server-side data for the grader list
+    """
+    return datatables.list_table_response(
+        request,
+        datatables.get_grader_rows(request.course),
+        datatables.GRADER_COLUMNS,
+        filters=datatables.GRADER_FILTERS
+    )
+
+
+@allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
+def assignment_list_data(request, course_id):  # pylint: disable=unused-argument
+    """
+    DataTables server-side data for the assignment list
+    """
+    grader_user = request.user if request.role == Roles.grader else None
+    return datatables.queryset_table_response(
+        request,
+        datatables.get_assignment_table_queryset(request.course, grader_user=grader_user),
+        datatables.ASSIGNMENT_COLUMNS,
+        datatables.get_assignment_row,
+        filters=datatables.ASSIGNMENT_FILTERS
+    )
+
+
+@allowed_roles([Roles.grader, Roles.admin])
+@read_from_replica
+def assignment_submissions_data(request, course_id, assignment_id):
+    """
+    DataTables server-side data for the submissions of an assignment
+    """
+    assignment = get_object_or_404(Assignment, course_id=course_id, id=assignment_id)
+    grader_user = request.user if request.role == Roles.grader else None
+    return datatables.queryset_table_response(
+        request,
+        datatables.get_submission_table_queryset(assignment, grader_user=grader_user),
+        datatables.SUBMISSION_COLUMNS,
+        lambda student: datatables.get_submission_row(student, assignment),
+        filters=datatables.get_submission_filters(assignment)
+    )
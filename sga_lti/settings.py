@@ -83,11 +83,15 @@ INSTALLED_APPS = (
     'server_status',
     'django_forms_bootstrap',
     # Our INSTALLED_APPS
-    'sga',
+    'sga.apps.SGAConfig',
 )
 
 MIDDLEWARE_CLASSES = (
+    'sga.middleware.LoggingContextMiddleware',
+    'sga.middleware.MetricsMiddleware',
+    'sga.middleware.InstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'sga.middleware.ReplicaPinMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -121,7 +125,9 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'sga.context_processors.logged_in_user',
-                'sga.context_processors.datetime_formats'
+                'sga.context_processors.datetime_formats',
+                'sga.context_processors.fragment_cache',
+                'sga.context_processors.datatables'
             ],
         },
     },
@@ -135,22 +141,87 @@ WSGI_APPLICATION = 'sga_lti.wsgi.application'
 # Uses DATABASE_URL to configure with sqlite default:
 # For URL structure:
 # https://github.com/kennethreitz/dj-database-url
+# SGA_LTI_DB_POOLER_URL points at a pooler (e.g. pgbouncer) on the same host, which keeps the TLS
+# connections to the database; it is used instead of DATABASE_URL, and without SSL
+DATABASE_POOLER_URL = get_var('SGA_LTI_DB_POOLER_URL', '')
 DEFAULT_DATABASE_CONFIG = dj_database_url.parse(
-    get_var(
+    DATABASE_POOLER_URL or get_var(
         'DATABASE_URL',
         'sqlite:///{0}'.format(os.path.join(BASE_DIR, 'db.sqlite3'))
     )
 )
 
-if get_var('SGA_LTI_DB_DISABLE_SSL', False):
+if get_var('SGA_LTI_DB_DISABLE_SSL', False) or DATABASE_POOLER_URL:
     DEFAULT_DATABASE_CONFIG['OPTIONS'] = {}
 else:
     DEFAULT_DATABASE_CONFIG['OPTIONS'] = {'sslmode': 'require'}
 
+# Seconds to keep a database connection open for reuse by later requests (0 closes it at the end of
+# every request, None keeps it open indefinitely)
+DEFAULT_DATABASE_CONFIG['CONN_MAX_AGE'] = get_var('SGA_LTI_DB_CONN_MAX_AGE', 60)
+# A reused connection that has been idle for longer than this many seconds is checked before a
+# request uses it, and replaced if the server has closed it (see sga.backend.db)
+SGA_DB_HEALTH_CHECK_INTERVAL = get_var('SGA_LTI_DB_HEALTH_CHECK_INTERVAL', 10)
+
 DATABASES = {
     'default': DEFAULT_DATABASE_CONFIG
 }
 
+# SGA_LTI_DB_REPLICA_URL points at a read replica, used by the read-only staff list views and the
+# ZIP and gradebook exports (see sga.backend.routers); without it everything uses the primary
+DATABASE_REPLICA_URL = get_var('SGA_LTI_DB_REPLICA_URL', '')
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(DATABASE_REPLICA_URL)
+    DATABASES['replica']['OPTIONS'] = DEFAULT_DATABASE_CONFIG['OPTIONS']
+    DATABASES['replica']['CONN_MAX_AGE'] = DEFAULT_DATABASE_CONFIG['CONN_MAX_AGE']
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+SGA_DB_REPLICA_ALIAS = 'replica' if DATABASE_REPLICA_URL else None
+# Seconds a session reads from the primary after it writes, so it sees its own changes
+SGA_DB_REPLICA_PIN_SECONDS = get_var('SGA_LTI_DB_REPLICA_PIN_SECONDS', 30)
+DATABASE_ROUTERS = ['sga.backend.routers.ReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/1.9/topics/cache/
+# SGA_LTI_CACHE_BACKEND is one of the names below or a dotted path to a cache backend.
+# The memcached and redis backends use python-memcached and django-redis.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+CACHE_BACKEND = get_var('SGA_LTI_CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': get_var('SGA_LTI_CACHE_LOCATION', 'sga-lti'),
+        'KEY_PREFIX': get_var('SGA_LTI_CACHE_KEY_PREFIX', 'sga-lti'),
+    }
+}
+SGA_CACHE_ALIAS = 'default'
+SGA_CACHE_TIMEOUT = get_var('SGA_LTI_CACHE_TIMEOUT', 60 * 60)
+# Timeout for cached table rows; rows are keyed by their updated_on, so this only bounds
+# how long unused rows stay in the cache
+SGA_FRAGMENT_CACHE_TIMEOUT = get_var('SGA_LTI_FRAGMENT_CACHE_TIMEOUT', 24 * 60 * 60)
+# Grades are sent to edX one by one during the bulk grading request, so bulk grading is capped
+SGA_BULK_GRADE_MAX_SUBMISSIONS = get_var('SGA_LTI_BULK_GRADE_MAX_SUBMISSIONS', 50)
+# Course pages get ETags that change at least this often in seconds, even without data changes
+# (see sga.backend.cache.conditional_course_page)
+SGA_PAGE_ETAG_LIFETIME = get_var('SGA_LTI_PAGE_ETAG_LIFETIME', 5 * 60)
+
+# Page sizes for the server-side DataTables JSON endpoints
+SGA_DATATABLES_PAGE_SIZE = get_var('SGA_LTI_DATATABLES_PAGE_SIZE', 10)
+SGA_DATATABLES_MAX_PAGE_SIZE = get_var('SGA_LTI_DATATABLES_MAX_PAGE_SIZE', 100)
+# Page size for a grader's graded submissions history
+SGA_GRADED_SUBMISSIONS_PAGE_SIZE = get_var('SGA_LTI_GRADED_SUBMISSIONS_PAGE_SIZE', 50)
+# Have the browser prefetch the next not graded submission's document while grading
+SGA_PREFETCH_NEXT_SUBMISSION = get_var('SGA_LTI_PREFETCH_NEXT_SUBMISSION', True)
+
+# Share of requests (0 to 1) profiled by InstrumentationMiddleware; 0 turns it off
+SGA_INSTRUMENTATION_SAMPLE_RATE = get_var('SGA_LTI_INSTRUMENTATION_SAMPLE_RATE', 0)
+# Number of slowest statements included in each profiled request's log record
+SGA_INSTRUMENTATION_SLOW_QUERIES = get_var('SGA_LTI_INSTRUMENTATION_SLOW_QUERIES', 5)
+
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
 
@@ -168,9 +239,12 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/1.8/howto/static-files/
 
-# Serve static files with dj-static
-STATIC_URL = '/static/'
+# Static files are collected with content-hashed names and compressed copies (see
+# sga.backend.staticfiles) and served by uWSGI (see uwsgi.ini), or by dj-static without uWSGI.
+# SGA_LTI_STATIC_URL can point at a CDN that pulls from STATIC_ROOT or /static/.
+STATIC_URL = get_var('SGA_LTI_STATIC_URL', '/static/')
 STATIC_ROOT = 'staticfiles'
+STATICFILES_STORAGE = 'sga.backend.staticfiles.CompressedManifestStaticFilesStorage'
 STATICFILES_DIRS = (
     os.path.join(BASE_DIR, 'static'),
 )
@@ -200,21 +274,34 @@ else:
     ADMINS = ()
 
 # Logging configuration
-LOG_LEVEL = get_var('SGA_LTI_LOG_LEVEL', 'DEBUG')
-DJANGO_LOG_LEVEL = get_var('DJANGO_LOG_LEVEL', 'DEBUG')
+LOG_LEVEL = get_var('SGA_LTI_LOG_LEVEL', 'INFO')
+DJANGO_LOG_LEVEL = get_var('DJANGO_LOG_LEVEL', 'INFO')
+# json (default) or verbose (plain text, easier to read in development)
+LOG_FORMAT = get_var('SGA_LTI_LOG_FORMAT', 'json')
+# Share of SQL statement records (logged by Django at DEBUG level when DEBUG is on) to keep
+DB_LOG_SAMPLE_RATE = get_var('SGA_LTI_DB_LOG_SAMPLE_RATE', 0.01)
 
 # For logging to a remote syslog host
 LOG_HOST = get_var('SGA_LTI_LOG_HOST', 'localhost')
 LOG_HOST_PORT = get_var('SGA_LTI_LOG_HOST_PORT', 514)
 
 HOSTNAME = platform.node().split('.')[0]
+# sga.backend.logs.configure_logging() puts the handlers in queued_handlers behind a queue, so that
+# their I/O happens on a background thread instead of in the request
+LOGGING_CONFIG = 'sga.backend.logs.configure_logging'
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
+    'queued_handlers': ['console', 'syslog'],
     'filters': {
         'require_debug_false': {
             '()': 'django.utils.log.RequireDebugFalse',
-        }
+        },
+        'sample_db_queries': {
+            '()': 'sga.backend.logs.SamplingFilter',
+            'rate': DB_LOG_SAMPLE_RATE,
+            'max_level': 'DEBUG',
+        },
     },
     'formatters': {
         'verbose': {
@@ -224,19 +311,22 @@ LOGGING = {
                 '[{hostname}] - %(message)s'
             ).format(hostname=HOSTNAME),
             'datefmt': '%Y-%m-%d %H:%M:%S'
-        }
+        },
+        'json': {
+            '()': 'sga.backend.logs.JsonFormatter',
+        },
     },
     'handlers': {
         'console': {
             'level': 'DEBUG',
             'class': 'logging.StreamHandler',
-            'formatter': 'verbose'
+            'formatter': LOG_FORMAT
         },
         'syslog': {
             'level': LOG_LEVEL,
             'class': 'logging.handlers.SysLogHandler',
             'facility': 'local7',
-            'formatter': 'verbose',
+            'formatter': LOG_FORMAT,
             'address': (LOG_HOST, LOG_HOST_PORT)
         },
         'mail_admins': {
@@ -264,6 +354,11 @@ LOGGING = {
             'level': DJANGO_LOG_LEVEL,
             'propagate': True,
         },
+        'django.db.backends': {
+            'filters': ['sample_db_queries'],
+            'level': DJANGO_LOG_LEVEL,
+            'propagate': True,
+        },
         'urllib3': {
             'level': 'INFO',
         }
@@ -274,6 +369,12 @@ LOGGING = {
 STATUS_TOKEN = get_var("STATUS_TOKEN", "")
 HEALTH_CHECK = ['POSTGRES']
 
+# Metrics (served at /metrics with STATUS_TOKEN). Each process writes its metrics to a file in
+# SGA_METRICS_DIR so that they can be added up across uWSGI processes; without it, each scrape
+# only sees the process that serves it.
+SGA_METRICS_DIR = get_var('SGA_LTI_METRICS_DIR', '')
+SGA_METRICS_FLUSH_INTERVAL = get_var('SGA_LTI_METRICS_FLUSH_INTERVAL', 5)
+
 GA_TRACKING_ID = get_var("GA_TRACKING_ID", "")
 REACT_GA_DEBUG = get_var("REACT_GA_DEBUG", False)
 
@@ -294,4 +395,9 @@ DEFAULT_FILE_STORAGE = 'storages.backends.s3boto.S3BotoStorage'
 DEVELOPMENT = get_var('DEVELOPMENT', False)
 
 MAX_FILE_SIZE_MB = get_var("MAX_FILE_SIZE_MB", 5)
+# Uploads are hashed as they stream in, for content-addressed storage (see sga.backend.files)
+FILE_UPLOAD_HANDLERS = [
+    "sga.backend.files.HashingMemoryFileUploadHandler",
+    "sga.backend.files.HashingTemporaryFileUploadHandler",
+]
 VALID_FILE_UPLOAD_EXTENSIONS = get_var("VALID_FILE_UPLOAD_EXTENSIONS", [".pdf"])
@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/1.8/howto/deployment/wsgi/
 import os
 
 from django.core.wsgi import get_wsgi_application
-from dj_static import Cling
+
+from sga.backend.staticfiles import StaticFilesCling
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sga_lti.settings")
 
-application = Cling(get_wsgi_application())  # pylint: disable=invalid-name
+application = StaticFilesCling(get_wsgi_application())  # pylint: disable=invalid-name